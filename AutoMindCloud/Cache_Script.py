@@ -0,0 +1,124 @@
+"""
+Cache_Script.py
+
+On-disk LRU cache shared by the kernel-side STEP/DXF pipelines.
+- Entries live under AUTOMIND_CACHE_DIR (default ~/.cache/AutoMindCloud/<namespace>).
+- Keys are content hashes plus the parameters that produced the entry.
+- Reads refresh the entry's mtime; writes evict the oldest entries once the
+  namespace grows past max_bytes.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "AUTOMIND_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "AutoMindCloud"),
+)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_HASH_MEMO = {}
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 of a file's contents, memoized on (path, size, mtime) so repeated
+    calls on an unchanged file do not re-read it.
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _HASH_MEMO.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _HASH_MEMO[memo_key] = digest
+    return digest
+
+
+def make_key(content_hash: str, **params) -> str:
+    """Combine a content hash and tessellation/render parameters into one key."""
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return content_hash[:32] + "_" + hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class DiskCache:
+    """
+    Flat directory of cache files named "<key><suffix>", evicted LRU by mtime.
+    """
+
+    def __init__(self, namespace: str, root: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.dir = os.path.join(root or DEFAULT_CACHE_DIR, namespace)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, key: str, suffix: str = "") -> str:
+        return os.path.join(self.dir, key + suffix)
+
+    def get(self, key: str, suffix: str = ""):
+        """Return the entry path if present (and mark it recently used), else None."""
+        p = self.path(key, suffix)
+        if not os.path.exists(p):
+            return None
+        try:
+            os.utime(p, None)
+        except OSError:
+            pass
+        return p
+
+    def read_bytes(self, key: str, suffix: str = ""):
+        p = self.get(key, suffix)
+        if p is None:
+            return None
+        with open(p, "rb") as f:
+            return f.read()
+
+    def write_bytes(self, key: str, data: bytes, suffix: str = "") -> str:
+        """Atomically write an entry, then evict down to max_bytes."""
+        p = self.path(key, suffix)
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, p)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+        return p
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.dir):
+            if name.endswith(".tmp"):
+                continue
+            p = os.path.join(self.dir, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.dir):
+            try:
+                os.remove(os.path.join(self.dir, name))
+            except OSError:
+                pass
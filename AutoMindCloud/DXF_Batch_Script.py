@@ -0,0 +1,333 @@
+"""
+DXF_Batch_Script.py
+
+Batch thumbnails for a folder of DXF files.
+- Each DXF file gets a PNG and/or SVG preview (DXF_Kernel_Script.dxf_thumbnail:
+  parsed in Python, segments snapped and deduplicated on the thumbnail grid
+  and rasterized in array passes) as <out_dir>/<name>.png / .svg.
+- Files run in a pool of `workers` processes; a file that fails is reported
+  and the batch moves on.
+- Thumbnails are cached by DXF content hash (copies of a drawing are
+  rendered once), and manifest.json records each file's hash and settings,
+  so unchanged files are skipped on the next run.
+- With warm=True each worker also builds the viewer payload, so
+  DXF_Visualization(path, parse_on="kernel") opens any item from the cache.
+- index.html shows the thumbnails as a gallery; DXF_Gallery (in
+  DXF_Visualization_Script) shows it in a notebook and opens the clicked drawing.
+
+CLI:
+    python -m AutoMindCloud.DXF_Batch_Script drawings/ -o thumbnails/ --size 256 --formats png svg
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from html import escape
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from AutoMindCloud.Cache_Script import file_sha256, make_key
+from AutoMindCloud.DXF_Entities_Script import iter_group_codes, iter_records, open_dxf
+from AutoMindCloud.DXF_Kernel_Script import THUMBNAIL_SIZE, dxf_drawing, dxf_payload, dxf_thumbnail
+from AutoMindCloud.Raster_Script import CSS_DPI
+from AutoMindCloud.Svg_Compact_Script import DEFAULT_PRECISION
+
+DXF_EXTENSIONS = (".dxf",)
+THUMBNAIL_FORMATS = ("png", "svg")
+
+
+def find_dxf_files(folder: str, recursive: bool = True):
+    """Sorted DXF paths under folder."""
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        found.extend(
+            os.path.join(root, f) for f in sorted(files) if f.lower().endswith(DXF_EXTENSIONS)
+        )
+        if not recursive:
+            break
+    return found
+
+
+def _output_name(folder, path):
+    rel = os.path.splitext(os.path.relpath(path, folder))[0]
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", rel.replace(os.sep, "__"))
+
+
+def _output_names(folder, paths):
+    """
+    {path: output name}. Sources whose names collide once sanitized (a b.dxf,
+    a_b.dxf; a/b.dxf, a__b.dxf; or names differing only in case) get a short
+    hash of their relative path appended, the same on every run.
+    """
+    names = {path: _output_name(folder, path) for path in paths}
+    groups = {}
+    for path, name in names.items():
+        groups.setdefault(name.lower(), []).append(path)
+    for group in groups.values():
+        if len(group) > 1:
+            for path in group:
+                rel = os.path.relpath(path, folder).replace(os.sep, "/")
+                names[path] += "-" + hashlib.sha1(rel.encode("utf-8")).hexdigest()[:8]
+    return names
+
+
+def _has_entities_section(dxf_path):
+    try:
+        with open_dxf(dxf_path) as f:
+            return any(
+                rtype == "SECTION" and (2, "ENTITIES") in tags
+                for rtype, tags in iter_records(iter_group_codes(f))
+            )
+    except ValueError:  # a group code that is not a number: not DXF text
+        return False
+
+
+def _check_drawable(dxf_path, layers):
+    """Raise ValueError when the thumbnail of dxf_path would come out blank."""
+    drawing = dxf_drawing(dxf_path, layers)
+    if len(drawing["segments"]) or (drawing["block_ranges"][drawing["instance_block"], 1] > 0).any():
+        return
+    if not _has_entities_section(dxf_path):
+        raise ValueError(f"{dxf_path}: no ENTITIES section, not a DXF drawing")
+    on = "" if layers is None else f" on layers {', '.join(layers)}"
+    raise ValueError(f"{dxf_path}: nothing to draw{on}")
+
+
+def export_dxf_thumbnails(
+    dxf_path: str,
+    out_dir: str,
+    name: str,
+    formats=("png",),
+    size=THUMBNAIL_SIZE,
+    png_dpi=CSS_DPI,
+    precision=DEFAULT_PRECISION,
+    layers=None,
+    warm=False,
+):
+    """
+    Write <out_dir>/<name>.<fmt> for each format and return {fmt: file name}.
+    warm=True also builds the viewer payload of the same layers.
+    Raises ValueError for a file that is not a DXF drawing or draws nothing.
+    """
+    if isinstance(layers, str):
+        layers = [layers]
+    _check_drawable(dxf_path, layers)
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    for fmt in formats:
+        data = dxf_thumbnail(dxf_path, fmt, size=size, layers=layers, dpi=png_dpi, precision=precision)
+        files[fmt] = f"{name}.{fmt}"
+        if fmt == "png":
+            with open(os.path.join(out_dir, files[fmt]), "wb") as f:
+                f.write(data)
+        else:
+            with open(os.path.join(out_dir, files[fmt]), "w", encoding="utf-8") as f:
+                f.write(data)
+    if warm:
+        dxf_payload(dxf_path, layers)
+    return files
+
+
+def _thumbnail_worker(name, dxf_path, out_dir, options):
+    t0 = time.perf_counter()
+    try:
+        files = export_dxf_thumbnails(dxf_path, out_dir, name, **options)
+        return name, "ok", files, time.perf_counter() - t0
+    except Exception as e:
+        return name, "error", repr(e), time.perf_counter() - t0
+
+
+def _write_index(out_dir, manifest, formats):
+    cards = []
+    for name, entry in sorted(manifest.items()):
+        files = entry.get("files") or {}
+        image = next((files[fmt] for fmt in formats if files.get(fmt)), None)
+        preview = (
+            f'<a href="{escape(image)}"><img src="{escape(image)}" loading="lazy"></a>'
+            if image else f'<div class="missing">{escape(entry["status"])}</div>'
+        )
+        links = " ".join(f'<a href="{escape(f)}">{escape(fmt)}</a>' for fmt, f in sorted(files.items()))
+        error = f'<small>{escape(entry["error"])}</small>' if entry.get("error") else ""
+        cards.append(
+            f'<figure title="{escape(entry["source"])}">{preview}'
+            f"<figcaption>{escape(entry['source'])}<br>{links} {error}</figcaption></figure>"
+        )
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>DXF thumbnails</title>
+<style>
+  body {{ font-family: sans-serif; color: #0f172a; margin: 24px; }}
+  h1 {{ color: #009688; }}
+  .grid {{ display: flex; flex-wrap: wrap; gap: 12px; }}
+  figure {{ margin: 0; width: 200px; }}
+  figure img, .missing {{ width: 200px; height: 150px; object-fit: contain; border: 1px solid #cbd5e1; background: #fff; }}
+  .missing {{ display: flex; align-items: center; justify-content: center; color: #b91c1c; }}
+  figcaption {{ font-size: 12px; overflow-wrap: anywhere; }}
+</style></head>
+<body>
+<h1>DXF thumbnails</h1>
+<div class="grid">
+{chr(10).join(cards)}
+</div>
+</body></html>
+"""
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return path
+
+
+def batch_thumbnails(
+    folder: str,
+    out_dir: str = None,
+    formats=("png",),
+    size=THUMBNAIL_SIZE,
+    png_dpi=CSS_DPI,
+    precision=DEFAULT_PRECISION,
+    layers=None,
+    warm=False,
+    workers=None,
+    recursive=True,
+    force=False,
+    verbose=True,
+):
+    """
+    Thumbnail every DXF file in folder and return the manifest
+    {name: {"source", "path", "sha256", "key", "status", "files", "seconds", "error"}}.
+
+    status is "ok", "cached" (unchanged since the last run) or "error"; path
+    is the absolute DXF path, files {format: file name in out_dir}. The
+    manifest and index.html are written to out_dir (default: <folder>/thumbnails).
+    A file that is not a DXF drawing, or has nothing to draw, is an "error".
+    """
+    formats = tuple(formats)
+    if isinstance(layers, str):
+        layers = [layers]
+    for fmt in formats:
+        if fmt not in THUMBNAIL_FORMATS:
+            raise ValueError(f"formats must be among {THUMBNAIL_FORMATS}, got {fmt!r}")
+    out_dir = out_dir or os.path.join(folder, "thumbnails")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    options = {
+        "formats": list(formats),
+        "size": int(size),
+        "png_dpi": float(png_dpi),
+        "precision": float(precision),
+        "layers": None if layers is None else [str(name) for name in layers],
+        "warm": bool(warm),
+    }
+    log = print if verbose else (lambda *a, **k: None)
+
+    manifest = {}
+    pending = []
+    paths = find_dxf_files(folder, recursive)
+    names = _output_names(folder, paths)
+    for path in paths:
+        name = names[path]
+        digest = file_sha256(path)
+        key = make_key(digest, **options)
+        old = previous.get(name)
+        if (
+            not force
+            and old
+            and old.get("key") == key
+            and old.get("status") in ("ok", "cached")
+            and all(os.path.exists(os.path.join(out_dir, f)) for f in old["files"].values())
+        ):
+            manifest[name] = dict(old, status="cached", path=os.path.abspath(path))
+            log(f"[cached] {name}")
+            continue
+        manifest[name] = {
+            "source": os.path.relpath(path, folder),
+            "path": os.path.abspath(path),
+            "sha256": digest,
+            "key": key,
+            "status": "pending",
+            "files": {},
+        }
+        pending.append((name, path))
+
+    def finish(name, status, payload, seconds):
+        entry = manifest[name]
+        entry["status"] = status
+        entry["seconds"] = round(seconds, 3)
+        if status == "ok":
+            entry["files"] = payload
+        else:
+            entry["error"] = payload
+        log(f"[{status}] {name} ({seconds:.1f} s)")
+
+    # Thumbnails are cheap next to process start-up, so a pool of long-lived
+    # workers takes the files instead of one process per file.
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(pending) or 1))
+    if pending:
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context()) as pool:
+            futures = {
+                pool.submit(_thumbnail_worker, name, path, out_dir, options): name for name, path in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    finish(*future.result())
+            except BrokenProcessPool as e:
+                # A worker died hard (segfault, OOM kill): the files not done are reported.
+                for future, name in futures.items():
+                    if manifest[name]["status"] == "pending":
+                        finish(name, "error", f"worker crashed: {e!r}", time.perf_counter() - t0)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    index = _write_index(out_dir, manifest, formats)
+    log(f"Index: {index}")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m AutoMindCloud.DXF_Batch_Script",
+        description="Write PNG/SVG thumbnails and an HTML gallery for every DXF file in a folder.",
+    )
+    parser.add_argument("folder", help="folder containing .dxf files")
+    parser.add_argument("-o", "--out-dir", help="output folder (default: <folder>/thumbnails)")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=THUMBNAIL_FORMATS, help="thumbnail formats")
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIZE, help="longest side in pixels")
+    parser.add_argument("--dpi", type=float, default=CSS_DPI, help="PNG resolution (96 = one pixel per --size unit)")
+    parser.add_argument("--precision", type=float, default=DEFAULT_PRECISION, help="SVG precision in pixels")
+    parser.add_argument("--layers", nargs="+", default=None, help="layers to draw (default: the visible ones)")
+    parser.add_argument("--warm", action="store_true", help="also cache the viewer payload of every file")
+    parser.add_argument("--workers", type=int, default=None, help="files processed in parallel")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subfolders")
+    parser.add_argument("--force", action="store_true", help="redo files that are up to date")
+    args = parser.parse_args(argv)
+
+    manifest = batch_thumbnails(
+        args.folder,
+        out_dir=args.out_dir,
+        formats=args.formats,
+        size=args.size,
+        png_dpi=args.dpi,
+        precision=args.precision,
+        layers=args.layers,
+        warm=args.warm,
+        workers=args.workers,
+        recursive=not args.no_recursive,
+        force=args.force,
+    )
+    failed = [n for n, e in manifest.items() if e["status"] == "error"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,653 @@
+"""
+DXF_Entities_Script.py
+
+Layer-aware entity store for the kernel-side DXF pipeline (DXF_Kernel_Script).
+- The file is streamed as (group code, value) pairs by a generator and grouped
+  into records at every code-0 tag, so each tag is read exactly once.
+- Entities land in one columnar table per type: NumPy columns for the owner
+  (-1 for ENTITIES, else the block index), the layer index and the ACI color
+  (256 = BYLAYER, 0 = BYBLOCK), fixed-width float columns (COLUMNS), and
+  ragged rows for polyline vertices (x, y, bulge) and raw tags.
+- LINE, ARC, CIRCLE, ELLIPSE, LWPOLYLINE/POLYLINE (bulges included), TEXT,
+  MTEXT, ATTRIB and INSERT/MINSERT are decoded while parsing. SPLINE and
+  HATCH only keep their numeric tags; knots, control points and boundary
+  paths are decoded by entity_primitives for the rows that are drawn.
+- The LAYER table gives each layer its color and default visibility (off and
+  frozen layers are hidden). layer_visibility turns layer names into a mask
+  over the layer column, so toggling layers filters the cached store instead
+  of reparsing the file.
+- entity_primitives reduces the selected rows to analytic primitives per
+  owner (lines, arcs, ellipses, splines, texts) for the kernel to tessellate.
+"""
+
+import re
+import math
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+BYBLOCK = 0
+BYLAYER = 256
+
+# Fixed-width columns of each entity table ("<type>_values"); angles in
+# radians, arcs and ellipses run counter-clockwise from start over sweep.
+COLUMNS = {
+    "line": ("x1", "y1", "x2", "y2"),
+    "arc": ("cx", "cy", "r", "start", "sweep"),
+    "ellipse": ("cx", "cy", "major_x", "major_y", "ratio", "start", "sweep"),
+    "polyline": ("closed",),
+    "text": ("x", "y", "height", "rotation", "halign", "valign"),
+    "insert": ("x", "y", "sx", "sy", "rotation", "columns", "rows", "column_step", "row_step"),
+    "spline": (),
+    "hatch": (),
+}
+# Tables whose rows keep their raw numeric tags until they are drawn.
+LAZY_TYPES = ("spline", "hatch")
+
+
+def iter_group_codes(lines):
+    """Yield (code, value) pairs from an iterable of DXF text lines."""
+    it = iter(lines)
+    for code in it:
+        value = next(it, None)
+        if value is None:
+            return
+        yield int(code), value.strip()
+
+
+def iter_records(pairs):
+    """Group (code, value) pairs into (record type, [(code, value), ...]) at every code 0."""
+    rtype, tags = None, []
+    for code, value in pairs:
+        if code == 0:
+            if rtype is not None:
+                yield rtype, tags
+            rtype, tags = value, []
+        else:
+            tags.append((code, value))
+    if rtype is not None:
+        yield rtype, tags
+
+
+def open_dxf(path):
+    """Text handle on an ASCII DXF file (binary DXF is rejected)."""
+    with open(path, "rb") as f:
+        if f.read(22).startswith(b"AutoCAD Binary DXF"):
+            raise ValueError(f"{path}: binary DXF is not supported, save it as ASCII DXF")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+class _Table:
+    """Columns of one entity type while parsing."""
+
+    def __init__(self, width, item_width=0):
+        self.width = width
+        self.item_width = item_width
+        self.owner = array("i")
+        self.layer = array("i")
+        self.color = array("h")
+        self.values = array("d")
+        self.offsets = array("q", [0])  # ragged rows (item_width > 0): polyline vertices or raw tags
+        self.items = array("d")
+        self.codes = array("h")
+        self.strings = []  # TEXT contents, INSERT block names
+
+    def add(self, owner, layer, color, values=()):
+        self.owner.append(owner)
+        self.layer.append(layer)
+        self.color.append(color)
+        self.values.extend(values)
+        if self.item_width:
+            self.offsets.append(len(self.items) // self.item_width)
+
+    def arrays(self, kind):
+        n = len(self.owner)
+        return {
+            f"{kind}_owner": np.frombuffer(self.owner, dtype=np.int32).copy(),
+            f"{kind}_layer": np.frombuffer(self.layer, dtype=np.int32).copy(),
+            f"{kind}_color": np.frombuffer(self.color, dtype=np.int16).copy(),
+            f"{kind}_values": np.frombuffer(self.values, dtype=np.float64).reshape(n, self.width).copy(),
+            f"{kind}_offsets": np.frombuffer(self.offsets, dtype=np.int64).copy() if self.item_width else np.zeros(n + 1, dtype=np.int64),
+            f"{kind}_items": np.frombuffer(self.items, dtype=np.float64).reshape(-1, self.item_width or 1).copy(),
+            f"{kind}_codes": np.frombuffer(self.codes, dtype=np.int16).copy(),
+            f"{kind}_strings": np.array(self.strings, dtype=str),
+        }
+
+
+# Requested group codes and their defaults per record type (8 = layer, 62 = color, 60 = invisible).
+_COMMON = {8: "0", 62: float(BYLAYER), 60: 0.0}
+_LINE = {**_COMMON, 10: 0.0, 20: 0.0, 11: 0.0, 21: 0.0}
+_CIRCLE = {**_COMMON, 10: 0.0, 20: 0.0, 40: 0.0}
+_ARC = {**_CIRCLE, 50: 0.0, 51: 360.0}
+_ELLIPSE = {**_COMMON, 10: 0.0, 20: 0.0, 11: 1.0, 21: 0.0, 40: 1.0, 41: 0.0, 42: 2 * math.pi}
+_TEXT = {**_COMMON, 10: 0.0, 20: 0.0, 11: None, 21: 0.0, 40: 1.0, 50: 0.0, 72: 0.0, 73: 0.0, 74: 0.0}
+_MTEXT = {**_COMMON, 10: 0.0, 20: 0.0, 11: None, 21: 0.0, 40: 1.0, 50: None, 71: 1.0}
+_INSERT = {**_COMMON, 2: None, 10: 0.0, 20: 0.0, 41: 1.0, 42: 1.0, 50: 0.0, 70: 1.0, 71: 1.0, 44: 0.0, 45: 0.0}
+_VERTEX = {10: None, 20: 0.0, 42: 0.0, 70: 0.0}
+_LAYER = {2: "0", 62: 7.0, 70: 0.0}
+
+
+def _tag_values(tags, defaults):
+    """Last value of each requested group code ({code: default}); names (2, 8) stay strings."""
+    values = dict(defaults)
+    for code, value in tags:
+        if code in values:
+            values[code] = value if code in (2, 8) else float(value)
+    return values
+
+
+_SPECIAL = {"%%d": "°", "%%c": "⌀", "%%p": "±", "%%u": "", "%%o": "", "%%%": "%"}
+_SPECIAL_RE = re.compile(r"%%[dcpuo%]", re.IGNORECASE)
+_STACK_RE = re.compile(r"\\S([^;]*);")
+_FORMAT_RE = re.compile(r"\\[ACFHQTWfhqtwp][^;]*;|\\[LlOoKk]|[{}]")
+
+
+def _text_plain(text):
+    """TEXT contents with %%d/%%c/%%p symbols substituted and %%u/%%o toggles removed."""
+    return _SPECIAL_RE.sub(lambda m: _SPECIAL[m.group(0).lower()], text)
+
+
+def _mtext_plain(text):
+    """MTEXT contents without inline formatting; \\P breaks lines, stacked fractions read a/b."""
+    text = text.replace("\\P", "\n").replace("\\~", " ")
+    text = _STACK_RE.sub(lambda m: re.sub(r"[\^#]", "/", m.group(1)), text)
+    return _text_plain(_FORMAT_RE.sub("", text))
+
+
+def _text_row(rtype, tags):
+    """(x, y, height, rotation, halign, valign) and contents of a TEXT, ATTRIB or MTEXT record."""
+    if rtype == "MTEXT":
+        v = _tag_values(tags, _MTEXT)
+        if v[50] is not None:
+            rotation = math.radians(v[50])
+        elif v[11] is not None:
+            rotation = math.atan2(v[21], v[11])
+        else:
+            rotation = 0.0
+        # Attachment 1..9: top/middle/bottom rows of left/center/right.
+        attach = min(max(int(v[71]), 1), 9) - 1
+        text = "".join(value for code, value in tags if code == 3) + next((value for code, value in tags if code == 1), "")
+        return (v[10], v[20], v[40], rotation, attach % 3, (3, 2, 1)[attach // 3]), _mtext_plain(text)
+
+    v = _tag_values(tags, _TEXT)
+    # 72: left, center, right, aligned, middle, fit; 73 (74 for ATTRIB): baseline, bottom, middle, top.
+    h = int(v[72])
+    valign = int(v[74] if rtype == "ATTRIB" else v[73])
+    x, y = v[10], v[20]
+    if h in (3, 5):
+        h = valign = 0
+    elif (h or valign) and v[11] is not None:
+        x, y = v[11], v[21]
+    if h == 4:
+        h, valign = 1, 2
+    text = next((value for code, value in tags if code == 1), "")
+    return (x, y, v[40], math.radians(v[50]), h, valign), _text_plain(text)
+
+
+def parse_entities(path):
+    """
+    Parse an ASCII DXF file in one streaming pass into the columnar store:
+      {"layer_names": (L,) str, "layer_colors": (L,) ACI, "layer_visible": (L,) bool,
+       "block_names": (B,) str, "block_bases": (B, 2),
+       and per entity type in COLUMNS "<type>_owner", "<type>_layer",
+       "<type>_color", "<type>_values" (N, len(COLUMNS[type])),
+       "<type>_offsets" (N + 1,) into "<type>_items" (polyline vertices as
+       (P, 3) x, y, bulge; raw tag values of SPLINE/HATCH) and "<type>_codes",
+       "<type>_strings" (TEXT contents, INSERT block names)}.
+
+    Invisible entities are skipped; TEXT, MTEXT and ATTRIB share the "text" table.
+    """
+    layer_colors, layer_visible = [], []
+
+    class LayerIndex(dict):
+        # Layers are numbered on first use, shown in color 7 unless the LAYER table says otherwise.
+        def __missing__(self, name):
+            idx = self[name] = len(layer_colors)
+            layer_colors.append(7)
+            layer_visible.append(True)
+            return idx
+
+    layers = LayerIndex()
+
+    ragged = {"polyline": 3, "spline": 1, "hatch": 1}
+    tables = {kind: _Table(len(cols), ragged.get(kind, 0)) for kind, cols in COLUMNS.items()}
+    block_names, block_bases = [], []
+    section = None
+    owner = None  # -1 in ENTITIES, the block index inside BLOCK ... ENDBLK
+    polyline = None  # (owner, layer, color, points, closed, invisible) inside POLYLINE ... SEQEND
+
+    def end_polyline():
+        o, layer, color, points, closed, invisible = polyline
+        if invisible:
+            return
+        table = tables["polyline"]
+        table.items.extend(points)
+        table.add(o, layer, color, (closed,))
+
+    with open_dxf(path) as f:
+        for rtype, tags in iter_records(iter_group_codes(f)):
+            if rtype == "SECTION":
+                section = next((v for c, v in tags if c == 2), None)
+                owner = -1 if section == "ENTITIES" else None
+                continue
+            if rtype == "ENDSEC":
+                section = owner = None
+                continue
+
+            if section == "TABLES":
+                if rtype == "LAYER":
+                    v = _tag_values(tags, _LAYER)
+                    idx = layers[v[2]]
+                    layer_colors[idx] = abs(int(v[62]))
+                    # Negative color: layer off; flag 1: frozen.
+                    layer_visible[idx] = v[62] >= 0 and not int(v[70]) & 1
+                continue
+            if section == "BLOCKS":
+                if rtype == "BLOCK":
+                    v = _tag_values(tags, {2: None, 10: 0.0, 20: 0.0})
+                    owner = len(block_names)
+                    block_names.append(v[2] or "")
+                    block_bases.append((v[10], v[20]))
+                    continue
+                if rtype == "ENDBLK":
+                    owner = None
+                    continue
+            if owner is None:
+                continue
+
+            if polyline is not None:
+                if rtype == "VERTEX":
+                    v = _tag_values(tags, _VERTEX)
+                    # Polyface face records (flag 128 without 64) carry no position.
+                    if v[10] is not None and int(v[70]) & 192 != 128:
+                        polyline[3].extend((v[10], v[20], v[42]))
+                    continue
+                end_polyline()
+                polyline = None
+                if rtype == "SEQEND":
+                    continue
+
+            if rtype == "LINE":
+                v = _tag_values(tags, _LINE)
+                if not v[60]:
+                    tables["line"].add(owner, layers[v[8]], int(v[62]), (v[10], v[20], v[11], v[21]))
+            elif rtype == "CIRCLE":
+                v = _tag_values(tags, _CIRCLE)
+                if not v[60]:
+                    tables["arc"].add(owner, layers[v[8]], int(v[62]), (v[10], v[20], v[40], 0.0, 2 * math.pi))
+            elif rtype == "ARC":
+                v = _tag_values(tags, _ARC)
+                # DXF arcs run counter-clockwise from 50 to 51.
+                sweep = (v[51] - v[50]) % 360.0 or 360.0
+                if not v[60]:
+                    tables["arc"].add(owner, layers[v[8]], int(v[62]),
+                                      (v[10], v[20], v[40], math.radians(v[50]), math.radians(sweep)))
+            elif rtype == "ELLIPSE":
+                v = _tag_values(tags, _ELLIPSE)
+                sweep = (v[42] - v[41]) % (2 * math.pi)
+                if not v[60]:
+                    tables["ellipse"].add(owner, layers[v[8]], int(v[62]), (
+                        v[10], v[20], v[11], v[21], v[40], v[41], sweep if sweep > 1e-9 else 2 * math.pi,
+                    ))
+            elif rtype == "LWPOLYLINE":
+                layer, color, invisible, closed = "0", BYLAYER, False, False
+                points = array("d")
+                for code, value in tags:
+                    if code == 10:
+                        points.extend((float(value), 0.0, 0.0))
+                    elif code == 20 and points:
+                        points[-2] = float(value)
+                    elif code == 42 and points:
+                        points[-1] = float(value)
+                    elif code == 70:
+                        closed = bool(int(value) & 1)
+                    elif code == 8:
+                        layer = value
+                    elif code == 62:
+                        color = int(value)
+                    elif code == 60:
+                        invisible = bool(int(value))
+                if not invisible:
+                    table = tables["polyline"]
+                    table.items.extend(points)
+                    table.add(owner, layers[layer], color, (closed,))
+            elif rtype == "POLYLINE":
+                v = _tag_values(tags, {**_COMMON, 70: 0.0})
+                polyline = (owner, layers[v[8]], int(v[62]), array("d"), bool(int(v[70]) & 1), bool(v[60]))
+            elif rtype in ("TEXT", "MTEXT", "ATTRIB"):
+                v = _tag_values(tags, _COMMON)
+                # ATTRIB flag 1: invisible attribute.
+                if v[60] or (rtype == "ATTRIB" and next((int(val) for c, val in tags if c == 70), 0) & 1):
+                    continue
+                row, text = _text_row(rtype, tags)
+                table = tables["text"]
+                table.strings.append(text)
+                table.add(owner, layers[v[8]], int(v[62]), row)
+            elif rtype == "INSERT":
+                v = _tag_values(tags, _INSERT)
+                if not v[60]:
+                    # 41/42 scale (negative = mirrored), 70/71 and 44/45 the MINSERT grid.
+                    table = tables["insert"]
+                    table.strings.append(v[2] or "")
+                    table.add(owner, layers[v[8]], int(v[62]), (
+                        v[10], v[20], v[41], v[42], math.radians(v[50]), v[70], v[71], v[44], v[45],
+                    ))
+            elif rtype in ("SPLINE", "HATCH"):
+                layer, color, invisible = "0", BYLAYER, False
+                table = tables[rtype.lower()]
+                for code, value in tags:
+                    if 10 <= code < 100:
+                        table.codes.append(code)
+                        table.items.append(float(value))
+                        if code == 62:
+                            color = int(value)
+                        elif code == 60:
+                            invisible = bool(int(value))
+                    elif code == 8:
+                        layer = value
+                if invisible:
+                    del table.codes[table.offsets[-1]:]
+                    del table.items[table.offsets[-1]:]
+                else:
+                    table.add(owner, layers[layer], color)
+
+    if polyline is not None:
+        end_polyline()
+    store = {
+        "layer_names": np.array(list(layers), dtype=str),
+        "layer_colors": np.array(layer_colors, dtype=np.int16),
+        "layer_visible": np.array(layer_visible, dtype=bool),
+        "block_names": np.array(block_names, dtype=str),
+        "block_bases": np.array(block_bases, dtype=np.float64).reshape(-1, 2),
+    }
+    for kind, table in tables.items():
+        store.update(table.arrays(kind))
+    return store
+
+
+def layer_visibility(store, layers=None):
+    """
+    (L,) bool mask over the layer column: the LAYER table's own visibility
+    when layers is None, else exactly the named layers (unknown names are
+    ignored).
+    """
+    if layers is None:
+        return store["layer_visible"].copy()
+    if isinstance(layers, str):
+        layers = [layers]
+    return np.isin(store["layer_names"], [str(name) for name in layers])
+
+
+def layer_table(store):
+    """[{"name", "color", "visible", "entities"}] for every layer of the store."""
+    n = len(store["layer_names"])
+    counts = np.zeros(n, dtype=np.int64)
+    for kind in COLUMNS:
+        counts += np.bincount(store[f"{kind}_layer"], minlength=n)
+    return [
+        {"name": str(name), "color": int(color), "visible": bool(visible), "entities": int(count)}
+        for name, color, visible, count in zip(
+            store["layer_names"], store["layer_colors"], store["layer_visible"], counts
+        )
+    ]
+
+
+class Primitives:
+    """
+    Analytic geometry of one owner (ENTITIES or a block) before tessellation:
+    lines (N, 4), arcs (M, 5) and ellipses (K, 7) laid out as in COLUMNS,
+    splines [(degree, knots, (P, 3) control points x, y, weight)], texts
+    (T, 6) as in COLUMNS["text"] with their strings.
+    """
+
+    def __init__(self, lines=(), arcs=(), ellipses=(), splines=(), texts=(), strings=()):
+        self.lines = _stack(lines, 4)
+        self.arcs = _stack(arcs, 5)
+        self.ellipses = _stack(ellipses, 7)
+        self.splines = list(splines)
+        self.texts = _stack(texts, 6)
+        self.strings = np.concatenate(strings) if len(strings) else np.zeros(0, dtype=str)
+
+    def __len__(self):
+        return len(self.lines) + len(self.arcs) + len(self.ellipses) + len(self.splines) + len(self.texts)
+
+
+def _stack(chunks, width):
+    if not len(chunks):
+        return np.zeros((0, width))
+    return np.concatenate([np.asarray(c, dtype=np.float64).reshape(-1, width) for c in chunks])
+
+
+def _by_owner(owner, data):
+    """{owner: rows of data} with rows grouped by their owner."""
+    if not len(owner):
+        return {}
+    order = np.argsort(owner, kind="stable")
+    owner, data = owner[order], data[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(owner)) + 1]
+    ends = np.r_[starts[1:], len(owner)]
+    return {int(owner[s]): data[s:e] for s, e in zip(starts, ends)}
+
+
+def _ragged(offsets, items, rows):
+    """Items of the selected ragged rows, concatenated, with their new (n + 1,) offsets."""
+    start, count = offsets[rows], offsets[rows + 1] - offsets[rows]
+    idx = np.repeat(start - np.cumsum(count) + count, count) + np.arange(count.sum())
+    return items[idx], np.r_[0, np.cumsum(count)]
+
+
+def bulge_arcs(a, b, bulge):
+    """
+    (M, 5) cx, cy, r, start, sweep of the polyline edges a -> b ((N, 2) each)
+    with DXF bulges (tan of a quarter of the included angle, negative =
+    clockwise), and the (N,) mask of edges kept (zero-length edges are dropped).
+    """
+    d = b - a
+    chord = np.hypot(d[:, 0], d[:, 1])
+    ok = chord > 0
+    a, b, d, chord, bulge = a[ok], b[ok], d[ok], chord[ok], bulge[ok]
+    theta = 4.0 * np.arctan(np.abs(bulge))
+    # Centre left of a -> b for counter-clockwise bulges, right for clockwise
+    # ones; past a half circle (|bulge| > 1) the tangent flips the side.
+    left = np.c_[-d[:, 1], d[:, 0]] / chord[:, None]
+    centre = (a + b) / 2.0 + left * (np.sign(bulge) * chord / (2.0 * np.tan(theta / 2.0)))[:, None]
+    r = chord / (2.0 * np.sin(theta / 2.0))
+    p = np.where((bulge > 0)[:, None], a, b)
+    start = np.arctan2(p[:, 1] - centre[:, 1], p[:, 0] - centre[:, 0])
+    return np.c_[centre, r, start, theta], ok
+
+
+def _polyline_edges(points, offsets, closed):
+    """
+    Edges of polylines given as (P, 3) x, y, bulge vertices and (N + 1,)
+    offsets: (lines (A, 4), their polyline rows (A,), arcs (B, 5), their rows (B,)).
+    A closed polyline also joins its last vertex to the first.
+    """
+    n = np.diff(offsets)
+    row = np.repeat(np.arange(len(n)), n)
+    end = np.arange(len(points)) + 1
+    keep = np.ones(len(points), dtype=bool)
+    has = n > 0
+    first, last = offsets[:-1][has], offsets[1:][has] - 1
+    end[last] = first
+    keep[last] = (closed[has] != 0) & (n[has] > 1) & ((n[has] > 2) | (points[last, 2] != 0))
+    start = np.flatnonzero(keep)
+    a, b, bulge, row = points[start, :2], points[end[start], :2], points[start, 2], row[start]
+    straight = bulge == 0
+    arcs, ok = bulge_arcs(a[~straight], b[~straight], bulge[~straight])
+    return np.c_[a[straight], b[straight]], row[straight], arcs, row[~straight][ok]
+
+
+def _bspline_basis(degree, knots, u):
+    """(len(u), len(knots) - degree - 1) B-spline basis values (Cox-de Boor), u in [knots[0], knots[-1]]."""
+    u = np.asarray(u, dtype=np.float64)[:, None]
+    basis = ((knots[:-1] <= u) & (u < knots[1:])).astype(np.float64)
+    # The curve end belongs to the last non-empty span.
+    last = np.flatnonzero(knots[:-1] < knots[1:])[-1]
+    basis[u[:, 0] >= knots[-1], last] = 1.0
+    for k in range(1, degree + 1):
+        left = knots[k:-1] - knots[:-k - 1]
+        right = knots[k + 1:] - knots[1:-k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            a = np.where(left > 0, (u - knots[:-k - 1]) / left, 0.0)
+            b = np.where(right > 0, (knots[k + 1:] - u) / right, 0.0)
+        basis = a * basis[:, :-1] + b * basis[:, 1:]
+    return basis
+
+
+def _interpolate_fit(fit, degree):
+    """
+    Global B-spline interpolation of fit points ((N, 2), chord-length
+    parameters, averaged knots): (degree, knots, (N, 2) control points), or
+    None when there are fewer than two distinct points. End tangents are
+    left free.
+    """
+    pts = np.asarray(fit, dtype=np.float64).reshape(-1, 2)
+    if len(pts) > 1:
+        pts = pts[np.r_[True, np.any(np.diff(pts, axis=0) != 0, axis=1)]]
+    if len(pts) < 2:
+        return None
+    p = int(np.clip(degree, 1, len(pts) - 1))
+    chord = np.cumsum(np.r_[0.0, np.hypot(*np.diff(pts, axis=0).T)])
+    t = chord / chord[-1]
+    inner = np.lib.stride_tricks.sliding_window_view(t[1:-1], p).mean(axis=1) if len(pts) > p + 1 else []
+    knots = np.r_[np.zeros(p + 1), inner, np.ones(p + 1)]
+    return p, knots, np.linalg.solve(_bspline_basis(p, knots, t), pts)
+
+
+def _spline_curve(degree, knots, ctrl, weights, fit):
+    """
+    A spline primitive from the NURBS data or, when that is missing or
+    unusable, interpolated through the fit points; (N, 4) lines through the
+    control points as a last resort.
+    """
+    ctrl = np.asarray(ctrl, dtype=np.float64).reshape(-1, 2)
+    if degree >= 1 and len(ctrl) > degree and len(knots) == len(ctrl) + degree + 1:
+        w = np.asarray(weights, dtype=np.float64) if len(weights) == len(ctrl) else np.ones(len(ctrl))
+        return "splines", (int(degree), np.asarray(knots, dtype=np.float64), np.column_stack((ctrl, w)))
+    curve = _interpolate_fit(fit, degree) if len(fit) > 1 else None
+    if curve is not None:
+        p, knots, ctrl = curve
+        return "splines", (p, knots, np.column_stack((ctrl, np.ones(len(ctrl)))))
+    return "lines", np.column_stack((ctrl[:-1], ctrl[1:]))
+
+
+def _spline_primitives(codes, values):
+    """Primitives of one SPLINE's raw tags: 71 degree, 40 knots, 41 weights, 10/20 control and 11/21 fit points."""
+    degree = values[codes == 71]
+    x, y = values[codes == 10], values[codes == 20]
+    fx, fy = values[codes == 11], values[codes == 21]
+    ctrl = np.column_stack((x[:len(y)], y[:len(x)]))
+    fit = np.column_stack((fx[:len(fy)], fy[:len(fx)]))
+    field, prim = _spline_curve(int(degree[-1]) if len(degree) else 3, values[codes == 40], ctrl,
+                                values[codes == 41], fit)
+    return {field: [prim]}
+
+
+def _hatch_primitives(codes, values):
+    """
+    Boundary edges of one HATCH's raw tags (fill patterns are not drawn):
+    polyline paths (with bulges, always closed) and line, arc, ellipse and
+    spline edges. Clockwise arc and ellipse edges store 360 - angle, as read
+    by ezdxf.
+    """
+    tags = list(zip(codes.tolist(), values.tolist()))
+    i = next((k for k, (code, _) in enumerate(tags) if code == 91), len(tags))
+    out = defaultdict(list)
+
+    def take(code, default=0.0):
+        nonlocal i
+        if i < len(tags) and tags[i][0] == code:
+            i += 1
+            return tags[i - 1][1]
+        return default
+
+    for _ in range(int(take(91))):
+        if int(take(92)) & 2:
+            has_bulge = take(72)
+            take(73)
+            points = []
+            for _ in range(int(take(93))):
+                points.append((take(10), take(20), take(42) if has_bulge else 0.0))
+            pts = np.array(points, dtype=np.float64).reshape(-1, 3)
+            lines, _, arcs, _ = _polyline_edges(pts, np.array([0, len(pts)]), np.array([1.0]))
+            out["lines"].append(lines)
+            out["arcs"].append(arcs)
+        else:
+            for _ in range(int(take(93))):
+                kind = int(take(72))
+                if kind == 1:
+                    out["lines"].append((take(10), take(20), take(11), take(21)))
+                elif kind in (2, 3):
+                    centre = (take(10), take(20))
+                    major = (take(11), take(21)) if kind == 3 else None
+                    r = take(40, 1.0)
+                    a0, a1 = take(50), take(51, 360.0)
+                    if not take(73, 1.0):
+                        a0, a1 = 360.0 - a1, 360.0 - a0
+                    sweep = math.radians((a1 - a0) % 360.0 or 360.0)
+                    if major is None:
+                        out["arcs"].append((*centre, r, math.radians(a0), sweep))
+                    else:
+                        out["ellipses"].append((*centre, *major, r, math.radians(a0), sweep))
+                elif kind == 4:
+                    degree = int(take(94, 3.0))
+                    rational, _ = take(73), take(74)
+                    n_knots, n_ctrl = int(take(95)), int(take(96))
+                    knots = [take(40) for _ in range(n_knots)]
+                    # Each control point is 10/20, followed by its 42 weight when rational.
+                    points = [(take(10), take(20), take(42, 1.0) if rational else 1.0) for _ in range(n_ctrl)]
+                    ctrl = [(x, y) for x, y, _ in points]
+                    weights = [w for _, _, w in points] if rational else []
+                    fit = [(take(11), take(21)) for _ in range(int(take(97)))]
+                    for code in (12, 22, 13, 23):
+                        take(code)
+                    field, prim = _spline_curve(degree, knots, ctrl, weights, fit)
+                    out[field].append(prim)
+        take(97)
+    return out
+
+
+def entity_primitives(store, visible, owners=None):
+    """
+    {owner: Primitives} of the entities on visible layers ((L,) bool, see
+    layer_visibility), restricted to the given owners (-1 = ENTITIES, b =
+    block index) when owners is not None. SPLINE and HATCH rows are decoded
+    here, and only the selected ones.
+    """
+    parts = defaultdict(lambda: defaultdict(list))
+
+    def rows(kind):
+        keep = visible[store[f"{kind}_layer"]]
+        if owners is not None:
+            keep &= np.isin(store[f"{kind}_owner"], list(owners))
+        return np.flatnonzero(keep)
+
+    def put(field, owner, data):
+        for o, chunk in _by_owner(owner, data).items():
+            parts[o][field].append(chunk)
+
+    for kind, field in (("line", "lines"), ("arc", "arcs"), ("ellipse", "ellipses"), ("text", "texts")):
+        r = rows(kind)
+        put(field, store[f"{kind}_owner"][r], store[f"{kind}_values"][r])
+    r = rows("text")
+    put("strings", store["text_owner"][r], store["text_strings"][r])
+
+    r = rows("polyline")
+    if len(r):
+        points, offsets = _ragged(store["polyline_offsets"], store["polyline_items"], r)
+        lines, line_rows, arcs, arc_rows = _polyline_edges(points, offsets, store["polyline_values"][r, 0])
+        owner = store["polyline_owner"][r]
+        put("lines", owner[line_rows], lines)
+        put("arcs", owner[arc_rows], arcs)
+
+    for kind, decode in (("spline", _spline_primitives), ("hatch", _hatch_primitives)):
+        offsets, codes, items = store[f"{kind}_offsets"], store[f"{kind}_codes"], store[f"{kind}_items"][:, 0]
+        for i in rows(kind).tolist():
+            s, e = offsets[i], offsets[i + 1]
+            target = parts[int(store[f"{kind}_owner"][i])]
+            for field, prims in decode(codes[s:e], items[s:e]).items():
+                target[field].extend(prims)
+
+    return {o: Primitives(**fields) for o, fields in parts.items()}
@@ -0,0 +1,950 @@
+"""
+DXF_Kernel_Script.py
+
+Kernel-side DXF pipeline for DXF_Visualization.
+- The file is parsed once into DXF_Entities_Script's layer-indexed columnar
+  store (cached by content hash); drawings are built from the store for a
+  set of layers (by default those the LAYER table shows), so toggling
+  layers never reparses the file, and SPLINE/HATCH rows are only decoded
+  when their layer is drawn.
+- Lines, polylines (bulges become arcs), arcs, circles, ellipses, splines
+  and hatch boundaries are reduced to straight segments. Curves are kept as
+  parameters until the drawing extent is known, then tessellated to a
+  chordal tolerance relative to that extent (few segments for small holes,
+  many for large radii). TEXT/MTEXT/ATTRIB are passed on as anchored strings.
+- Blocks stay shared geometry: INSERT, nested INSERT and MINSERT grids become
+  per-block lists of 2D affine transforms, so a block placed 10,000 times is
+  stored (and sent to the page) once.
+- Segments are packed (N, 4) float32 arrays of x1, y1, x2, y2 relative to the
+  drawing's lower-left corner (kept as float64), so float32 keeps its
+  precision on site plans with large absolute coordinates.
+- dxf_tiles adds a uniform grid index (per-tile ranges and bounds of segments
+  and block instances) for viewport culling, plus LOD levels where the
+  drawing is snapped to a pixel grid and deduplicated for zoomed-out frames.
+- Parsed drawings and tiles are cached as .npz keyed by the DXF content hash.
+- dxf_thumbnail rasterizes (Raster_Script) or writes as SVG the whole
+  drawing fitted into a few hundred pixels, for DXF_Batch_Script.
+- dxf_payload is what the page receives: a small JSON index plus one
+  deflated body of quantized, delta-coded coordinates (see _Packer),
+  cached next to the tiles and inflated in the page by DecompressionStream.
+  page_dxf does the same for the in-page parser: only the records and group
+  codes it reads, deflated.
+"""
+
+import io
+import json
+import math
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from AutoMindCloud.Cache_Script import DiskCache, file_sha256, make_key
+from AutoMindCloud.Raster_Script import CSS_DPI, encode_png, rasterize_segments
+from AutoMindCloud.Svg_Compact_Script import DEFAULT_PRECISION
+from AutoMindCloud.DXF_Entities_Script import (
+    Primitives,
+    entity_primitives,
+    iter_group_codes,
+    layer_table,
+    layer_visibility,
+    open_dxf,
+    parse_entities,
+)
+
+# Bump when the cached segment layout changes so stale .npz entries are ignored.
+_DXF_FORMAT = 5
+
+# Curves are tessellated so no chord strays more than this fraction of the
+# drawing extent from the true curve: a quarter pixel while the whole drawing
+# spans 16384 pixels (16x past the finest LOD level). Blocks use it divided
+# by their largest instance scale. The browser parser uses the same rule.
+CHORD_TOLERANCE = 2.0 ** -16
+# Bounds on segments per full circle (arcs get their share of the sweep).
+MIN_ARC_SEGMENTS = 8
+MAX_ARC_SEGMENTS = 1024
+# Bound on segments per spline knot span.
+MAX_SPAN_SEGMENTS = 256
+
+# Deepest chain of blocks inserted into blocks that is expanded.
+MAX_BLOCK_DEPTH = 16
+
+# Spatial index: about this many segments (or block instances) per grid tile.
+TILE_TARGET = 16384
+MAX_TILES_PER_AXIS = 64
+
+# LOD level j snaps the drawing to 2**j steps across its extent: exact to a
+# pixel while the whole drawing spans at most 2**j pixels on screen.
+LOD_LEVELS = (8, 9, 10, 11, 12)
+# A level is kept only if it draws at most this fraction of the full detail.
+LOD_MAX_FRACTION = 0.7
+
+# The page receives coordinates as integers of extent * 2**-QUANT_BITS
+# (float32's own precision at the far corner of the drawing).
+QUANT_BITS = 24
+
+# What the in-page parser (parseDXF in DXF_Visualization) reads of a raw DXF.
+_PAGE_SECTIONS = ("BLOCKS", "ENTITIES")
+_PAGE_RECORDS = {"BLOCK", "ENDBLK", "LINE", "ARC", "CIRCLE", "LWPOLYLINE", "POLYLINE", "VERTEX", "SEQEND", "INSERT"}
+_PAGE_CODES = {2, 10, 20, 11, 21, 40, 41, 42, 44, 45, 50, 51, 70, 71}
+
+# Thumbnails: longest side in CSS pixels and the margin around the drawing.
+THUMBNAIL_SIZE = 256
+THUMBNAIL_MARGIN = 4.0
+
+# Segments are integers of `quantum` pixels, y up from the bottom margin.
+_THUMBNAIL_SVG = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">
+  <rect width="100%" height="100%" fill="white" />
+  <path transform="translate({margin},{bottom}) scale({quantum},-{quantum})" stroke="rgb(0,0,0)" stroke-width="{stroke}" fill="none"
+    d="{d}" />
+</svg>
+"""
+
+_SEGMENT_CACHE = None
+
+
+def _segment_cache() -> DiskCache:
+    global _SEGMENT_CACHE
+    if _SEGMENT_CACHE is None:
+        _SEGMENT_CACHE = DiskCache("dxf_segments")
+    return _SEGMENT_CACHE
+
+
+def _load_npz(path):
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+
+def _save_npz(cache, key, arrays):
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    cache.write_bytes(key, buf.getvalue(), ".npz")
+
+
+def dxf_entities(path):
+    """The layer-indexed entity store of a DXF file (see DXF_Entities_Script), cached by file hash."""
+    cache = _segment_cache()
+    key = make_key(file_sha256(path), kind="entities", fmt=_DXF_FORMAT)
+    cached = cache.get(key, ".npz")
+    if cached is not None:
+        return _load_npz(cached)
+    store = parse_entities(path)
+    _save_npz(cache, key, store)
+    return store
+
+
+def dxf_layers(path):
+    """[{"name", "color", "visible", "entities"}] for every layer of a DXF file."""
+    return layer_table(dxf_entities(path))
+
+
+def arc_segment_counts(radius, sweep, tolerance):
+    """
+    Segments per arc so that no chord strays more than tolerance from the
+    arc (sagitta r (1 - cos(step / 2)) <= tolerance), within
+    MIN/MAX_ARC_SEGMENTS per full circle.
+    """
+    r = np.maximum(np.abs(radius), 1e-300)
+    step = 2.0 * np.arccos(np.clip(1.0 - tolerance / r, -1.0, 1.0))
+    n = np.ceil(sweep / np.maximum(step, 1e-12))
+    turns = sweep / (2.0 * math.pi)
+    lo = np.maximum(np.ceil(MIN_ARC_SEGMENTS * turns - 1e-9), 1)
+    return np.clip(n, lo, np.ceil(MAX_ARC_SEGMENTS * turns)).astype(np.int64)
+
+
+def _sweep_steps(start, sweep, n):
+    """Row index and start/end angle of every step when row i is split into n[i] equal steps."""
+    row = np.repeat(np.arange(len(n)), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    step = (sweep / n)[row]
+    t0 = start[row] + step * k
+    return row, t0, t0 + step
+
+
+def tessellate_arcs(arcs, tolerance):
+    """(M, 5) cx, cy, r, start, sweep -> (K, 4) segments, each arc to the chordal tolerance."""
+    cx, cy, r, start, sweep = arcs.T
+    arc, t0, t1 = _sweep_steps(start, sweep, arc_segment_counts(r, sweep, tolerance))
+    ox, oy, rr = cx[arc], cy[arc], r[arc]
+    return np.c_[ox + rr * np.cos(t0), oy + rr * np.sin(t0), ox + rr * np.cos(t1), oy + rr * np.sin(t1)]
+
+
+def tessellate_ellipses(ellipses, tolerance):
+    """
+    (M, 7) cx, cy, major_x, major_y, ratio, start, sweep -> (K, 4) segments,
+    counted as for an arc of the major radius (the ellipse never strays further).
+    """
+    cx, cy, mx, my, ratio, start, sweep = ellipses.T
+    e, t0, t1 = _sweep_steps(start, sweep, arc_segment_counts(np.hypot(mx, my), sweep, tolerance))
+    cx, cy, mx, my, ratio = cx[e], cy[e], mx[e], my[e], ratio[e]
+
+    def point(t):
+        c, s = np.cos(t), np.sin(t)
+        return cx + mx * c - ratio * my * s, cy + my * c + ratio * mx * s
+
+    return np.c_[point(t0) + point(t1)]
+
+
+def tessellate_splines(splines, tolerance):
+    """
+    [(degree, knots, (P, 3) control points x, y, weight)] -> (K, 4) segments.
+    Every knot span of a spline gets n steps with
+    p (p - 1) / 8 * max |P[i+2] - 2 P[i+1] + P[i]| / n**2 <= tolerance, the
+    flatness bound of a degree-p curve on its control polygon. Splines of one
+    degree are evaluated together with de Boor's algorithm in homogeneous
+    coordinates; splines without a non-empty span draw their control polygon.
+    """
+    parts = [np.zeros((0, 4))]
+    by_degree = defaultdict(list)
+    for spline in splines:
+        by_degree[int(spline[0])].append(spline)
+    for p, group in by_degree.items():
+        u = np.concatenate([g[1] for g in group]).astype(np.float64)
+        ctrl = np.concatenate([g[2] for g in group]).astype(np.float64)
+        count = np.array([len(g[2]) for g in group])
+        first = np.cumsum(count) - count
+        knot0 = first + np.arange(len(group)) * (p + 1)
+        owner = np.repeat(np.arange(len(group)), count)
+
+        d2 = ctrl[2:, :2] - 2.0 * ctrl[1:-1, :2] + ctrl[:-2, :2]
+        inside = owner[:-2] == owner[2:]
+        flat = np.zeros(len(group))
+        np.maximum.at(flat, owner[:-2][inside], np.hypot(d2[inside, 0], d2[inside, 1]))
+        n = np.clip(np.ceil(np.sqrt(p * (p - 1) / 8.0 * flat / max(tolerance, 1e-300))), 1, MAX_SPAN_SEGMENTS)
+        n = n.astype(np.int64)
+
+        # Non-empty knot spans [u_k, u_k+1), k = p .. P - 1 of each spline.
+        m = np.maximum(count - p, 0)
+        spline = np.repeat(np.arange(len(group)), m)
+        local = np.arange(m.sum()) - np.repeat(np.cumsum(m) - m, m) + p
+        k = knot0[spline] + local
+        ok = u[k] < u[k + 1]
+        spline, local, k = spline[ok], local[ok], k[ok]
+        for g in np.flatnonzero(np.bincount(spline, minlength=len(group)) == 0):
+            pts = group[g][2][:, :2]
+            parts.append(np.c_[pts[:-1], pts[1:]])
+        if not len(k):
+            continue
+
+        steps = n[spline]
+        span = np.repeat(np.arange(len(k)), steps)
+        f = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[span]
+        t = u[k][span] + (u[k + 1] - u[k])[span] * f
+        # Each spline also gets the end point of its last span.
+        last = np.flatnonzero(np.r_[spline[1:] != spline[:-1], True])
+        at = np.cumsum(steps)[last]
+        t = np.insert(t, at, u[k[last] + 1])
+        span = np.insert(span, at, last)
+
+        c = first[spline[span]] + local[span] - p
+        kb = k[span]
+        h = np.c_[ctrl[:, :2] * ctrl[:, 2:3], ctrl[:, 2]]
+        d = h[c[:, None] + np.arange(p + 1)]
+        for r in range(1, p + 1):
+            for j in range(p, r - 1, -1):
+                lo, hi = u[kb + j - p], u[kb + j + 1 - r]
+                alpha = ((t - lo) / np.where(hi > lo, hi - lo, 1.0))[:, None]
+                d[:, j] = (1.0 - alpha) * d[:, j - 1] + alpha * d[:, j]
+        pts = d[:, p, :2] / d[:, p, 2:3]
+        same = spline[span][1:] == spline[span][:-1]
+        parts.append(np.c_[pts[:-1][same], pts[1:][same]])
+    return np.concatenate(parts)
+
+
+def _geometry_box(prims):
+    """(x0, y0, x1, y1) of a Primitives' lines, full circles and ellipses and spline control points, or None."""
+    pts = [prims.lines.reshape(-1, 2)]
+    if len(prims.arcs):
+        cx, cy, r = prims.arcs[:, :3].T
+        pts += [np.c_[cx - r, cy - r], np.c_[cx + r, cy + r]]
+    if len(prims.ellipses):
+        cx, cy, mx, my = prims.ellipses[:, :4].T
+        r = np.hypot(mx, my)
+        pts += [np.c_[cx - r, cy - r], np.c_[cx + r, cy + r]]
+    pts += [ctrl[:, :2] for _, _, ctrl in prims.splines]
+    pts = np.concatenate(pts)
+    pts = pts[np.all(np.isfinite(pts), axis=1)]
+    if not len(pts):
+        return None
+    return np.r_[pts.min(axis=0), pts.max(axis=0)]
+
+
+def _geometry_segments(prims, tolerance):
+    """(N, 4) segments of a Primitives, curves tessellated to the given chordal tolerance."""
+    parts = [prims.lines]
+    if len(prims.arcs):
+        parts.append(tessellate_arcs(prims.arcs, tolerance))
+    if len(prims.ellipses):
+        parts.append(tessellate_ellipses(prims.ellipses, tolerance))
+    if prims.splines:
+        parts.append(tessellate_splines(prims.splines, tolerance))
+    return np.concatenate(parts)
+
+
+def _has_segments(prims):
+    return len(prims.lines) + len(prims.arcs) + len(prims.ellipses) + len(prims.splines) > 0
+
+
+def _affine(px, py, sx, sy, rot, base=(0.0, 0.0)):
+    """3x3 matrix of translate(p) . rotate(rot) . scale(sx, sy) . translate(-base)."""
+    c, s = math.cos(rot), math.sin(rot)
+    return np.array([
+        [c * sx, -s * sy, px - c * sx * base[0] + s * sy * base[1]],
+        [s * sx, c * sy, py - s * sx * base[0] - c * sy * base[1]],
+        [0.0, 0.0, 1.0],
+    ])
+
+
+def _insert_matrices(insert, base):
+    """
+    World matrices of one INSERT record: a single placement, or the
+    columns x rows grid of a MINSERT (spacing measured in the rotated frame).
+    """
+    px, py, sx, sy, rot, cols, rows, col_step, row_step = insert
+    c, s = math.cos(rot), math.sin(rot)
+    out = []
+    for j in range(max(int(rows), 1)):
+        for i in range(max(int(cols), 1)):
+            ox, oy = i * col_step, j * row_step
+            out.append(_affine(px + c * ox - s * oy, py + s * ox + c * oy, sx, sy, rot, base))
+    return out
+
+
+def transform_segments(segs, matrices):
+    """(K, 4) segments under each of (I, 3, 3) matrices -> (I * K, 4)."""
+    m = np.asarray(matrices, dtype=np.float64)
+    x, y = segs[None, :, 0::2], segs[None, :, 1::2]
+    a, b, e = m[:, 0, 0, None, None], m[:, 0, 1, None, None], m[:, 0, 2, None, None]
+    c, d, f = m[:, 1, 0, None, None], m[:, 1, 1, None, None], m[:, 1, 2, None, None]
+    out = np.empty((len(m), len(segs), 4))
+    out[..., 0::2] = a * x + b * y + e
+    out[..., 1::2] = c * x + d * y + f
+    return out.reshape(-1, 4)
+
+
+def transform_texts(texts, matrices):
+    """
+    (T, 6) x, y, height, rotation, halign, valign under each of (I, 3, 3)
+    matrices -> (I * T, 6): anchors moved, heights scaled by the y axis
+    scale, rotations turned with the x axis.
+    """
+    m = np.asarray(matrices, dtype=np.float64)
+    out = np.repeat(texts[None], len(m), axis=0)
+    x, y = texts[None, :, 0], texts[None, :, 1]
+    out[..., 0] = m[:, 0, 0, None] * x + m[:, 0, 1, None] * y + m[:, 0, 2, None]
+    out[..., 1] = m[:, 1, 0, None] * x + m[:, 1, 1, None] * y + m[:, 1, 2, None]
+    out[..., 2] *= np.hypot(m[:, 0, 1], m[:, 1, 1])[:, None]
+    out[..., 3] += np.arctan2(m[:, 1, 0], m[:, 0, 0])[:, None]
+    return out.reshape(-1, 6)
+
+
+def _block_inserts(store, visible):
+    """{owner: [(block name, insert values)]} of the INSERTs on visible layers."""
+    out = defaultdict(list)
+    rows = np.flatnonzero(visible[store["insert_layer"]])
+    for owner, name, values in zip(
+        store["insert_owner"][rows].tolist(), store["insert_strings"][rows].tolist(), store["insert_values"][rows].tolist()
+    ):
+        out[owner].append((name, tuple(values)))
+    return out
+
+
+def resolve_instances(blocks, inserts, max_depth=MAX_BLOCK_DEPTH):
+    """
+    Expand INSERT records, including inserts nested in blocks and MINSERT
+    grids, into {block name: (I, 3, 3) world matrices}. blocks maps names to
+    (Primitives, base point, [(child name, insert values)]); blocks without
+    geometry of their own get no entry, missing and self-referencing blocks
+    are ignored.
+    """
+    out = {}
+    stack = [(name, np.eye(3), ins, 0) for name, ins in inserts]
+    while stack:
+        name, parent, ins, depth = stack.pop()
+        if name not in blocks or depth >= max_depth:
+            continue
+        prims, base, children = blocks[name]
+        for m in _insert_matrices(ins, base):
+            world = parent @ m
+            if len(prims):
+                out.setdefault(name, []).append(world)
+            stack.extend((child, world, child_ins, depth + 1) for child, child_ins in children)
+    return {name: np.array(ms) for name, ms in out.items()}
+
+
+def _placed_chunks(segments, block_segments, block_ranges, instance_block, instance_transforms,
+                   chunk=1 << 20):
+    """Every segment with instances placed, as float64 arrays of about `chunk` rows."""
+    for i in range(0, len(segments), chunk):
+        yield np.asarray(segments[i:i + chunk], dtype=np.float64)
+    for b, (start, count) in enumerate(block_ranges.tolist()):
+        segs = np.asarray(block_segments[start:start + count], dtype=np.float64)
+        mats = _matrices(instance_transforms[instance_block == b])
+        step = max(1, chunk // max(count, 1))
+        for i in range(0, len(mats), step):
+            yield transform_segments(segs, mats[i:i + step])
+
+
+def _drawing_bounds(*arrays):
+    """Exact world bounds, placing instances a chunk at a time."""
+    lo, hi = np.full(2, np.inf), np.full(2, -np.inf)
+    for segs in _placed_chunks(*arrays):
+        segs = segs[np.all(np.isfinite(segs), axis=1)]
+        if len(segs):
+            pts = segs.reshape(-1, 2)
+            lo = np.minimum(lo, pts.min(axis=0))
+            hi = np.maximum(hi, pts.max(axis=0))
+    if not np.all(np.isfinite(lo)):
+        return np.zeros(4)
+    return np.r_[lo, hi]
+
+
+def _instance_boxes(mats, box):
+    """(I, 2) lower and upper corners of a block box placed by (I, 3, 3) matrices."""
+    x0, y0, x1, y1 = box
+    corners = np.array([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]], dtype=np.float64)
+    placed = np.einsum("nij,kj->nki", mats, corners)[..., :2]
+    return placed.min(axis=1), placed.max(axis=1)
+
+
+def _max_scale(mats):
+    """Largest axis scale among (I, 3, 3) matrices."""
+    return float(max(np.hypot(mats[:, 0, 0], mats[:, 1, 0]).max(), np.hypot(mats[:, 0, 1], mats[:, 1, 1]).max()))
+
+
+def _matrices(transforms):
+    """(I, 6) a, b, c, d, e, f (canvas setTransform order) -> (I, 3, 3)."""
+    t = np.asarray(transforms, dtype=np.float64)
+    m = np.zeros((len(t), 3, 3))
+    m[:, 0, 0], m[:, 1, 0], m[:, 0, 1], m[:, 1, 1], m[:, 0, 2], m[:, 1, 2] = t.T
+    m[:, 2, 2] = 1.0
+    return m
+
+
+def _layer_key(layers):
+    """Sorted layer names, or None for the LAYER table's own visibility."""
+    if layers is None:
+        return None
+    return sorted({str(name) for name in ([layers] if isinstance(layers, str) else layers)})
+
+
+def dxf_drawing(path, layers=None):
+    """
+    Parsed DXF with shared block geometry, cached by file hash and layer set:
+      {"segments": (N, 4) float32 ENTITIES segments relative to origin,
+       "block_names": (B,) str, "block_segments": (K, 4) float32 in block coordinates,
+       "block_ranges": (B, 2) int64 start/count into block_segments,
+       "instance_block": (I,) int32, "instance_transforms": (I, 6) float64
+       a, b, c, d, e, f mapping block coordinates to origin-relative world
+       coordinates (x' = a x + c y + e, y' = b x + d y + f),
+       "text_values": (T, 6) float64 x, y, height, rotation, halign, valign
+       (origin-relative, block texts placed per instance), "text_strings": (T,) str,
+       "origin": (2,) float64, "bounds": (4,) float64 min x, min y, max x, max y}.
+
+    layers: names of the layers to draw (None = the layers the DXF shows).
+    An INSERT on a hidden layer hides its whole block instance; entities
+    inside blocks follow their own layer.
+
+    Memory grows with the unique geometry plus six numbers per insert, however
+    many times a block is placed.
+    """
+    layers = _layer_key(layers)
+    cache = _segment_cache()
+    key = make_key(file_sha256(path), kind="drawing", fmt=_DXF_FORMAT, chord_tolerance=CHORD_TOLERANCE,
+                   arc_segments=(MIN_ARC_SEGMENTS, MAX_ARC_SEGMENTS), span_segments=MAX_SPAN_SEGMENTS,
+                   layers=layers)
+    cached = cache.get(key, ".npz")
+    if cached is not None:
+        return _load_npz(cached)
+
+    store = dxf_entities(path)
+    visible = layer_visibility(store, layers)
+    inserts = _block_inserts(store, visible)
+    index = {name: b for b, name in enumerate(store["block_names"].tolist())}
+
+    # Only ENTITIES and blocks reachable through drawn INSERTs are decoded.
+    owners, todo = {-1}, [-1]
+    while todo:
+        for name, _ in inserts.get(todo.pop(), ()):
+            b = index.get(name)
+            if b is not None and b not in owners:
+                owners.add(b)
+                todo.append(b)
+    prims = entity_primitives(store, visible, owners)
+    empty = Primitives()
+    blocks = {
+        name: (prims.get(b, empty), tuple(store["block_bases"][b]), inserts.get(b, []))
+        for name, b in index.items()
+    }
+    instances = resolve_instances(blocks, inserts.get(-1, []))
+    entities = prims.get(-1, empty)
+    names = sorted(n for n in instances if _has_segments(blocks[n][0]))
+
+    # Chordal tolerance from the extent of full curves and placed block boxes.
+    boxes = [b for b in [_geometry_box(entities)] if b is not None]
+    for n in names:
+        box = _geometry_box(blocks[n][0])
+        if box is not None:
+            lo, hi = _instance_boxes(instances[n], box)
+            boxes.append(np.r_[lo.min(axis=0), hi.max(axis=0)])
+    boxes = np.array(boxes).reshape(-1, 4)
+    extent = max(np.max(boxes[:, 2:], axis=0) - np.min(boxes[:, :2], axis=0)) if len(boxes) else 0.0
+    tolerance = CHORD_TOLERANCE * (extent or 1.0)
+
+    segments = _geometry_segments(entities, tolerance)
+    block_segs = [_geometry_segments(blocks[n][0], tolerance / max(_max_scale(instances[n]), 1e-12)) for n in names]
+    counts = np.array([len(s) for s in block_segs], dtype=np.int64)
+    block_ranges = np.c_[np.cumsum(counts) - counts, counts].astype(np.int64).reshape(-1, 2)
+    block_segments = np.concatenate(block_segs) if names else np.zeros((0, 4))
+    instance_block = np.concatenate(
+        [np.full(len(instances[n]), b, dtype=np.int32) for b, n in enumerate(names)]
+    ) if names else np.zeros(0, dtype=np.int32)
+    mats = np.concatenate([instances[n] for n in names]) if names else np.zeros((0, 3, 3))
+    transforms = np.c_[mats[:, 0, 0], mats[:, 1, 0], mats[:, 0, 1], mats[:, 1, 1], mats[:, 0, 2], mats[:, 1, 2]]
+
+    texts, strings = [entities.texts], [entities.strings]
+    for n in sorted(instances):
+        block = blocks[n][0]
+        if len(block.texts):
+            texts.append(transform_texts(block.texts, instances[n]))
+            strings.append(np.tile(block.strings, len(instances[n])))
+    texts = np.concatenate(texts)
+
+    segments = segments[np.all(np.isfinite(segments), axis=1)]
+    bounds = _drawing_bounds(segments, block_segments, block_ranges, instance_block, transforms)
+    origin = bounds[:2].copy()
+    transforms[:, 4:] -= origin
+    texts[:, :2] -= origin
+    drawing = {
+        "segments": (segments - np.tile(origin, 2)).astype(np.float32),
+        "block_names": np.array(names, dtype=str),
+        "block_segments": block_segments.astype(np.float32),
+        "block_ranges": block_ranges,
+        "instance_block": instance_block,
+        "instance_transforms": transforms,
+        "text_values": texts,
+        "text_strings": np.concatenate(strings),
+        "origin": origin,
+        "bounds": bounds,
+    }
+    _save_npz(cache, key, drawing)
+    return drawing
+
+
+def flatten_drawing(drawing):
+    """Every segment of a dxf_drawing, instances placed, as (N, 4) float32 relative to origin."""
+    parts = [drawing["segments"]]
+    block_segments = drawing["block_segments"].astype(np.float64)
+    for b, (start, count) in enumerate(drawing["block_ranges"].tolist()):
+        mats = _matrices(drawing["instance_transforms"][drawing["instance_block"] == b])
+        parts.append(transform_segments(block_segments[start:start + count], mats).astype(np.float32))
+    return np.concatenate(parts)
+
+
+def dxf_segments(path, layers=None):
+    """
+    Parsed DXF with blocks expanded:
+      {"segments": (N, 4) float32 relative to origin, "origin": (2,) float64,
+       "bounds": (4,) float64 min x, min y, max x, max y in world units}.
+    """
+    drawing = dxf_drawing(path, layers)
+    return {
+        "segments": flatten_drawing(drawing),
+        "origin": drawing["origin"],
+        "bounds": drawing["bounds"],
+    }
+
+
+def _drawing_arrays(drawing):
+    return (drawing["segments"], drawing["block_segments"], drawing["block_ranges"],
+            drawing["instance_block"], drawing["instance_transforms"])
+
+
+def _tile_grid(width, height, items):
+    """Square tile size and (columns, rows) giving about TILE_TARGET items per tile."""
+    extent = max(width, height) or 1.0
+    n = int(np.clip(math.ceil(math.sqrt(items / TILE_TARGET)), 1, MAX_TILES_PER_AXIS))
+    size = extent / n
+    return size, (max(1, math.ceil(width / size - 1e-9)), max(1, math.ceil(height / size - 1e-9)))
+
+
+def _tile_of(points, size, grid):
+    ix = np.clip(np.floor(points[:, 0] / size).astype(np.int64), 0, grid[0] - 1)
+    iy = np.clip(np.floor(points[:, 1] / size).astype(np.int64), 0, grid[1] - 1)
+    return iy * grid[0] + ix
+
+
+def _tile_table(keys, lo, hi):
+    """
+    (K, 3) start, count and group key rows plus (K, 4) bounds for items
+    already sorted by key; keys are (N,) or (N, k) int arrays.
+    """
+    if not len(keys):
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, 0), dtype=np.int64), np.zeros((0, 4))
+    k = keys.reshape(len(keys), -1)
+    start = np.flatnonzero(np.r_[True, np.any(k[1:] != k[:-1], axis=1)])
+    count = np.diff(np.r_[start, len(keys)])
+    bounds = np.c_[np.minimum.reduceat(lo, start, axis=0), np.maximum.reduceat(hi, start, axis=0)]
+    return np.c_[start, count], k[start], bounds
+
+
+def _segment_keys(g, n):
+    """
+    One int64 per quantized segment (endpoints in [0, n]), independent of
+    direction; zero-length segments are dropped.
+    """
+    g = np.clip(g, 0, n)
+    swap = (g[:, 0] > g[:, 2]) | ((g[:, 0] == g[:, 2]) & (g[:, 1] > g[:, 3]))
+    g[swap] = g[swap][:, [2, 3, 0, 1]]
+    g = g[(g[:, 0] != g[:, 2]) | (g[:, 1] != g[:, 3])]
+    base = n + 1
+    return ((g[:, 0] * base + g[:, 1]) * base + g[:, 2]) * base + g[:, 3]
+
+
+def _decode_keys(keys, n):
+    base = n + 1
+    out = np.empty((len(keys), 4), dtype=np.int64)
+    for col in (3, 2, 1, 0):
+        keys, out[:, col] = np.divmod(keys, base)
+    return out
+
+
+def _lod_levels(drawing, extent, full_count):
+    """
+    [(level, (M, 4) int64 grid segments)] from coarsest to finest. Level j
+    snaps endpoints to extent / 2**j and merges duplicates, so it is exact to
+    a pixel while the drawing spans at most 2**j pixels. Levels drawing more
+    than LOD_MAX_FRACTION of the full detail are dropped.
+    """
+    finest = max(LOD_LEVELS)
+    n = 1 << finest
+    quantum = extent / n
+    keys = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [
+        np.unique(_segment_keys(np.rint(segs / quantum).astype(np.int64), n))
+        for segs in _placed_chunks(*_drawing_arrays(drawing))
+    ]))
+    levels = []
+    for j in range(finest, min(LOD_LEVELS) - 1, -1):
+        if j < finest:
+            # Halve the previous level's grid (error stays under one level quantum).
+            keys = np.unique(_segment_keys((_decode_keys(keys, 2 << j) + 1) // 2, 1 << j))
+        if j in LOD_LEVELS and len(keys) <= LOD_MAX_FRACTION * full_count:
+            levels.append((j, _decode_keys(keys, 1 << j)))
+    return levels[::-1]
+
+
+def _tiles_key(path, layers, **params):
+    return make_key(
+        file_sha256(path), fmt=_DXF_FORMAT, chord_tolerance=CHORD_TOLERANCE,
+        arc_segments=(MIN_ARC_SEGMENTS, MAX_ARC_SEGMENTS), span_segments=MAX_SPAN_SEGMENTS,
+        layers=_layer_key(layers), tile_target=TILE_TARGET, lod_levels=LOD_LEVELS, lod_max_fraction=LOD_MAX_FRACTION,
+        **params,
+    )
+
+
+def dxf_tiles(path, layers=None):
+    """
+    dxf_drawing (for the given layers) plus a uniform grid index for viewport culling and pixel-level
+    LOD, cached by file hash. Adds (all coordinates origin-relative):
+      "tile_size": float, "tile_grid": (2,) columns and rows,
+      "segment_tiles": (T, 2) start/count of each non-empty tile in the
+        tile-sorted "segments", "segment_tile_ids": (T,), "segment_tile_bounds": (T, 4),
+      "instance_tiles": (U, 2) start/count in the (block, tile)-sorted instance
+        arrays, "instance_tile_ids": (U, 2) block and tile, "instance_tile_bounds": (U, 4),
+      "lod_levels": (L,) j, "lod_quantum": (L,), "lod_ranges": (L, 2) into
+        "lod_segments": (M, 4) uint16 grid coordinates (times lod_quantum),
+        "lod_tiles": (V, 2), "lod_tile_ids": (V, 2) level index and tile, "lod_tile_bounds": (V, 4).
+    """
+    cache = _segment_cache()
+    key = _tiles_key(path, layers, kind="tiles")
+    cached = cache.get(key, ".npz")
+    if cached is not None:
+        return _load_npz(cached)
+
+    drawing = dict(dxf_drawing(path, layers))
+    width, height = drawing["bounds"][2:] - drawing["bounds"][:2]
+    extent = max(width, height) or 1.0
+    block_counts = drawing["block_ranges"][:, 1] if len(drawing["block_ranges"]) else np.zeros(0, np.int64)
+    instances = len(drawing["instance_block"])
+    size, grid = _tile_grid(width, height, len(drawing["segments"]) + instances)
+
+    # Direct segments: tile of the midpoint, tile bounds cover whole segments.
+    segs = drawing["segments"]
+    tile = _tile_of((segs[:, :2] + segs[:, 2:]) / 2, size, grid)
+    order = np.argsort(tile, kind="stable")
+    segs, tile = segs[order], tile[order]
+    table, ids, tb = _tile_table(tile, np.minimum(segs[:, :2], segs[:, 2:]), np.maximum(segs[:, :2], segs[:, 2:]))
+    drawing["segments"] = segs
+    drawing.update(segment_tiles=table, segment_tile_ids=ids.reshape(-1), segment_tile_bounds=tb)
+
+    # Instances: tile of the placed block box centre, sorted by (block, tile).
+    lo = np.zeros((instances, 2))
+    hi = np.zeros((instances, 2))
+    mats = _matrices(drawing["instance_transforms"])
+    for b, (start, count) in enumerate(drawing["block_ranges"].tolist()):
+        pts = drawing["block_segments"][start:start + count].reshape(-1, 2)
+        sel = drawing["instance_block"] == b
+        lo[sel], hi[sel] = _instance_boxes(mats[sel], np.r_[pts.min(axis=0), pts.max(axis=0)])
+    tile = _tile_of((lo + hi) / 2, size, grid)
+    order = np.lexsort((tile, drawing["instance_block"]))
+    for k in ("instance_block", "instance_transforms"):
+        drawing[k] = drawing[k][order]
+    table, ids, tb = _tile_table(np.c_[drawing["instance_block"], tile[order]], lo[order], hi[order])
+    drawing.update(instance_tiles=table, instance_tile_ids=ids.reshape(-1, 2), instance_tile_bounds=tb)
+
+    # LOD levels, tiled the same way.
+    full = len(segs) + int(np.bincount(drawing["instance_block"], minlength=len(block_counts)) @ block_counts)
+    lod_levels, lod_quantum, lod_ranges, lod_segs, lod_tables, lod_ids, lod_bounds = [], [], [], [], [], [], []
+    offset = 0
+    for li, (j, g) in enumerate(_lod_levels(drawing, extent, full)):
+        q = extent / (1 << j)
+        tile = _tile_of((g[:, :2] + g[:, 2:]) * (q / 2), size, grid)
+        order = np.argsort(tile, kind="stable")
+        g, tile = g[order], tile[order]
+        table, ids, tb = _tile_table(tile, np.minimum(g[:, :2], g[:, 2:]) * q, np.maximum(g[:, :2], g[:, 2:]) * q)
+        lod_levels.append(j)
+        lod_quantum.append(q)
+        lod_ranges.append((offset, len(g)))
+        lod_segs.append(g.astype(np.uint16))
+        lod_tables.append(table + (offset, 0))
+        lod_ids.append(np.c_[np.full(len(ids), li), ids.reshape(-1)])
+        lod_bounds.append(tb)
+        offset += len(g)
+    drawing.update(
+        tile_size=np.float64(size),
+        tile_grid=np.array(grid, dtype=np.int64),
+        lod_levels=np.array(lod_levels, dtype=np.int64),
+        lod_quantum=np.array(lod_quantum, dtype=np.float64),
+        lod_ranges=np.array(lod_ranges, dtype=np.int64).reshape(-1, 2),
+        lod_segments=np.concatenate(lod_segs) if lod_segs else np.zeros((0, 4), dtype=np.uint16),
+        lod_tiles=np.concatenate(lod_tables) if lod_tables else np.zeros((0, 2), dtype=np.int64),
+        lod_tile_ids=np.concatenate(lod_ids) if lod_ids else np.zeros((0, 2), dtype=np.int64),
+        lod_tile_bounds=np.concatenate(lod_bounds) if lod_bounds else np.zeros((0, 4)),
+    )
+    _save_npz(cache, key, drawing)
+    return drawing
+
+
+class _Packer:
+    """
+    Binary body of the compact payload. Parts are appended in order and
+    described in the JSON by {"at": byte offset, "count": ...}; the whole
+    body is deflated once by compress().
+    - floats: float32 values, byte-shuffled (all first bytes, then all
+      second bytes, ...) so that deflate sees the runs of similar exponents.
+    - segments: (N, 4) coordinates as integers of `quantum` above `origin`,
+      delta-coded (x1, y1 against the previous segment's end, x2, y2 against
+      x1, y1: connected polylines cost two zeros per segment), zigzagged
+      to unsigned and byte-shuffled as uint32.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def _add(self, raw, desc):
+        desc["at"] = self.size
+        self.parts.append(raw)
+        self.size += len(raw)
+        return desc
+
+    def floats(self, arr):
+        a = np.ascontiguousarray(arr, dtype="<f4").reshape(-1)
+        return self._add(_shuffle(a), {"count": int(a.size)})
+
+    def grid(self, grid, quantum, origin=(0.0, 0.0)):
+        g = np.asarray(grid, dtype=np.int64).reshape(-1, 4)
+        d = np.empty_like(g)
+        d[:, :2] = g[:, :2]
+        d[1:, :2] -= g[:-1, 2:]
+        d[:, 2:] = g[:, 2:] - g[:, :2]
+        z = ((d << 1) ^ (d >> 63)).astype("<u4")
+        return self._add(_shuffle(z), {
+            "count": int(len(g)), "quantum": float(quantum), "origin": [float(v) for v in origin],
+        })
+
+    def segments(self, segs, origin=None):
+        """Quantize to the box's extent times 2**-QUANT_BITS (origin: the box corner unless given)."""
+        segs = np.asarray(segs, dtype=np.float64).reshape(-1, 4)
+        pts = segs.reshape(-1, 2)
+        if origin is None:
+            origin = pts.min(axis=0) if len(pts) else (0.0, 0.0)
+        lo = np.asarray(origin, dtype=np.float64)
+        extent = float(np.abs(pts - lo).max()) if len(pts) else 0.0
+        quantum = (extent or 1.0) * 2.0 ** -QUANT_BITS
+        return self.grid(np.rint((segs - np.tile(lo, 2)) / quantum), quantum, lo)
+
+    def compress(self) -> bytes:
+        return zlib.compress(b"".join(self.parts), 6)
+
+
+def _shuffle(arr) -> bytes:
+    """Bytes of an array's values regrouped by byte position (undone by unshuffle in the page)."""
+    a = np.ascontiguousarray(arr).reshape(-1)
+    return a.view(np.uint8).reshape(-1, a.itemsize).T.tobytes()
+
+
+def _tile_rows(table, bounds):
+    """[[start, count, x0, y0, x1, y1], ...] for the page's culling loop."""
+    return [
+        [int(a), int(n), round(float(x0), 6), round(float(y0), 6), round(float(x1), 6), round(float(y1), 6)]
+        for (a, n), (x0, y0, x1, y1) in zip(table.tolist(), bounds.tolist())
+    ]
+
+
+def tiles_payload(tiles):
+    """
+    Compact transfer form of a dxf_tiles result: (payload, body), where body
+    is the deflated binary of _Packer and payload the JSON-ready index into
+    it: direct segments relative to origin with their tiles, one entry per
+    block (segments in block coordinates, float32 (I, 6) transforms, tiles),
+    LOD levels as their uint16 grids, and the texts as float32 (T, 6) anchors
+    with their strings. HEADER variables, comments and everything else of
+    the DXF that is not drawn never reach the page.
+    """
+    pack = _Packer()
+    payload = {
+        "segments": pack.segments(tiles["segments"], origin=(0.0, 0.0)),
+        "segmentTiles": _tile_rows(tiles["segment_tiles"], tiles["segment_tile_bounds"]),
+        "blocks": [],
+        "lod": [],
+    }
+    for b, (start, count) in enumerate(tiles["block_ranges"].tolist()):
+        sel = tiles["instance_block"] == b
+        first = int(np.flatnonzero(sel)[0]) if sel.any() else 0
+        rows = tiles["instance_tile_ids"][:, 0] == b
+        payload["blocks"].append({
+            "name": str(tiles["block_names"][b]),
+            "segments": pack.segments(tiles["block_segments"][start:start + count]),
+            "transforms": pack.floats(tiles["instance_transforms"][sel]),
+            "instances": int(sel.sum()),
+            "tiles": _tile_rows(tiles["instance_tiles"][rows] - (first, 0), tiles["instance_tile_bounds"][rows]),
+        })
+    for li, (j, q, (start, count)) in enumerate(zip(
+        tiles["lod_levels"].tolist(), tiles["lod_quantum"].tolist(), tiles["lod_ranges"].tolist()
+    )):
+        rows = tiles["lod_tile_ids"][:, 0] == li
+        payload["lod"].append({
+            "level": j,
+            "segments": pack.grid(tiles["lod_segments"][start:start + count], q),
+            "tiles": _tile_rows(tiles["lod_tiles"][rows] - (start, 0), tiles["lod_tile_bounds"][rows]),
+        })
+    payload["texts"] = {
+        "values": pack.floats(tiles["text_values"]),
+        "strings": tiles["text_strings"].tolist(),
+    }
+    payload["origin"] = [float(v) for v in tiles["origin"]]
+    payload["bounds"] = [float(v) for v in tiles["bounds"]]
+    payload["tileSize"] = float(tiles["tile_size"])
+    payload["tileGrid"] = [int(v) for v in tiles["tile_grid"]]
+    return payload, pack.compress()
+
+
+def dxf_payload(path, layers=None):
+    """
+    tiles_payload of dxf_tiles(path, layers), cached by file hash next to the
+    tiles (the JSON as .json, the deflated body as .deflate), so showing a
+    drawing again only reads two files.
+    """
+    cache = _segment_cache()
+    key = _tiles_key(path, layers, kind="payload", quant_bits=QUANT_BITS)
+    meta, body = cache.read_bytes(key, ".json"), cache.read_bytes(key, ".deflate")
+    if meta is not None and body is not None:
+        return json.loads(meta.decode("utf-8")), body
+    payload, body = tiles_payload(dxf_tiles(path, layers))
+    cache.write_bytes(key, body, ".deflate")
+    cache.write_bytes(key, json.dumps(payload).encode("utf-8"), ".json")
+    return payload, body
+
+
+def _thumbnail_layout(width, height, size):
+    """(page width, page height, scale, tx, ty) fitting a drawing from (0, 0) to (width, height) into size px, y up."""
+    m = THUMBNAIL_MARGIN
+    scale = (size - 2 * m) / max(width, height, 1e-9)
+    page_w, page_h = math.ceil(width * scale + 2 * m), math.ceil(height * scale + 2 * m)
+    return page_w, page_h, scale, m / scale, -height - m / scale
+
+
+def _snap_segments(segments, quantum):
+    """Segments snapped to a grid of quantum, without zero-length and repeated (either direction) ones."""
+    q = np.rint(np.asarray(segments, dtype=np.float64) / quantum).astype(np.int64).reshape(-1, 4)
+    swap = (q[:, 0] > q[:, 2]) | ((q[:, 0] == q[:, 2]) & (q[:, 1] > q[:, 3]))
+    q[swap] = q[swap][:, [2, 3, 0, 1]]
+    q = q[(q[:, 0] != q[:, 2]) | (q[:, 1] != q[:, 3])]
+    return np.unique(q, axis=0) * quantum
+
+
+def dxf_thumbnail(path, fmt="png", size=THUMBNAIL_SIZE, layers=None, dpi=CSS_DPI, precision=DEFAULT_PRECISION):
+    """
+    Preview of the whole drawing (blocks placed, texts left out) fitted into
+    size CSS pixels on its longest side, black on white: PNG bytes at dpi
+    for fmt="png", SVG text (one path, coordinates in steps of precision
+    pixels) for fmt="svg". Segments are snapped to that grid (a quarter
+    output pixel for PNG) and deduplicated first, so a dense drawing costs
+    little more than its thumbnail. Cached by file hash.
+    """
+    if fmt not in ("png", "svg"):
+        raise ValueError(f"fmt must be 'png' or 'svg', got {fmt!r}")
+    cache = _segment_cache()
+    key = _tiles_key(path, layers, kind="thumbnail", image=fmt, size=size, dpi=dpi, precision=precision)
+    data = cache.read_bytes(key, "." + fmt)
+    if data is not None:
+        return data if fmt == "png" else data.decode("utf-8")
+
+    drawing = dxf_segments(path, layers)
+    width, height = drawing["bounds"][2:] - drawing["bounds"][:2]
+    page_w, page_h, scale, tx, ty = _thumbnail_layout(width, height, size)
+    if fmt == "png":
+        segs = _snap_segments(drawing["segments"], 0.25 / (scale * dpi / CSS_DPI))
+        data = encode_png(rasterize_segments(segs, page_w, page_h, scale, tx, ty, dpi))
+    else:
+        q = np.rint(_snap_segments(drawing["segments"], precision / scale) * (scale / precision)).astype(np.int64)
+        q[:, 2:] -= q[:, :2]
+        data = _THUMBNAIL_SVG.format(
+            width=page_w, height=page_h, margin=THUMBNAIL_MARGIN, bottom=f"{THUMBNAIL_MARGIN + height * scale:.6g}",
+            quantum=f"{precision:.6g}", stroke=f"{1.0 / precision:.6g}",
+            d="".join(f"M{x} {y}l{dx} {dy}" for x, y, dx, dy in q.tolist()),
+        ).encode("utf-8")
+    cache.write_bytes(key, data, "." + fmt)
+    return data if fmt == "png" else data.decode("utf-8")
+
+
+def page_dxf(path) -> bytes:
+    """
+    The DXF text the in-page parser needs, deflated and cached by file hash:
+    the BLOCKS and ENTITIES sections with only the group codes of the records
+    parseDXF decodes (other records keep their code-0 line, which still ends
+    a POLYLINE). HEADER, TABLES, OBJECTS, handles and comments are dropped.
+    """
+    cache = _segment_cache()
+    key = make_key(file_sha256(path), kind="page_dxf")
+    data = cache.read_bytes(key, ".deflate")
+    if data is not None:
+        return data
+    out = []
+    section = None
+    keep = False
+    with open_dxf(path) as f:
+        for code, value in iter_group_codes(f):
+            if code == 0:
+                keep = False
+                if value == "SECTION":
+                    section = ""
+                elif value == "ENDSEC":
+                    if section in _PAGE_SECTIONS:
+                        out.append("0\nENDSEC")
+                    section = None
+                elif section in _PAGE_SECTIONS:
+                    out.append("0\n" + value)
+                    keep = value in _PAGE_RECORDS
+            elif section == "" and code == 2:
+                section = value
+                if section in _PAGE_SECTIONS:
+                    out.append("0\nSECTION\n2\n" + value)
+            elif keep and code in _PAGE_CODES:
+                out.append(f"{code}\n{value}")
+    out.append("0\nEOF\n")
+    data = zlib.compress("\n".join(out).encode("utf-8"), 6)
+    cache.write_bytes(key, data, ".deflate")
+    return data
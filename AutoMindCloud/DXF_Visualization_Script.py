@@ -1,4 +1,8 @@
 import base64
+import json
+import uuid
+import hashlib
+from html import escape
 from IPython.display import HTML
 
 import os
@@ -103,22 +107,128 @@ def Download_DXF(Drive_link: str, show_output: bool = False):
         os.remove(zip_path)
 
 
-def DXF_Visualization(file_path):
-    # Leer el archivo DXF y convertirlo a base64
-    with open(file_path, "rb") as f:
-        data = f.read()
+# Deflated bodies sent in this session: content key -> how to build the body
+# again (file_path, parse_on, layers) for the 'automind_dxf_blob' callback.
+# Only Colab has that channel back to the kernel, so only there is a body
+# sent earlier left out of later outputs.
+_SENT_BLOBS = {}
+_BLOB_CALLBACK_REGISTERED = False
+
+
+def _blob(file_path, parse_on, layers):
+    """(payload index or None, deflated body) the page receives."""
+    if parse_on == "kernel":
+        from AutoMindCloud.DXF_Kernel_Script import dxf_payload
+        return dxf_payload(file_path, layers)
+    from AutoMindCloud.DXF_Kernel_Script import page_dxf
+    return None, page_dxf(file_path)
+
+
+def _register_blob_callback():
+    """
+    Registers the Colab callback 'automind_dxf_blob': returns the base64 body
+    of a content key sent earlier, for viewers whose output frame does not
+    hold it (each Colab output has its own window). False outside Colab.
+    """
+    global _BLOB_CALLBACK_REGISTERED
+    if _BLOB_CALLBACK_REGISTERED:
+        return True
+    try:
+        from google.colab import output  # type: ignore
+        from IPython.display import JSON
+
+        def _send(key):
+            # The registry only keeps where a body came from: rebuild it and
+            # check it still has the requested hash (the file may have been
+            # overwritten since, e.g. a newer revision).
+            source = _SENT_BLOBS.get(key)
+            body = _blob(*source)[1] if source else None
+            if body is None or hashlib.sha256(body).hexdigest()[:32] != key:
+                _SENT_BLOBS.pop(key, None)
+                return JSON({"b64": None, "error": (
+                    "the DXF file changed since this output was made (or the kernel restarted); "
+                    "run the cell again to show it"
+                )})
+            return JSON({"b64": base64.b64encode(body).decode("ascii")})
+
+        output.register_callback("automind_dxf_blob", _send)
+        _BLOB_CALLBACK_REGISTERED = True
+        return True
+    except Exception:
+        return False
+
+
+def DXF_Visualization(file_path, parse_on="browser", layers=None, reuse=True):
+    """
+    2D DXF viewer drawn with WebGL (three.js LineSegments, pan with drag,
+    zoom with the wheel, double click to fit), on a 2D canvas without WebGL.
+      - parse_on: "browser" (the DXF's BLOCKS and ENTITIES are inlined
+        deflated, see DXF_Kernel_Script.page_dxf, and parsed by parseDXF in
+        the page) or "kernel" (parsed in Python by
+        DXF_Kernel_Script, cached by file hash; the page only receives the
+        deflated, quantized and delta-coded tiles of dxf_payload)
+      - layers: with parse_on="kernel", the layer names to draw (default:
+        the layers the DXF shows; see DXF_Kernel_Script.dxf_layers). The
+        kernel also draws ellipses, splines, hatch boundaries and texts
+      - blocks are drawn from one shared path per block placed once per
+        INSERT (nested inserts and MINSERT grids included), never copied
+      - segments and block instances are indexed in grid tiles; each frame
+        draws only the tiles in view, and zoomed-out frames use the kernel's
+        pixel-snapped LOD levels
+      - every call gets its own container, so several viewers (revisions
+        side by side) coexist. The body is keyed by its content hash, and
+        viewers in one window share the inflated body through the page's
+        registry. In Colab a body already sent this session is not inlined
+        again: the page fetches it through the 'automind_dxf_blob' callback,
+        which rebuilds it from the file and reports an error if the file no
+        longer has that content.
+        Elsewhere (no page -> kernel channel, and the page may have been
+        reloaded) it is always inlined. reuse=False always inlines it
+        (outputs that must stand alone)
+    """
+    if parse_on not in ("browser", "kernel"):
+        raise ValueError(f"parse_on must be 'browser' or 'kernel', got {parse_on!r}")
+    if parse_on == "browser" and layers is not None:
+        raise ValueError("layers needs parse_on='kernel'")
+    if layers is not None:
+        layers = [str(name) for name in ([layers] if isinstance(layers, str) else layers)]
+
+    payload, body = _blob(file_path, parse_on, layers)
+    key = hashlib.sha256(body).hexdigest()[:32]
+    if reuse and key in _SENT_BLOBS and _register_blob_callback():
+        # Ya enviado en esta sesión de Colab: la página lo pide por callback
+        b64 = ""
+    else:
+        b64 = base64.b64encode(body).decode("ascii")
+    _SENT_BLOBS[key] = (file_path, parse_on, layers)
+    segments_js = json.dumps(payload)
+    viewer_id = "dxf-viewer-" + uuid.uuid4().hex[:12]
 
-    b64 = base64.b64encode(data).decode("utf-8")
-    
     # Crear el HTML y reemplazar el marcador de base64
     html = """
-    <div id='viewer' style='width:900px;height:650px;border:1px solid #ccc;position:relative;'>
+    <div id='__ID__' style='width:900px;height:650px;border:1px solid #ccc;position:relative;'>
       Cargando archivo...
     </div>
 
     <script>
     (async function(){
+        const viewer = document.getElementById("__ID__");
+        // Deflated bytes: the reduced DXF text, or the body of the kernel's
+        // payload; "" when this content was sent earlier in the session.
         const base64Data = "__B64__";
+        const blobKey = "__KEY__";
+        // Kernel-parsed drawing (DXF_Kernel_Script.tiles_payload): {segments,
+        // segmentTiles, blocks: [{name, segments, transforms, instances, tiles}],
+        // lod: [{level, segments, tiles}], texts: {values, strings}, origin,
+        // bounds}, whose buffers are {at, count, ...} into the inflated body;
+        // or null to parse in the page.
+        const kernelSegments = __SEGMENTS__;
+
+        if(typeof DecompressionStream === "undefined"){
+            viewer.textContent =
+                "Este navegador no soporta DecompressionStream; no se puede mostrar el DXF.";
+            return;
+        }
 
         function base64ToArrayBuffer(base64){
             const bin = atob(base64);
@@ -127,320 +237,937 @@ def DXF_Visualization(file_path):
             return bytes.buffer;
         }
 
-        let dxfText = new TextDecoder("utf-8").decode(base64ToArrayBuffer(base64Data));
+        async function inflate(base64){
+            const stream = new Blob([base64ToArrayBuffer(base64)]).stream()
+                .pipeThrough(new DecompressionStream("deflate"));
+            return new Uint8Array(await new Response(stream).arrayBuffer());
+        }
+
+        // Page-level registry of inflated bodies by content key, shared by
+        // every viewer of this window: a drawing shown again (or the same
+        // revision in two viewers) is inflated once. Bodies not inlined (Colab
+        // only) come from the registry, else from the kernel's callback.
+        const blobs = window.__automindDxfBlobs = window.__automindDxfBlobs || {};
+
+        async function loadBody(){
+            if(base64Data){
+                if(!blobs[blobKey]) blobs[blobKey] = inflate(base64Data);
+            } else if(!blobs[blobKey]){
+                const kernel = window.google && window.google.colab && window.google.colab.kernel;
+                if(!kernel || typeof kernel.invokeFunction !== "function"){
+                    throw new Error("this output was saved without its drawing (sent earlier in a " +
+                                    "Colab session); run the cell in Colab, or with reuse=False to " +
+                                    "keep the drawing in the output");
+                }
+                blobs[blobKey] = kernel.invokeFunction("automind_dxf_blob", [blobKey], {})
+                    .then(res => {
+                        const data = res.data["application/json"];
+                        if(!data.b64) throw new Error(data.error);
+                        return inflate(data.b64);
+                    });
+            }
+            const body = blobs[blobKey];
+            body.catch(() => { if(blobs[blobKey] === body) delete blobs[blobKey]; });
+            return body;
+        }
+
+        // ----------- Kernel payload buffers -----------
+        // Bytes are stored shuffled (every value's first byte, then every
+        // second byte, ...); unshuffle copies `count` values of `size` bytes
+        // starting at `at` back into an aligned buffer.
+        function unshuffle(bytes, at, count, size){
+            const out = new Uint8Array(count*size);
+            for(let b=0;b<size;b++){
+                const src = at + b*count;
+                for(let i=0;i<count;i++) out[i*size+b] = bytes[src+i];
+            }
+            return out.buffer;
+        }
+
+        function decodeFloats(bytes, d){
+            return new Float32Array(unshuffle(bytes, d.at, d.count, 4));
+        }
+
+        // Zigzagged deltas -> x1,y1,x2,y2 = origin + quantum * integer:
+        // x1, y1 follow the previous segment's end, x2, y2 follow x1, y1.
+        function decodeSegments(bytes, d){
+            const z = new Uint32Array(unshuffle(bytes, d.at, d.count*4, 4));
+            const out = new Float32Array(d.count*4);
+            const q = d.quantum, ox = d.origin[0], oy = d.origin[1];
+            let px = 0, py = 0;
+            for(let k=0;k<z.length;k+=4){
+                const x1 = px + ((z[k] >>> 1) ^ -(z[k] & 1)), y1 = py + ((z[k+1] >>> 1) ^ -(z[k+1] & 1));
+                px = x1 + ((z[k+2] >>> 1) ^ -(z[k+2] & 1)); py = y1 + ((z[k+3] >>> 1) ^ -(z[k+3] & 1));
+                out[k] = ox + x1*q; out[k+1] = oy + y1*q; out[k+2] = ox + px*q; out[k+3] = oy + py*q;
+            }
+            return out;
+        }
+
 
         // ==========================================================
-        // PARSER DXF FINAL (BLOCKS + INSERT + LWPOLYLINE + POLYLINE)
+        // PARSER DXF (single pass: tokenizer + state machine)
         // ==========================================================
+        // The text is read one group-code pair at a time with indexOf, never
+        // split into a line array. Tags only update the current record; the
+        // record is emitted when the next code 0 starts, so every tag is
+        // visited once. BLOCKS and ENTITIES share the same record handler and
+        // only differ in the buffer that receives the segments.
+
+        // Growable packed x1,y1,x2,y2 buffer. Arcs wait in `arcs` as
+        // cx, cy, r, start, sweep until the drawing extent is known.
+        function SegmentBuffer(){
+            this.data = new Float64Array(4096);
+            this.length = 0;
+            this.arcs = [];
+            this.inserts = [];
+        }
+        SegmentBuffer.prototype.reserve = function(n){
+            if(this.length + n <= this.data.length) return;
+            let cap = this.data.length * 2;
+            while(cap < this.length + n) cap *= 2;
+            const next = new Float64Array(cap);
+            next.set(this.data.subarray(0, this.length));
+            this.data = next;
+        };
+        SegmentBuffer.prototype.push = function(x1,y1,x2,y2){
+            this.reserve(4);
+            const d = this.data, k = this.length;
+            d[k]=x1; d[k+1]=y1; d[k+2]=x2; d[k+3]=y2;
+            this.length = k + 4;
+        };
+        SegmentBuffer.prototype.toArray = function(){
+            return this.data.slice(0, this.length);
+        };
+        SegmentBuffer.prototype.isEmpty = function(){
+            return this.length === 0 && this.arcs.length === 0;
+        };
+        // [x0, y0, x1, y1] of the lines and of the arcs' full circles, or null.
+        SegmentBuffer.prototype.box = function(){
+            let x0=Infinity, y0=Infinity, x1=-Infinity, y1=-Infinity;
+            const d = this.data, a = this.arcs;
+            for(let k=0;k<this.length;k+=2){
+                if(!(isFinite(d[k]) && isFinite(d[k+1]))) continue;
+                x0 = Math.min(x0, d[k]); x1 = Math.max(x1, d[k]);
+                y0 = Math.min(y0, d[k+1]); y1 = Math.max(y1, d[k+1]);
+            }
+            for(let k=0;k<a.length;k+=5){
+                if(!(isFinite(a[k]) && isFinite(a[k+1]) && isFinite(a[k+2]))) continue;
+                x0 = Math.min(x0, a[k]-a[k+2]); x1 = Math.max(x1, a[k]+a[k+2]);
+                y0 = Math.min(y0, a[k+1]-a[k+2]); y1 = Math.max(y1, a[k+1]+a[k+2]);
+            }
+            return x0 <= x1 ? [x0, y0, x1, y1] : null;
+        };
+
+        // ----------- ARC/CIRCLE SEGMENTS -----------
+        // Same rule as the kernel (DXF_Kernel_Script.arc_segment_counts): as
+        // many segments as keep every chord within `tol` of the arc, between
+        // MIN and MAX_ARC_SEGMENTS per full circle, instead of a fixed 48.
+        const CHORD_TOLERANCE = Math.pow(2, -16);
+        const MIN_ARC_SEGMENTS = 8, MAX_ARC_SEGMENTS = 1024;
+
+        function arcSegments(r, sweep, tol){
+            const c = Math.min(1, Math.max(-1, 1 - tol/Math.max(Math.abs(r), 1e-300)));
+            const step = Math.max(2*Math.acos(c), 1e-12);
+            const turns = sweep/(2*Math.PI);
+            const lo = Math.max(Math.ceil(MIN_ARC_SEGMENTS*turns - 1e-9), 1);
+            return Math.min(Math.max(Math.ceil(sweep/step), lo), Math.ceil(MAX_ARC_SEGMENTS*turns));
+        }
 
-        function parseDXF(text){
-            const parts = text.split(/\\r\\n|\\r|\\n/);
-            let i = 0;
-            let section = null;
-            let blocks = {};
-            let currentBlock = null;
-            let inBlock = false;
-            let entities = [];
-
-            function P(idx){
-                return {code: parts[idx]?.trim(), value: parts[idx+1]?.trim()};
-            }
-
-            // ------------------ LINE ------------------
-            function parseLINE(start){
-                let x1,y1,x2,y2;
-                for(let j=start; j < parts.length-1; j+=2){
-                    let c = parts[j].trim();
-                    let v = parts[j+1].trim();
-                    if(c==="0") break;
-                    if(c==="10") x1=parseFloat(v);
-                    if(c==="20") y1=parseFloat(v);
-                    if(c==="11") x2=parseFloat(v);
-                    if(c==="21") y2=parseFloat(v);
+        SegmentBuffer.prototype.tessellate = function(tol){
+            const a = this.arcs;
+            for(let j=0;j<a.length;j+=5){
+                const cx = a[j], cy = a[j+1], r = a[j+2], a1 = a[j+3], sweep = a[j+4];
+                const n = arcSegments(r, sweep, tol), da = sweep/n;
+                let x0 = cx+r*Math.cos(a1), y0 = cy+r*Math.sin(a1);
+                for(let k=1;k<=n;k++){
+                    const t = a1+k*da;
+                    const x = cx+r*Math.cos(t), y = cy+r*Math.sin(t);
+                    this.push(x0,y0,x,y);
+                    x0 = x; y0 = y;
                 }
-                return [{x1,y1,x2,y2}];
-            }
-
-            // ----------- ARC/CIRCLE SEGMENTS -----------
-            function arcSeg(cx,cy,r,a1,a2,n=48){
-                let arr=[];
-                let da=(a2-a1)/n;
-                for(let k=0;k<n;k++){
-                    let t1=a1+k*da;
-                    let t2=a1+(k+1)*da;
-                    arr.push({
-                        x1: cx+r*Math.cos(t1), y1: cy+r*Math.sin(t1),
-                        x2: cx+r*Math.cos(t2), y2: cy+r*Math.sin(t2),
-                    });
-                }
-                return arr;
             }
+            this.arcs = [];
+        };
 
-            // ----------- LWPOLYLINE -----------
-            function parseLWPOLY(start){
-                let pts = [];
-                let closed = false;
+        function polylineSeg(buf, xs, ys, closed){
+            const n = xs.length;
+            for(let k=0;k<n-1;k++) buf.push(xs[k],ys[k],xs[k+1],ys[k+1]);
+            if(closed && n>2) buf.push(xs[n-1],ys[n-1],xs[0],ys[0]);
+        }
 
-                for(let j=start; j < parts.length-1; j+=2){
-                    let c = parts[j].trim();
-                    let v = parts[j+1].trim();
+        // --------- INSERT: blocks stay shared, inserts become transforms ---------
+        // Transforms are [a,b,c,d,e,f] as in ctx.setTransform:
+        // x' = a*x + c*y + e, y' = b*x + d*y + f.
+        function multiply(m, n){
+            return [
+                m[0]*n[0] + m[2]*n[1], m[1]*n[0] + m[3]*n[1],
+                m[0]*n[2] + m[2]*n[3], m[1]*n[2] + m[3]*n[3],
+                m[0]*n[4] + m[2]*n[5] + m[4], m[1]*n[4] + m[3]*n[5] + m[5],
+            ];
+        }
 
-                    if(c==="0") break;
+        // One placement, or the cols x rows grid of a MINSERT (spacing in the rotated frame).
+        function insertTransforms(ins, bx, by){
+            const c = Math.cos(ins.rot), s = Math.sin(ins.rot);
+            const out = [];
+            for(let j=0;j<Math.max(ins.rows,1);j++){
+                for(let i=0;i<Math.max(ins.cols,1);i++){
+                    const ox = i*ins.colStep, oy = j*ins.rowStep;
+                    const px = ins.x + c*ox - s*oy, py = ins.y + s*ox + c*oy;
+                    const a = c*ins.sx, b = s*ins.sx, cc = -s*ins.sy, d = c*ins.sy;
+                    out.push([a, b, cc, d, px - a*bx - cc*by, py - b*bx - d*by]);
+                }
+            }
+            return out;
+        }
 
-                    if(c==="10"){
-                        let x = parseFloat(v);
-                        let y = parseFloat(parts[j+3]);
-                        pts.push([x,y]);
-                    }
-                    if(c==="70"){
-                        closed = (parseInt(v)&1)!==0;
-                    }
+        // Nested inserts and MINSERT grids expanded into per-block transform lists.
+        function resolveInstances(blocks, inserts, maxDepth=16){
+            const out = {};
+            const stack = inserts.map(ins => [ins, [1,0,0,1,0,0], 0]);
+            while(stack.length){
+                const [ins, parent, depth] = stack.pop();
+                const blk = blocks[ins.name];
+                if(!blk || depth >= maxDepth) continue;
+                for(const m of insertTransforms(ins, blk.bx, blk.by)){
+                    const world = multiply(parent, m);
+                    if(!blk.buf.isEmpty()) (out[ins.name] = out[ins.name] || []).push(world);
+                    for(const child of blk.inserts) stack.push([child, world, depth+1]);
                 }
-                let segs=[];
-                for(let k=0;k<pts.length-1;k++)
-                    segs.push({x1:pts[k][0],y1:pts[k][1],x2:pts[k+1][0],y2:pts[k+1][1]});
-                if(closed && pts.length>1)
-                    segs.push({x1:pts.at(-1)[0],y1:pts.at(-1)[1],x2:pts[0][0],y2:pts[0][1]});
-                return segs;
-            }
-
-            // ------------ POLYLINE ----------------
-            function parsePOLYLINE(start){
-                let pts=[];
-                for(let j=start;j<parts.length-1;j+=2){
-                    let q=P(j);
-                    if(q.code==="0" && q.value==="VERTEX"){
-                        let vx,vy;
-                        for(let k=j+2;k<parts.length-1;k+=2){
-                            let v=P(k);
-                            if(v.code==="0") break;
-                            if(v.code==="10") vx=parseFloat(v.value);
-                            if(v.code==="20") vy=parseFloat(v.value);
-                        }
-                        if(vx!=null) pts.push([vx,vy]);
+            }
+            return Object.keys(out).map(name => ({
+                name,
+                buf: blocks[name].buf,
+                transforms: Float64Array.from(out[name].flat()),
+            }));
+        }
+
+        // Arcs of the page-parsed drawing tessellated to CHORD_TOLERANCE of
+        // its extent; blocks use it divided by their largest instance scale.
+        function finishDrawing(entities, blocks){
+            let x0=Infinity, y0=Infinity, x1=-Infinity, y1=-Infinity;
+            function grow(b){
+                if(!b) return;
+                x0 = Math.min(x0, b[0]); y0 = Math.min(y0, b[1]);
+                x1 = Math.max(x1, b[2]); y1 = Math.max(y1, b[3]);
+            }
+            grow(entities.box());
+            const scales = blocks.map(blk => {
+                const box = blk.buf.box(), t = blk.transforms;
+                let scale = 0;
+                for(let i=0;i<t.length;i+=6){
+                    scale = Math.max(scale, Math.hypot(t[i], t[i+1]), Math.hypot(t[i+2], t[i+3]));
+                    if(!box) continue;
+                    for(const [px, py] of [[box[0],box[1]],[box[2],box[1]],[box[0],box[3]],[box[2],box[3]]]){
+                        const X = t[i]*px + t[i+2]*py + t[i+4], Y = t[i+1]*px + t[i+3]*py + t[i+5];
+                        grow([X, Y, X, Y]);
                     }
-                    if(q.value==="SEQEND") break;
                 }
-                let segs=[];
-                for(let k=0;k<pts.length-1;k++)
-                    segs.push({x1:pts[k][0],y1:pts[k][1],x2:pts[k+1][0],y2:pts[k+1][1]});
-                return segs;
-            }
+                return scale;
+            });
+            const extent = x0 <= x1 ? Math.max(x1-x0, y1-y0) : 0;
+            const tol = CHORD_TOLERANCE * (extent || 1);
+            entities.tessellate(tol);
+            return {
+                segments: entities.toArray(),
+                blocks: blocks.map((blk, b) => {
+                    blk.buf.tessellate(tol / Math.max(scales[b], 1e-12));
+                    return {name: blk.name, segments: blk.buf.toArray(), transforms: blk.transforms};
+                }),
+            };
+        }
 
-            // --------- TRANSFORM SEGMENT FOR INSERT ---------
-            function applyTransform(seg, px, py, sx, sy, rot){
-                function t(x,y){
-                    let X = x * sx;
-                    let Y = y * sy;
+        // Records whose tags are decoded; everything else is skipped.
+        const HANDLED = new Set(["SECTION","BLOCK","ENDBLK","LINE","ARC","CIRCLE",
+                                 "LWPOLYLINE","POLYLINE","VERTEX","SEQEND","INSERT"]);
+        const DEG = Math.PI/180;
 
-                    let xr = X*Math.cos(rot) - Y*Math.sin(rot);
-                    let yr = X*Math.sin(rot) + Y*Math.cos(rot);
+        function parseDXF(text){
+            if(text.indexOf("\\n") < 0) text = text.replace(/\\r/g, "\\n");
+            const len = text.length;
+            let pos = 0;
+
+            function nextLine(){
+                let end = text.indexOf("\\n", pos);
+                if(end < 0) end = len;
+                let stop = end;
+                if(stop > pos && text.charCodeAt(stop-1) === 13) stop--;
+                const line = text.slice(pos, stop);
+                pos = end + 1;
+                return line;
+            }
 
-                    return [xr + px, yr + py];
+            const entities = new SegmentBuffer();
+            const blocks = {};
+            let section = null;
+            let block = null;      // {name, bx, by, buf} inside BLOCK ... ENDBLK
+            let poly = null;       // {buf, xs, ys, closed} inside POLYLINE ... SEQEND
+
+            // Current record
+            let type = null, handled = false;
+            let name = null, x = 0, y = 0, x2 = 0, y2 = 0, r = 0, a1 = 0, a2 = 360;
+            let sx = 1, sy = 1, rot = 0, flags = 0, hasX = false;
+            let rows = 1, colStep = 0, rowStep = 0;
+            let xs = [], ys = [];
+
+            function target(){
+                if(section === "ENTITIES") return entities;
+                if(section === "BLOCKS" && block) return block.buf;
+                return null;
+            }
+
+            function endRecord(){
+                if(!handled) {
+                    if(poly && type !== null) endPolyline();
+                    return;
+                }
+                if(type === "SECTION"){ section = name; return; }
+                if(section === "BLOCKS"){
+                    if(type === "BLOCK"){ block = {name, bx:x, by:y, buf:new SegmentBuffer()}; return; }
+                    if(type === "ENDBLK"){
+                        if(block) blocks[block.name] = {
+                            buf: block.buf, bx: block.bx, by: block.by, inserts: block.buf.inserts,
+                        };
+                        block = null;
+                        return;
+                    }
+                }
+                const buf = target();
+                if(!buf) return;
+
+                if(poly){
+                    if(type === "VERTEX"){
+                        // Polyface face records (flag 128 without 64) carry no position.
+                        if(hasX && (flags & 192) !== 128){ poly.xs.push(x); poly.ys.push(y); }
+                        return;
+                    }
+                    endPolyline();
+                    if(type === "SEQEND") return;
                 }
 
-                let p1 = t(seg.x1, seg.y1);
-                let p2 = t(seg.x2, seg.y2);
-                return {x1:p1[0], y1:p1[1], x2:p2[0], y2:p2[1]};
+                switch(type){
+                    case "LINE":
+                        buf.push(x,y,x2,y2);
+                        break;
+                    case "CIRCLE":
+                        buf.arcs.push(x,y,r,0,Math.PI*2);
+                        break;
+                    case "ARC": {
+                        // DXF arcs run counter-clockwise from 50 to 51.
+                        const sweep = ((a2-a1)%360+360)%360 || 360;
+                        buf.arcs.push(x,y,r,a1*DEG,sweep*DEG);
+                        break;
+                    }
+                    case "LWPOLYLINE":
+                        polylineSeg(buf, xs, ys, (flags&1)!==0);
+                        break;
+                    case "POLYLINE":
+                        poly = {buf, xs:[], ys:[], closed:(flags&1)!==0};
+                        break;
+                    case "INSERT":
+                        // 41/42 scale (negative = mirrored), 70/71 and 44/45 the MINSERT grid.
+                        buf.inserts.push({name, x, y, sx, sy, rot: rot*DEG,
+                                          cols: flags || 1, rows, colStep, rowStep});
+                        break;
+                }
             }
 
-            // ======================================================
-            // MAIN LOOP
-            // ======================================================
-            while(i < parts.length-1){
-                let p = P(i);
-                i += 2;
+            function endPolyline(){
+                polylineSeg(poly.buf, poly.xs, poly.ys, poly.closed);
+                poly = null;
+            }
 
-                // Detect section
-                if(p.code==="0" && p.value==="SECTION"){
-                    let sec = P(i);
-                    if(sec.code==="2") section = sec.value;
+            while(pos < len){
+                const code = parseInt(nextLine(), 10);
+                if(pos > len) break;
+                const value = nextLine();
+
+                if(code === 0){
+                    endRecord();
+                    type = value.trim();
+                    if(type === "ENDSEC") section = null;
+                    handled = HANDLED.has(type);
+                    if(handled){
+                        name = null; x = 0; y = 0; x2 = 0; y2 = 0; r = 0; a1 = 0; a2 = 360;
+                        sx = 1; sy = 1; rot = 0; flags = 0; hasX = false;
+                        rows = 1; colStep = 0; rowStep = 0;
+                        if(type === "LWPOLYLINE"){ xs = []; ys = []; }
+                    }
                     continue;
                 }
+                if(!handled) continue;
+
+                switch(code){
+                    case 2:  if(name === null) name = value.trim(); break;
+                    case 10:
+                        x = parseFloat(value); hasX = true;
+                        if(type === "LWPOLYLINE"){ xs.push(x); ys.push(0); }
+                        break;
+                    case 20:
+                        y = parseFloat(value);
+                        if(type === "LWPOLYLINE" && ys.length) ys[ys.length-1] = y;
+                        break;
+                    case 11: x2 = parseFloat(value); break;
+                    case 21: y2 = parseFloat(value); break;
+                    case 40: r = parseFloat(value); break;
+                    case 41: sx = parseFloat(value); break;
+                    case 42: sy = parseFloat(value); break;
+                    case 50: a1 = parseFloat(value); rot = a1; break;
+                    case 51: a2 = parseFloat(value); break;
+                    case 44: colStep = parseFloat(value); break;
+                    case 45: rowStep = parseFloat(value); break;
+                    case 70: flags = parseInt(value, 10); break;
+                    case 71: rows = parseInt(value, 10); break;
+                }
+            }
+            endRecord();
+            if(poly) endPolyline();
 
-                if(p.code==="0" && p.value==="ENDSEC"){
-                    section = null;
-                    continue;
+            return finishDrawing(entities, resolveInstances(blocks, entities.inserts));
+        }
+
+        // {segments, blocks: [{segments, transforms}]}: packed x1,y1,x2,y2 drawn
+        // directly, plus shared block geometry with its [a,b,c,d,e,f] instances.
+        let drawing;
+        let body;
+        try {
+            body = await loadBody();
+        } catch(err) {
+            console.warn("DXF viewer:", err);
+            viewer.textContent = "No se pudo cargar el DXF: " + err.message;
+            return;
+        }
+        if(kernelSegments){
+            drawing = {
+                segments: decodeSegments(body, kernelSegments.segments),
+                segmentTiles: kernelSegments.segmentTiles,
+                blocks: kernelSegments.blocks.map(b => ({
+                    name: b.name,
+                    segments: decodeSegments(body, b.segments),
+                    transforms: decodeFloats(body, b.transforms),
+                    tiles: b.tiles,
+                })),
+                // LOD grids come back in drawing units through their quantum.
+                lod: kernelSegments.lod.map(l => ({
+                    level: l.level, segments: decodeSegments(body, l.segments), tiles: l.tiles,
+                })),
+                // x, y, height, rotation, halign, valign per string.
+                texts: {
+                    values: decodeFloats(body, kernelSegments.texts.values),
+                    strings: kernelSegments.texts.strings,
+                },
+            };
+        } else {
+            drawing = parseDXF(new TextDecoder("utf-8").decode(body));
+        }
+
+        // World bounds with every instance placed (the kernel sends them ready).
+        function drawingBounds(drawing){
+            let minX=Infinity,minY=Infinity,maxX=-Infinity,maxY=-Infinity;
+            function grow(segs, t){
+                const a=t?t[0]:1, b=t?t[1]:0, c=t?t[2]:0, d=t?t[3]:1, e=t?t[4]:0, f=t?t[5]:0;
+                for(let k=0;k<segs.length;k+=2){
+                    const X = a*segs[k] + c*segs[k+1] + e, Y = b*segs[k] + d*segs[k+1] + f;
+                    if(!(isFinite(X) && isFinite(Y))) continue;
+                    if(X<minX) minX=X; if(X>maxX) maxX=X;
+                    if(Y<minY) minY=Y; if(Y>maxY) maxY=Y;
                 }
+            }
+            grow(drawing.segments, null);
+            for(const blk of drawing.blocks){
+                for(let i=0;i<blk.transforms.length;i+=6) grow(blk.segments, blk.transforms.subarray(i, i+6));
+            }
+            if(minX > maxX) return [0, 0, 0, 0];
+            return [minX, minY, maxX, maxY];
+        }
 
-                // -------------------------
-                // BLOCKS
-                // -------------------------
-                if(section==="BLOCKS"){
+        // Page-parsed drawings are moved to the kernel's layout: float32
+        // coordinates relative to the lower-left corner, so the GPU keeps
+        // its precision on large absolute coordinates.
+        function relativeDrawing(drawing, ox, oy){
+            function shift(segs){
+                const out = new Float32Array(segs.length);
+                for(let k=0;k<segs.length;k+=2){ out[k] = segs[k]-ox; out[k+1] = segs[k+1]-oy; }
+                return out;
+            }
+            return {
+                segments: shift(drawing.segments),
+                blocks: drawing.blocks.map(b => {
+                    const t = Float32Array.from(b.transforms);
+                    for(let i=0;i<t.length;i+=6){ t[i+4] = b.transforms[i+4]-ox; t[i+5] = b.transforms[i+5]-oy; }
+                    return {name: b.name, segments: Float32Array.from(b.segments), transforms: t};
+                }),
+            };
+        }
 
-                    if(p.value==="BLOCK"){
-                        currentBlock = {name:null, items:[]};
-                        inBlock = true;
-                    }
+        // ----------- Spatial index (grid tiles) -----------
+        // Same grid as the kernel's dxf_tiles: square tiles holding about
+        // TILE_TARGET segments or instances. Items are counting-sorted by the
+        // tile of their midpoint (instances: of their placed box), and each
+        // tile keeps [start, count, x0, y0, x1, y1] covering whole items.
+        // Page-parsed drawings get culling only; LOD levels come from the kernel.
+        const TILE_TARGET = 16384, MAX_TILES_PER_AXIS = 64;
+
+        function sortByTile(n, stride, data, boxes, size, gx, gy){
+            const tile = new Int32Array(n);
+            for(let i=0;i<n;i++){
+                const mx = (boxes[4*i]+boxes[4*i+2])/2, my = (boxes[4*i+1]+boxes[4*i+3])/2;
+                const ix = Math.min(gx-1, Math.max(0, Math.floor(mx/size)));
+                const iy = Math.min(gy-1, Math.max(0, Math.floor(my/size)));
+                tile[i] = iy*gx + ix;
+            }
+            const start = new Int32Array(gx*gy+1);
+            for(let i=0;i<n;i++) start[tile[i]+1]++;
+            for(let t=0;t<gx*gy;t++) start[t+1] += start[t];
+            const fill = start.slice(0, gx*gy);
+            const out = new Float32Array(n*stride);
+            const rows = [];
+            const bb = new Float64Array(gx*gy*4).fill(Infinity);
+            for(let t=0;t<gx*gy;t++){ bb[4*t+2] = -Infinity; bb[4*t+3] = -Infinity; }
+            for(let i=0;i<n;i++){
+                const t = tile[i], j = fill[t]++;
+                for(let k=0;k<stride;k++) out[j*stride+k] = data[i*stride+k];
+                bb[4*t] = Math.min(bb[4*t], boxes[4*i]); bb[4*t+1] = Math.min(bb[4*t+1], boxes[4*i+1]);
+                bb[4*t+2] = Math.max(bb[4*t+2], boxes[4*i+2]); bb[4*t+3] = Math.max(bb[4*t+3], boxes[4*i+3]);
+            }
+            for(let t=0;t<gx*gy;t++){
+                const count = start[t+1]-start[t];
+                if(count) rows.push([start[t], count, bb[4*t], bb[4*t+1], bb[4*t+2], bb[4*t+3]]);
+            }
+            return {data: out, tiles: rows};
+        }
 
-                    if(inBlock && p.code==="2" && !currentBlock.name){
-                        currentBlock.name = p.value;
-                    }
+        function tileDrawing(drawing, width, height){
+            let items = drawing.segments.length/4;
+            for(const blk of drawing.blocks) items += blk.transforms.length/6;
+            const extent = Math.max(width, height) || 1;
+            const n = Math.min(MAX_TILES_PER_AXIS, Math.max(1, Math.ceil(Math.sqrt(items/TILE_TARGET))));
+            const size = extent/n;
+            const gx = Math.max(1, Math.ceil(width/size - 1e-9)), gy = Math.max(1, Math.ceil(height/size - 1e-9));
+
+            const segs = drawing.segments, ns = segs.length/4;
+            const boxes = new Float64Array(ns*4);
+            for(let i=0;i<ns;i++){
+                boxes[4*i] = Math.min(segs[4*i], segs[4*i+2]); boxes[4*i+1] = Math.min(segs[4*i+1], segs[4*i+3]);
+                boxes[4*i+2] = Math.max(segs[4*i], segs[4*i+2]); boxes[4*i+3] = Math.max(segs[4*i+1], segs[4*i+3]);
+            }
+            const direct = sortByTile(ns, 4, segs, boxes, size, gx, gy);
 
-                    if(inBlock && p.value==="LINE"){
-                        currentBlock.items.push(...parseLINE(i));
+            const blocks = drawing.blocks.map(blk => {
+                let x0=Infinity, y0=Infinity, x1=-Infinity, y1=-Infinity;
+                for(let k=0;k<blk.segments.length;k+=2){
+                    x0 = Math.min(x0, blk.segments[k]); x1 = Math.max(x1, blk.segments[k]);
+                    y0 = Math.min(y0, blk.segments[k+1]); y1 = Math.max(y1, blk.segments[k+1]);
+                }
+                const t = blk.transforms, ni = t.length/6;
+                const ib = new Float64Array(ni*4);
+                for(let i=0;i<ni;i++){
+                    let a0=Infinity, b0=Infinity, a1=-Infinity, b1=-Infinity;
+                    for(const [px, py] of [[x0,y0],[x1,y0],[x0,y1],[x1,y1]]){
+                        const X = t[6*i]*px + t[6*i+2]*py + t[6*i+4], Y = t[6*i+1]*px + t[6*i+3]*py + t[6*i+5];
+                        a0 = Math.min(a0, X); a1 = Math.max(a1, X); b0 = Math.min(b0, Y); b1 = Math.max(b1, Y);
                     }
+                    ib[4*i] = a0; ib[4*i+1] = b0; ib[4*i+2] = a1; ib[4*i+3] = b1;
+                }
+                const sorted = sortByTile(ni, 6, t, ib, size, gx, gy);
+                return {name: blk.name, segments: blk.segments, transforms: sorted.data, tiles: sorted.tiles};
+            });
+            return {segments: direct.data, segmentTiles: direct.tiles, blocks, lod: []};
+        }
 
-                    if(inBlock && p.value==="LWPOLYLINE"){
-                        currentBlock.items.push(...parseLWPOLY(i));
-                    }
+        let width, height;
+        if(kernelSegments){
+            width = kernelSegments.bounds[2]-kernelSegments.bounds[0];
+            height = kernelSegments.bounds[3]-kernelSegments.bounds[1];
+        } else {
+            const [minX, minY, maxX, maxY] = drawingBounds(drawing);
+            drawing = relativeDrawing(drawing, minX, minY);
+            width = maxX-minX; height = maxY-minY;
+            drawing = tileDrawing(drawing, width, height);
+            drawing.texts = {values: new Float32Array(0), strings: []};
+        }
 
-                    if(inBlock && p.value==="POLYLINE"){
-                        currentBlock.items.push(...parsePOLYLINE(i));
-                    }
+        // ----------- Texts -----------
+        // Drawn with fillText on a 2D context whose view is given as the world
+        // point at the top-left pixel and world units per pixel. Texts smaller
+        // than MIN_TEXT_PX on screen or outside the view are skipped.
+        const MIN_TEXT_PX = 4, MAX_TEXTS_PER_FRAME = 5000;
+        const H_ALIGN = ["left", "center", "right"];
+        const V_ALIGN = ["alphabetic", "bottom", "middle", "top"];
+
+        function drawTexts(ctx, left, top, upp, W, H){
+            const v = drawing.texts.values, strings = drawing.texts.strings;
+            ctx.fillStyle = "#000";
+            let drawn = 0;
+            for(let i=0;i<strings.length && drawn<MAX_TEXTS_PER_FRAME;i++){
+                const h = v[6*i+2]/upp;
+                if(h < MIN_TEXT_PX) continue;
+                const x = (v[6*i]-left)/upp, y = (top-v[6*i+1])/upp;
+                const lines = strings[i].split("\\n");
+                const reach = h*(2 + Math.max(...lines.map(s => s.length)) + 1.4*lines.length);
+                if(x < -reach || x > W+reach || y < -reach || y > H+reach) continue;
+                ctx.save();
+                ctx.translate(x, y);
+                ctx.rotate(-v[6*i+3]);
+                // DXF heights are cap heights, about 0.7 of the font size.
+                ctx.font = (h/0.7).toFixed(1) + "px sans-serif";
+                ctx.textAlign = H_ALIGN[v[6*i+4]] || "left";
+                ctx.textBaseline = V_ALIGN[v[6*i+5]] || "alphabetic";
+                const lead = h*1.4;
+                const first = v[6*i+5] === 3 ? 0 : v[6*i+5] === 2 ? -(lines.length-1)*lead/2 : -(lines.length-1)*lead;
+                lines.forEach((s, k) => ctx.fillText(s, 0, first + k*lead));
+                ctx.restore();
+                drawn++;
+            }
+        }
 
-                    if(inBlock && p.value==="ARC"){
-                        let cx,cy,r,a1,a2;
-                        for(let j=i;j<parts.length-1;j+=2){
-                            let q=P(j);
-                            if(q.code==="0")break;
-                            if(q.code==="10") cx=parseFloat(q.value);
-                            if(q.code==="20") cy=parseFloat(q.value);
-                            if(q.code==="40") r=parseFloat(q.value);
-                            if(q.code==="50") a1=parseFloat(q.value)*Math.PI/180;
-                            if(q.code==="51") a2=parseFloat(q.value)*Math.PI/180;
-                        }
-                        currentBlock.items.push(...arcSeg(cx,cy,r,a1,a2));
-                    }
+        viewer.innerHTML = "";
 
-                    if(inBlock && p.value==="CIRCLE"){
-                        let cx,cy,r;
-                        for(let j=i;j<parts.length-1;j+=2){
-                            let q=P(j);
-                            if(q.code==="0")break;
-                            if(q.code==="10") cx=parseFloat(q.value);
-                            if(q.code==="20") cy=parseFloat(q.value);
-                            if(q.code==="40") r=parseFloat(q.value);
-                        }
-                        currentBlock.items.push(...arcSeg(cx,cy,r,0,Math.PI*2));
-                    }
+        // ==========================================================
+        // RENDER WEBGL (three.js LineSegments, pan/zoom)
+        // ==========================================================
+        // The segment buffer is uploaded as is: every x1,y1,x2,y2 is two 2D
+        // vertices of a LineSegments draw range. Blocks are
+        // InstancedBufferGeometry whose [a,b,c,d,e,f] transforms are applied
+        // in the vertex shader. Each frame draws only the tiles that meet the
+        // viewport, from the LOD level matching the zoom, so frame cost
+        // follows what is on screen rather than the drawing size. Frames are
+        // only drawn after a pan or zoom.
+        async function renderWebGL(){
+            const THREE = await import("https://unpkg.com/three@0.181.0/build/three.module.js");
+
+            const W = viewer.clientWidth, H = viewer.clientHeight;
+            const renderer = new THREE.WebGLRenderer({antialias: true});
+            renderer.setPixelRatio(window.devicePixelRatio || 1);
+            renderer.setSize(W, H);
+            renderer.setClearColor(0xffffff, 1);
+
+            const scene = new THREE.Scene();
+            const camera = new THREE.OrthographicCamera(0, W, H, 0, -1, 1);
+            const sphere = new THREE.Sphere(new THREE.Vector3(width/2, height/2, 0), Math.hypot(width, height)/2);
+
+            // One object per non-empty tile and representation; level -1 is
+            // the full detail, otherwise the index into drawing.lod. Tiles of
+            // one buffer share a single BufferAttribute (uploaded once) and
+            // differ only in their draw range.
+            const tiles = [];
+            function addTile(obj, level, row){
+                obj.frustumCulled = false;
+                obj.visible = false;
+                obj.geometry.boundingSphere = sphere;
+                scene.add(obj);
+                tiles.push({obj, level, x0: row[2], y0: row[3], x1: row[4], y1: row[5]});
+            }
 
-                    if(p.value==="ENDBLK"){
-                        blocks[currentBlock.name] = currentBlock.items;
-                        inBlock = false;
-                    }
+            const lineMaterial = new THREE.LineBasicMaterial({color: 0x000000});
+            function addLineTiles(segments, rows, level){
+                const position = new THREE.BufferAttribute(segments, 2);
+                for(const row of rows){
+                    const geom = new THREE.BufferGeometry();
+                    geom.setAttribute("position", position);
+                    geom.setDrawRange(row[0]*2, row[1]*2);
+                    addTile(new THREE.LineSegments(geom, lineMaterial), level, row);
+                }
+            }
+            addLineTiles(drawing.segments, drawing.segmentTiles, -1);
+            drawing.lod.forEach((l, i) => addLineTiles(l.segments, l.tiles, i));
+
+            const instanced = new THREE.ShaderMaterial({
+                vertexShader: `
+                    attribute vec2 t0;
+                    attribute vec2 t1;
+                    attribute vec2 t2;
+                    void main(){
+                        vec2 p = t0 * position.x + t1 * position.y + t2;
+                        gl_Position = projectionMatrix * modelViewMatrix * vec4(p, 0.0, 1.0);
+                    }`,
+                fragmentShader: `
+                    void main(){ gl_FragColor = vec4(0.0, 0.0, 0.0, 1.0); }`,
+            });
+            for(const blk of drawing.blocks){
+                if(!blk.segments.length || !blk.transforms.length) continue;
+                const position = new THREE.BufferAttribute(blk.segments, 2);
+                for(const row of blk.tiles){
+                    const geom = new THREE.InstancedBufferGeometry();
+                    geom.setAttribute("position", position);
+                    const tr = new THREE.InstancedInterleavedBuffer(blk.transforms.subarray(row[0]*6, (row[0]+row[1])*6), 6, 1);
+                    geom.setAttribute("t0", new THREE.InterleavedBufferAttribute(tr, 2, 0));
+                    geom.setAttribute("t1", new THREE.InterleavedBufferAttribute(tr, 2, 2));
+                    geom.setAttribute("t2", new THREE.InterleavedBufferAttribute(tr, 2, 4));
+                    geom.instanceCount = row[1];
+                    addTile(new THREE.LineSegments(geom, instanced), -1, row);
+                }
+            }
 
-                    continue;
+            // Coarsest LOD level that is still exact to a pixel at this zoom
+            // (the drawing spans at most 2**level pixels), else full detail.
+            const extent = Math.max(width, height) || 1;
+            function chooseLevel(){
+                const span = extent/upp;
+                for(let i=0;i<drawing.lod.length;i++){
+                    if(Math.pow(2, drawing.lod[i].level) >= span) return i;
                 }
+                return -1;
+            }
 
-                // -------------------------
-                // ENTITIES
-                // -------------------------
-                if(section==="ENTITIES"){
-
-                    if(p.value==="LINE")
-                        entities.push(...parseLINE(i));
-
-                    if(p.value==="LWPOLYLINE")
-                        entities.push(...parseLWPOLY(i));
-
-                    if(p.value==="POLYLINE")
-                        entities.push(...parsePOLYLINE(i));
-
-                    if(p.value==="ARC"){
-                        let cx,cy,r,a1,a2;
-                        for(let j=i;j<parts.length-1;j+=2){
-                            let q=P(j);
-                            if(q.code==="0")break;
-                            if(q.code==="10") cx=parseFloat(q.value);
-                            if(q.code==="20") cy=parseFloat(q.value);
-                            if(q.code==="40") r=parseFloat(q.value);
-                            if(q.code==="50") a1=parseFloat(q.value)*Math.PI/180;
-                            if(q.code==="51") a2=parseFloat(q.value)*Math.PI/180;
-                        }
-                        entities.push(...arcSeg(cx,cy,r,a1,a2));
-                    }
+            function cull(){
+                const level = chooseLevel();
+                const vx0 = camera.left, vx1 = camera.right, vy0 = camera.bottom, vy1 = camera.top;
+                for(const t of tiles){
+                    t.obj.visible = t.level === level && t.x1 >= vx0 && t.x0 <= vx1 && t.y1 >= vy0 && t.y0 <= vy1;
+                }
+            }
 
-                    if(p.value==="CIRCLE"){
-                        let cx,cy,r;
-                        for(let j=i;j<parts.length-1;j+=2){
-                            let q=P(j);
-                            if(q.code==="0")break;
-                            if(q.code==="10") cx=parseFloat(q.value);
-                            if(q.code==="20") cy=parseFloat(q.value);
-                            if(q.code==="40") r=parseFloat(q.value);
-                        }
-                        entities.push(...arcSeg(cx,cy,r,0,Math.PI*2));
-                    }
+            // View: world point at the canvas centre and world units per CSS pixel.
+            let cx, cy, upp;
+            function fit(){
+                cx = width/2; cy = height/2;
+                upp = Math.max(width/Math.max(W-40, 1), height/Math.max(H-40, 1)) || 1;
+            }
 
-                    if(p.value==="INSERT"){
-                        let name=null, px=0, py=0, rot=0, sx=1, sy=1;
-
-                        for(let j=i;j<parts.length-1;j+=2){
-                            let q=P(j);
-                            if(q.code==="0") break;
-
-                            if(q.code==="2") name=q.value;
-                            if(q.code==="10") px=parseFloat(q.value);
-                            if(q.code==="20") py=parseFloat(q.value);
-                            if(q.code==="50") rot=parseFloat(q.value)*Math.PI/180;
-                            if(q.code==="41") sx=parseFloat(q.value);
-                            if(q.code==="42") sy=parseFloat(q.value);
-                        }
-
-                        if(blocks[name]){
-                            for(const seg of blocks[name]){
-                                entities.push(applyTransform(seg,px,py,sx,sy,rot));
-                            }
-                        }
+            let pending = false;
+            function requestRender(){
+                if(pending) return;
+                pending = true;
+                requestAnimationFrame(() => {
+                    pending = false;
+                    camera.left = cx - W/2*upp; camera.right = cx + W/2*upp;
+                    camera.top = cy + H/2*upp; camera.bottom = cy - H/2*upp;
+                    camera.updateProjectionMatrix();
+                    cull();
+                    renderer.render(scene, camera);
+                    if(textCtx){
+                        textCtx.setTransform(dpr, 0, 0, dpr, 0, 0);
+                        textCtx.clearRect(0, 0, W, H);
+                        drawTexts(textCtx, camera.left, camera.top, upp, W, H);
                     }
-                }
+                });
+            }
+
+            const el = renderer.domElement;
+            el.style.display = "block";
+            el.style.cursor = "grab";
+            el.style.touchAction = "none";
+
+            el.addEventListener("wheel", (e) => {
+                e.preventDefault();
+                const rect = el.getBoundingClientRect();
+                const mx = e.clientX - rect.left - W/2, my = e.clientY - rect.top - H/2;
+                const wx = cx + mx*upp, wy = cy - my*upp;
+                upp *= Math.exp(e.deltaY * (e.deltaMode === 1 ? 0.05 : 0.0015));
+                cx = wx - mx*upp; cy = wy + my*upp;
+                requestRender();
+            }, {passive: false});
+
+            let drag = null;
+            el.addEventListener("pointerdown", (e) => {
+                drag = {x: e.clientX, y: e.clientY};
+                el.setPointerCapture(e.pointerId);
+                el.style.cursor = "grabbing";
+            });
+            el.addEventListener("pointermove", (e) => {
+                if(!drag) return;
+                cx -= (e.clientX - drag.x)*upp; cy += (e.clientY - drag.y)*upp;
+                drag = {x: e.clientX, y: e.clientY};
+                requestRender();
+            });
+            const endDrag = () => { drag = null; el.style.cursor = "grab"; };
+            el.addEventListener("pointerup", endDrag);
+            el.addEventListener("pointercancel", endDrag);
+            el.addEventListener("dblclick", () => { fit(); requestRender(); });
+
+            viewer.appendChild(el);
+
+            // Texts go on a 2D canvas laid over the WebGL one.
+            const dpr = window.devicePixelRatio || 1;
+            let textCtx = null;
+            if(drawing.texts.strings.length){
+                const overlay = document.createElement("canvas");
+                overlay.width = Math.round(W*dpr); overlay.height = Math.round(H*dpr);
+                overlay.style.cssText = `position:absolute;left:0;top:0;width:${W}px;height:${H}px;pointer-events:none;`;
+                viewer.appendChild(overlay);
+                textCtx = overlay.getContext("2d");
             }
 
-            return entities;
+            const hint = document.createElement("div");
+            hint.textContent = "Rueda: zoom \u00b7 Arrastrar: mover \u00b7 Doble clic: ajustar";
+            hint.style.cssText = "position:absolute;left:8px;bottom:6px;font:12px sans-serif;color:#64748b;pointer-events:none;";
+            viewer.appendChild(hint);
+
+            fit();
+            requestRender();
         }
 
         // ==========================================================
-        // RENDER FINAL EN CANVAS
+        // RENDER FINAL EN CANVAS (fallback sin WebGL)
         // ==========================================================
-        const segments = parseDXF(dxfText);
+        function segmentsPath(segs){
+            const path = new Path2D();
+            for(let k=0;k<segs.length;k+=4){
+                path.moveTo(segs[k], segs[k+1]);
+                path.lineTo(segs[k+2], segs[k+3]);
+            }
+            return path;
+        }
 
-        const viewer = document.getElementById("viewer");
-        viewer.innerHTML = "";
+        function renderCanvas(){
+            viewer.innerHTML = "";
+            const canvas = document.createElement("canvas");
+            canvas.width = viewer.clientWidth;
+            canvas.height = viewer.clientHeight;
+            viewer.appendChild(canvas);
+
+            const ctx = canvas.getContext("2d");
+            ctx.fillStyle="#FFF";
+            ctx.fillRect(0,0,canvas.width,canvas.height);
+
+            let scale=Math.min((canvas.width-40)/(width||1), (canvas.height-40)/(height||1));
+
+            // World -> screen, as [a,b,c,d,e,f]. Paths are built in world (or block)
+            // coordinates and placed with addPath, then stroked under the identity
+            // transform so the line width stays one pixel at any instance scale.
+            const view = [scale, 0, 0, -scale, 20, canvas.height - 20];
+            const matrix = m => new DOMMatrix([m[0], m[1], m[2], m[3], m[4], m[5]]);
+
+            const scene = new Path2D();
+            scene.addPath(segmentsPath(drawing.segments), matrix(view));
+            for(const blk of drawing.blocks){
+                const path = segmentsPath(blk.segments);
+                const t = blk.transforms;
+                for(let i=0;i<t.length;i+=6){
+                    scene.addPath(path, matrix(multiply(view, [t[i], t[i+1], t[i+2], t[i+3], t[i+4], t[i+5]])));
+                }
+            }
 
-        const canvas = document.createElement("canvas");
-        canvas.width = viewer.clientWidth;
-        canvas.height = viewer.clientHeight;
-        viewer.appendChild(canvas);
+            ctx.strokeStyle="#000";
+            ctx.lineWidth=1;
+            ctx.stroke(scene);
+            drawTexts(ctx, -20/scale, (canvas.height-20)/scale, 1/scale, canvas.width, canvas.height);
+        }
 
-        const ctx = canvas.getContext("2d");
-        ctx.fillStyle="#FFF";
-        ctx.fillRect(0,0,canvas.width,canvas.height);
+        try {
+            await renderWebGL();
+        } catch(err) {
+            console.warn("DXF viewer: WebGL unavailable, drawing on a 2D canvas", err);
+            renderCanvas();
+        }
 
-        let minX=1e9,minY=1e9,maxX=-1e9,maxY=-1e9;
+    })();
+    </script>
+    """
 
-        for(const s of segments){
-            minX=Math.min(minX,s.x1,s.x2);
-            minY=Math.min(minY,s.y1,s.y2);
-            maxX=Math.max(maxX,s.x1,s.x2);
-            maxY=Math.max(maxY,s.y1,s.y2);
-        }
+    html = (html.replace("__ID__", viewer_id).replace("__KEY__", key)
+                .replace("__B64__", b64).replace("__SEGMENTS__", segments_js))
+    display(HTML(html))
 
-        let dx=maxX-minX, dy=maxY-minY;
-        let scale=Math.min((canvas.width-40)/dx, (canvas.height-40)/dy);
 
-        function worldToScreen(x,y){
-            return [20+(x-minX)*scale, canvas.height-20-(y-minY)*scale];
-        }
+_OPEN_CALLBACK_REGISTERED = False
 
-        ctx.beginPath();
-        ctx.strokeStyle="#000";
-        ctx.lineWidth=1;
 
-        for(const s of segments){
-            let p1=worldToScreen(s.x1,s.y1);
-            let p2=worldToScreen(s.x2,s.y2);
-            ctx.moveTo(p1[0],p1[1]);
-            ctx.lineTo(p2[0],p2[1]);
-        }
+def _register_open_callback():
+    """
+    Registers the Colab callback 'automind_dxf_open' used by DXF_Gallery: the
+    clicked drawing is shown with DXF_Visualization(parse_on="kernel") in the
+    gallery's output. Returns False outside Colab (no JS -> kernel channel).
+    """
+    global _OPEN_CALLBACK_REGISTERED
+    if _OPEN_CALLBACK_REGISTERED:
+        return True
+    try:
+        from google.colab import output  # type: ignore
+
+        def _open(file_path, layers=None):
+            DXF_Visualization(file_path, parse_on="kernel", layers=layers)
+
+        output.register_callback("automind_dxf_open", _open)
+        _OPEN_CALLBACK_REGISTERED = True
+        return True
+    except Exception:
+        return False
 
-        ctx.stroke();
 
+def DXF_Gallery(folder, out_dir=None, size=256, layers=None, workers=None, force=False):
+    """
+    Thumbnail grid of every DXF file in folder (DXF_Batch_Script.batch_thumbnails:
+    PNGs cached by content hash, viewer payloads built at the same time).
+      - in Colab, clicking a thumbnail opens the drawing with
+        DXF_Visualization(parse_on="kernel") below the grid, straight from
+        the cache; elsewhere the click shows the call to run
+      - out_dir, workers and force as in batch_thumbnails; layers applies
+        to every file
+    Returns the batch manifest.
+    """
+    from AutoMindCloud.DXF_Batch_Script import batch_thumbnails
+
+    if layers is not None:
+        layers = [str(name) for name in ([layers] if isinstance(layers, str) else layers)]
+    manifest = batch_thumbnails(
+        folder, out_dir=out_dir, formats=("png",), size=size, layers=layers,
+        warm=True, workers=workers, force=force, verbose=False,
+    )
+    out_dir = out_dir or os.path.join(folder, "thumbnails")
+    _register_open_callback()
+
+    cards = []
+    for name, entry in sorted(manifest.items()):
+        png = (entry.get("files") or {}).get("png")
+        if png:
+            with open(os.path.join(out_dir, png), "rb") as f:
+                image = f"<img src='data:image/png;base64,{base64.b64encode(f.read()).decode('ascii')}'>"
+        else:
+            image = f"<div class='missing'>{escape(entry.get('error') or entry['status'])}</div>"
+        cards.append(
+            f"<figure data-path='{escape(entry['path'])}' title='{escape(entry['source'])}'>"
+            f"{image}<figcaption>{escape(entry['source'])}</figcaption></figure>"
+        )
+
+    html = """
+    <div id='__ID__' class='dxf-gallery'>
+      <style>
+        #__ID__ .grid { display:flex; flex-wrap:wrap; gap:10px; font-family:sans-serif; }
+        #__ID__ figure { margin:0; width:180px; cursor:pointer; }
+        #__ID__ figure img, #__ID__ .missing { width:180px; height:135px; object-fit:contain;
+            border:1px solid #ccc; background:#fff; }
+        #__ID__ .missing { display:flex; align-items:center; justify-content:center; color:#b91c1c; font-size:11px; }
+        #__ID__ figure.busy img { opacity:0.4; }
+        #__ID__ figcaption { font-size:12px; overflow-wrap:anywhere; }
+        #__ID__ .hint { font-family:monospace; font-size:12px; margin-top:8px; }
+      </style>
+      <div class='grid'>__CARDS__</div>
+      <div class='hint'></div>
+    </div>
+
+    <script>
+    (function(){
+        const root = document.getElementById("__ID__");
+        const layers = __LAYERS__;
+        const kernel = window.google && window.google.colab && window.google.colab.kernel;
+        for(const fig of root.querySelectorAll("figure[data-path]")){
+            fig.addEventListener("click", async () => {
+                const path = fig.dataset.path;
+                if(!kernel || typeof kernel.invokeFunction !== "function"){
+                    root.querySelector(".hint").textContent =
+                        "DXF_Visualization(" + JSON.stringify(path) + ", parse_on='kernel')";
+                    return;
+                }
+                fig.classList.add("busy");
+                try {
+                    await kernel.invokeFunction("automind_dxf_open", [path, layers], {});
+                } catch(err) {
+                    console.warn("DXF gallery: could not open", path, err);
+                } finally {
+                    fig.classList.remove("busy");
+                }
+            });
+        }
     })();
     </script>
     """
-
-    html = html.replace("__B64__", b64)
+    html = (html.replace("__ID__", "dxf-gallery-" + uuid.uuid4().hex[:12])
+                .replace("__LAYERS__", json.dumps(layers))
+                .replace("__CARDS__", "".join(cards)))
     display(HTML(html))
+    return manifest
+
 
 # Ejemplo de uso:
@@ -0,0 +1,141 @@
+"""
+Raster_Script.py
+
+Dependency-free rasterizer for line drawings (projected hidden-line views,
+DXF previews) and a minimal PNG encoder.
+- Polylines are mapped to pixels by a (scale, tx, ty) transform that matches
+  the SVG 'scale(s,-s) translate(tx,ty)' layout used by the view writers.
+- Segments are sampled every half pixel in arc length and splatted with
+  bilinear weights, which gives anti-aliased strokes in a few array passes;
+  rasterize_segments takes packed (N, 4) segments (DXF) directly.
+- Dashed layers keep samples by arc-length parity; stroke width and dash
+  length follow the DPI (1 px at 96 DPI, like the SVG).
+- encode_png writes 8-bit grayscale or RGB PNGs with zlib only.
+"""
+
+import zlib
+import struct
+
+import numpy as np
+
+CSS_DPI = 96.0
+
+
+def encode_png(image) -> bytes:
+    """PNG bytes for a uint8 (H, W) grayscale or (H, W, 3) RGB array."""
+    img = np.ascontiguousarray(image, dtype=np.uint8)
+    h, w = img.shape[:2]
+    color_type = 0 if img.ndim == 2 else 2
+    rows = img.reshape(h, -1)
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), rows]).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _polyline_segments(lines, px_scale, tx, ty):
+    """Pixel-space start and end of every segment of every polyline, with the arc length at its start."""
+    seg_start, seg_end, seg_arc = [], [], []
+    for line in lines:
+        p = (np.asarray(line, dtype=np.float64) + (tx, ty)) * (px_scale, -px_scale)
+        if len(p) < 2:
+            continue
+        lengths = np.hypot(*np.diff(p, axis=0).T)
+        seg_start.append(p[:-1])
+        seg_end.append(p[1:])
+        seg_arc.append(np.r_[0.0, np.cumsum(lengths)[:-1]])
+    if not seg_start:
+        return np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0)
+    return np.concatenate(seg_start), np.concatenate(seg_end), np.concatenate(seg_arc)
+
+
+def _segment_samples(a, b, arc0, step=0.5):
+    """
+    Pixel-space samples every `step` px along every segment a -> b, with their
+    arc length along the path and the unit normal of their segment.
+    """
+    if not len(a):
+        return np.zeros((0, 2)), np.zeros(0), np.zeros((0, 2))
+    length = np.hypot(*(b - a).T)
+    n = np.maximum(np.ceil(length / step).astype(np.int64), 1) + 1
+    seg = np.repeat(np.arange(len(a)), n)
+    t = (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)) / np.repeat(n - 1, n)
+    pts = a[seg] + (b - a)[seg] * t[:, None]
+    normal = np.c_[-(b - a)[:, 1], (b - a)[:, 0]] / np.maximum(length, 1e-12)[:, None]
+    return pts, arc0[seg] + length[seg] * t, normal[seg]
+
+
+def _splat(coverage, pts, weight):
+    h, w = coverage.shape
+    x0, y0 = np.floor(pts[:, 0]), np.floor(pts[:, 1])
+    fx, fy = pts[:, 0] - x0, pts[:, 1] - y0
+    x0, y0 = x0.astype(np.int64), y0.astype(np.int64)
+    for dx, dy, wgt in (
+        (0, 0, (1 - fx) * (1 - fy)),
+        (1, 0, fx * (1 - fy)),
+        (0, 1, (1 - fx) * fy),
+        (1, 1, fx * fy),
+    ):
+        x, y = x0 + dx, y0 + dy
+        ok = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        coverage += np.bincount(y[ok] * w + x[ok], weights=wgt[ok] * weight, minlength=h * w).reshape(h, w)
+
+
+def _ink(image, pts, normal, gray, stroke, step):
+    """Draw samples as a stroke of `stroke` px in `gray` over image (float, modified in place)."""
+    coverage = np.zeros(image.shape)
+    # Each sample deposits step * stroke of ink, spread across the stroke
+    # width along the segment normal, so a pixel fully inside the line
+    # ends up at coverage ~1.
+    offsets = np.linspace(-(stroke - 1) / 2, (stroke - 1) / 2, max(1, int(np.ceil(stroke / step))))
+    for o in offsets:
+        _splat(coverage, pts + normal * o, step * stroke / len(offsets))
+    alpha = np.clip(coverage, 0.0, 1.0)
+    image *= 1 - alpha
+    image += gray * alpha
+
+
+def rasterize_layers(layers, width, height, scale, tx, ty, dpi=CSS_DPI):
+    """
+    Rasterize [(lines, gray, dashed)] drawn in order over a white page.
+
+    width/height are the page size in CSS pixels and (scale, tx, ty) the SVG
+    layout transform; dpi sets the output resolution. Returns a uint8 (H, W) array.
+    """
+    k = dpi / CSS_DPI
+    h, w = int(round(height * k)), int(round(width * k))
+    image = np.full((h, w), 255.0)
+    stroke = max(k, 1.0)
+    step = 0.5
+    for lines, gray, dashed in layers:
+        pts, arc, normal = _segment_samples(*_polyline_segments(lines, scale * k, tx, ty), step)
+        if not len(pts):
+            continue
+        if dashed:
+            keep = (np.floor(arc / stroke) % 2) == 0
+            pts, normal = pts[keep], normal[keep]
+        _ink(image, pts, normal, gray, stroke, step)
+    return np.round(image).astype(np.uint8)
+
+
+def rasterize_segments(segments, width, height, scale, tx, ty, dpi=CSS_DPI, gray=0):
+    """
+    rasterize_layers for one solid layer given as an (N, 4) array of
+    x1, y1, x2, y2 segments, without a Python loop over the segments.
+    """
+    k = dpi / CSS_DPI
+    h, w = int(round(height * k)), int(round(width * k))
+    image = np.full((h, w), 255.0)
+    segs = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    px = (segs + (tx, ty, tx, ty)) * (scale * k, -scale * k, scale * k, -scale * k)
+    pts, _, normal = _segment_samples(px[:, :2], px[:, 2:], np.zeros(len(px)))
+    if len(pts):
+        _ink(image, pts, normal, gray, max(k, 1.0), 0.5)
+    return np.round(image).astype(np.uint8)
@@ -0,0 +1,323 @@
+"""
+Step_Batch_Script.py
+
+Batch export of orthographic drawings for a folder of STEP files.
+- Each STEP file gets one SVG and one kernel-rasterized PNG per view, plus an
+  optional drawing sheet (its PNG needs cairosvg for the text labels), under
+  <out_dir>/<name>/.
+- Files run in separate processes, at most `workers` at a time, each with its
+  own timeout; a hung or crashing file is reported and the batch moves on.
+- manifest.json records each file's content hash and export settings, so
+  unchanged files are skipped on the next run.
+- index.html links every drawing of the batch.
+
+CLI:
+    python -m AutoMindCloud.Step_Batch_Script parts/ -o drawings/ --views front top right isometric
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import queue
+import argparse
+import multiprocessing
+from html import escape
+from collections import deque
+
+from AutoMindCloud.Cache_Script import file_sha256, make_key
+from AutoMindCloud.Step_Kernel_Script import drawing_sheet_svg, orthographic_pngs, orthographic_svgs
+from AutoMindCloud.Svg_Compact_Script import DEFAULT_PRECISION
+
+DEFAULT_BATCH_VIEWS = ("front", "top", "right", "isometric")
+STEP_EXTENSIONS = (".step", ".stp")
+
+
+def find_step_files(folder: str, recursive: bool = True):
+    """Sorted STEP/STP paths under folder."""
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        found.extend(
+            os.path.join(root, f) for f in sorted(files) if f.lower().endswith(STEP_EXTENSIONS)
+        )
+        if not recursive:
+            break
+    return found
+
+
+def _output_name(folder, path):
+    rel = os.path.splitext(os.path.relpath(path, folder))[0]
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", rel.replace(os.sep, "__"))
+
+
+def _slug(title):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(title)).strip("_").lower() or "view"
+
+
+def _svg_to_png(svg: str, dpi: float):
+    """PNG bytes via cairosvg, or None when cairosvg is not installed."""
+    try:
+        import cairosvg
+    except ImportError:
+        return None
+    return cairosvg.svg2png(bytestring=svg.encode("utf-8"), scale=dpi / 96.0, background_color="white")
+
+
+def export_step_drawings(
+    step_path: str,
+    out_dir: str,
+    views=DEFAULT_BATCH_VIEWS,
+    sheet=True,
+    png=True,
+    precision=DEFAULT_PRECISION,
+    workers=1,
+    png_dpi=192,
+):
+    """
+    Write the drawings of one STEP file into out_dir and return
+    [{"title", "svg", "png"}] with file names relative to out_dir.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    drawings = orthographic_svgs(step_path, views, workers=workers, precision=precision)
+    pngs = [p for _, p in orthographic_pngs(step_path, views, dpi=png_dpi, workers=workers)] if png else [None] * len(drawings)
+    if sheet:
+        sheet_svg = drawing_sheet_svg(step_path, views, workers=workers, precision=precision)
+        drawings.insert(0, ("Drawing Sheet", sheet_svg))
+        pngs.insert(0, _svg_to_png(sheet_svg, png_dpi) if png else None)
+
+    written = []
+    for (title, svg), data in zip(drawings, pngs):
+        stem = _slug(title)
+        entry = {"title": title, "svg": stem + ".svg", "png": None}
+        with open(os.path.join(out_dir, entry["svg"]), "w", encoding="utf-8") as f:
+            f.write(svg)
+        if data is not None:
+            entry["png"] = stem + ".png"
+            with open(os.path.join(out_dir, entry["png"]), "wb") as f:
+                f.write(data)
+        written.append(entry)
+    return written
+
+
+def _export_worker(name, step_path, out_dir, options, results):
+    t0 = time.perf_counter()
+    try:
+        files = export_step_drawings(step_path, out_dir, **options)
+        results.put((name, "ok", files, time.perf_counter() - t0))
+    except Exception as e:
+        results.put((name, "error", repr(e), time.perf_counter() - t0))
+
+
+def _write_index(out_dir, manifest):
+    rows = []
+    for name, entry in sorted(manifest.items()):
+        files = entry.get("files") or []
+        thumbs = "".join(
+            f'<a href="{escape(name)}/{escape(f["png"] or f["svg"])}" title="{escape(f["title"])}">'
+            f'<img src="{escape(name)}/{escape(f["svg"])}" loading="lazy"></a>'
+            for f in files
+        )
+        status = escape(entry["status"]) + (
+            f'<br><small>{escape(entry["error"])}</small>' if entry.get("error") else ""
+        )
+        rows.append(
+            f"<tr><td>{escape(entry['source'])}</td><td>{status}</td>"
+            f"<td>{entry.get('seconds', 0):.1f} s</td><td class='views'>{thumbs}</td></tr>"
+        )
+    html = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>STEP drawings</title>
+<style>
+  body {{ font-family: sans-serif; color: #0f172a; margin: 24px; }}
+  h1 {{ color: #009688; }}
+  table {{ border-collapse: collapse; width: 100%; }}
+  td, th {{ border-bottom: 1px solid #cbd5e1; padding: 8px; text-align: left; vertical-align: top; }}
+  .views img {{ height: 140px; margin: 0 6px 6px 0; border: 1px solid #cbd5e1; background: #fff; }}
+</style></head>
+<body>
+<h1>STEP drawings</h1>
+<table>
+<tr><th>File</th><th>Status</th><th>Time</th><th>Views</th></tr>
+{chr(10).join(rows)}
+</table>
+</body></html>
+"""
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return path
+
+
+def batch_export(
+    folder: str,
+    out_dir: str = None,
+    views=DEFAULT_BATCH_VIEWS,
+    sheet=True,
+    png=True,
+    precision=DEFAULT_PRECISION,
+    png_dpi=192,
+    workers=None,
+    timeout=600.0,
+    recursive=True,
+    force=False,
+    verbose=True,
+):
+    """
+    Export drawings for every STEP file in folder and return the manifest
+    {name: {"source", "sha256", "key", "status", "files", "seconds", "error"}}.
+
+    status is "ok", "cached" (unchanged since the last run), "error" or
+    "timeout". The manifest and index.html are written to out_dir
+    (default: <folder>/drawings).
+    """
+    out_dir = out_dir or os.path.join(folder, "drawings")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    options = {
+        "views": list(views),
+        "sheet": bool(sheet),
+        "png": bool(png),
+        "precision": precision,
+        "png_dpi": float(png_dpi),
+    }
+    log = print if verbose else (lambda *a, **k: None)
+
+    manifest = {}
+    pending = deque()
+    for path in find_step_files(folder, recursive):
+        name = _output_name(folder, path)
+        digest = file_sha256(path)
+        key = make_key(digest, **options)
+        old = previous.get(name)
+        if (
+            not force
+            and old
+            and old.get("key") == key
+            and old.get("status") in ("ok", "cached")
+            and all(os.path.exists(os.path.join(out_dir, name, f["svg"])) for f in old["files"])
+        ):
+            manifest[name] = dict(old, status="cached")
+            log(f"[cached] {name}")
+            continue
+        manifest[name] = {
+            "source": os.path.relpath(path, folder),
+            "sha256": digest,
+            "key": key,
+            "status": "pending",
+            "files": [],
+        }
+        pending.append((name, path))
+
+    # One process per file (workers=1 inside), so a stuck OCC call can be killed.
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    running = {}
+    workers = max(1, int(workers or os.cpu_count() or 1))
+
+    def finish(name, status, payload, seconds):
+        entry = manifest[name]
+        entry["status"] = status
+        entry["seconds"] = round(seconds, 3)
+        if status == "ok":
+            entry["files"] = payload
+        else:
+            entry["error"] = payload
+        log(f"[{status}] {name} ({seconds:.1f} s)")
+
+    while pending or running:
+        while pending and len(running) < workers:
+            name, path = pending.popleft()
+            proc = ctx.Process(
+                target=_export_worker,
+                args=(name, path, os.path.join(out_dir, name), options, results),
+                daemon=True,
+            )
+            proc.start()
+            running[name] = (proc, time.monotonic())
+
+        try:
+            while True:
+                name, status, payload, seconds = results.get(timeout=0.2)
+                if name in running:  # late results of timed-out files are dropped
+                    running.pop(name)[0].join()
+                    finish(name, status, payload, seconds)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for name, (proc, started) in list(running.items()):
+            if now - started > timeout:
+                proc.terminate()
+                proc.join()
+                running.pop(name)
+                finish(name, "timeout", f"exceeded {timeout:g} s", now - started)
+            elif not proc.is_alive() and proc.exitcode != 0:
+                # _export_worker catches exceptions, so this is a hard crash
+                # (segfault, OOM kill); a clean exit always queued its result.
+                running.pop(name)
+                finish(name, "error", f"worker exited with code {proc.exitcode}", now - started)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    index = _write_index(out_dir, manifest)
+    log(f"Index: {index}")
+    return manifest
+
+
+def _parse_view(text):
+    # Preset names pass through; "x,y,z" becomes a custom direction.
+    parts = text.split(",")
+    if len(parts) == 3:
+        return (f"View {text}", tuple(float(p) for p in parts))
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m AutoMindCloud.Step_Batch_Script",
+        description="Export orthographic drawings for every STEP file in a folder.",
+    )
+    parser.add_argument("folder", help="folder containing .step/.stp files")
+    parser.add_argument("-o", "--out-dir", help="output folder (default: <folder>/drawings)")
+    parser.add_argument(
+        "--views",
+        nargs="+",
+        default=list(DEFAULT_BATCH_VIEWS),
+        help="view presets (front, back, top, bottom, left, right, isometric, dimetric) or x,y,z directions",
+    )
+    parser.add_argument("--no-sheet", action="store_true", help="skip the multi-view drawing sheet")
+    parser.add_argument("--no-png", action="store_true", help="write SVG only")
+    parser.add_argument("--precision", type=float, default=DEFAULT_PRECISION, help="SVG precision in pixels")
+    parser.add_argument("--dpi", type=float, default=192, help="PNG resolution")
+    parser.add_argument("--workers", type=int, default=None, help="files processed in parallel")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds allowed per file")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subfolders")
+    parser.add_argument("--force", action="store_true", help="re-export files that are up to date")
+    args = parser.parse_args(argv)
+
+    manifest = batch_export(
+        args.folder,
+        out_dir=args.out_dir,
+        views=[_parse_view(v) for v in args.views],
+        sheet=not args.no_sheet,
+        png=not args.no_png,
+        precision=args.precision,
+        png_dpi=args.dpi,
+        workers=args.workers,
+        timeout=args.timeout,
+        recursive=not args.no_recursive,
+        force=args.force,
+    )
+    failed = [n for n, e in manifest.items() if e["status"] in ("error", "timeout")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1027 @@
+"""
+Step_Kernel_Script.py
+
+Kernel-side STEP pipeline shared by Step_Visualization and Step_Orthographic_Render.
+- Imports STEP files with CadQuery and caches the resulting shape as BREP.
+- Tessellates shapes into flat position/index buffers cached as .npz.
+- Both caches are keyed by the STEP content hash plus the parameters used,
+  so repeated renders of the same part skip the OCC import entirely.
+- Assemblies are split into solids and tessellated across a process pool;
+  the merged buffers keep per-solid index ranges and timings.
+- Repeated solids (shared TShape, or equal geometry up to a translation) are
+  tessellated once and emitted as a prototype plus a list of transforms.
+- tessellate_part re-tessellates a single prototype, which lets the viewer
+  show a coarse mesh first and swap in fine parts as they become ready.
+- Every tessellation goes through weld_mesh: seam vertices are welded, normals
+  are rebuilt with a crease angle, and the viewer receives ready normals plus
+  the smallest index type that fits.
+- Hidden-line views are projected across a process pool and cached per view
+  by STEP hash plus projector frame. Each worker projects the original shape
+  with one shared HLRBRep_Algo instead of rotating a copy per view.
+- Views are presets ("front", "isometric", ...), custom direction vectors or
+  the legacy rotation tuples; orthographic_svgs returns one SVG per view and
+  drawing_sheet_svg lays several views out on one sheet at a common scale.
+- orthographic_pngs rasterizes the same layout at any DPI in a process pool
+  and caches the PNG next to the view's projection.
+"""
+
+import io
+import os
+import time
+import itertools
+import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from AutoMindCloud.Cache_Script import DiskCache, file_sha256, make_key
+from AutoMindCloud.Svg_Compact_Script import DEFAULT_PRECISION, polylines_to_paths
+from AutoMindCloud.Raster_Script import encode_png, rasterize_layers
+
+# Bump when the cached mesh layout changes so stale .npz entries are ignored.
+_MESH_FORMAT = 7
+
+# Adjacent faces meeting at more than this angle keep split (hard-edge) normals.
+CREASE_ANGLE_DEG = 30.0
+# Crease test: weld groups up to _CREASE_PADDED vertices are padded to their
+# power-of-two size class and compared in (G, k, k) blocks of at most
+# _CREASE_BLOCK elements; larger groups are compared one at a time.
+_CREASE_PADDED = 64
+_CREASE_BLOCK = 1 << 22
+
+# Bump when the cached hidden-line projections change.
+_HLR_FORMAT = 3
+# Bump when the rasterization of cached view PNGs changes.
+_PNG_FORMAT = 1
+
+# Legacy panel views: (title, rotation axis, rotation angle in degrees) applied
+# to the part before projecting along getSVG's default camera.
+ORTHOGRAPHIC_VIEWS = (
+    ("Front View", (1, 0, 0), 0),
+    ("Top View", (1, 0, 0), 90),
+    ("Right Side View", (0, 1, 0), 90),
+    ("Bottom View", (1, 0, 0), -90),
+)
+
+# Named views (Z up): title, direction towards the viewer, screen up vector.
+VIEW_PRESETS = {
+    "front": ("Front View", (0, -1, 0), (0, 0, 1)),
+    "back": ("Back View", (0, 1, 0), (0, 0, 1)),
+    "right": ("Right Side View", (1, 0, 0), (0, 0, 1)),
+    "left": ("Left Side View", (-1, 0, 0), (0, 0, 1)),
+    "top": ("Top View", (0, 0, 1), (0, 1, 0)),
+    "bottom": ("Bottom View", (0, 0, -1), (0, -1, 0)),
+    "isometric": ("Isometric View", (1, -1, 1), (0, 0, 1)),
+    # ISO 5456-3 dimetric: X and Z at full scale, Y at half scale.
+    "dimetric": ("Dimetric View", (1, -7 ** 0.5, 1), (0, 0, 1)),
+}
+PRINCIPAL_VIEWS = ("front", "top", "right", "back", "bottom", "left")
+
+_BREP_CACHE = None
+_MESH_CACHE = None
+_HLR_CACHE = None
+
+# Last imported shape, so several calls on one file (lazy panel views,
+# sheets, reports) share a single BREP load.
+_SHAPE_MEMO = (None, None)
+# Partner groups of the last grouped file, so refining parts one by one does
+# not redo the pairwise IsPartner pass on every call.
+_GROUPS_MEMO = (None, None)
+
+
+def _brep_cache() -> DiskCache:
+    global _BREP_CACHE
+    if _BREP_CACHE is None:
+        _BREP_CACHE = DiskCache("step_brep")
+    return _BREP_CACHE
+
+
+def _mesh_cache() -> DiskCache:
+    global _MESH_CACHE
+    if _MESH_CACHE is None:
+        _MESH_CACHE = DiskCache("step_mesh")
+    return _MESH_CACHE
+
+
+def _hlr_cache() -> DiskCache:
+    global _HLR_CACHE
+    if _HLR_CACHE is None:
+        _HLR_CACHE = DiskCache("step_hlr")
+    return _HLR_CACHE
+
+
+def load_step_shape(step_path: str):
+    """
+    Import a STEP file as a single cadquery Shape, reusing the BREP cache.
+    """
+    import cadquery as cq
+
+    global _SHAPE_MEMO
+    digest = file_sha256(step_path)
+    if _SHAPE_MEMO[0] == digest:
+        return _SHAPE_MEMO[1]
+
+    cache = _brep_cache()
+    key = make_key(digest, kind="brep")
+    cached = cache.get(key, ".brep")
+    if cached is not None:
+        shape = cq.Shape.importBrep(cached)
+        _SHAPE_MEMO = (digest, shape)
+        return shape
+
+    wp = cq.importers.importStep(step_path)
+    vals = wp.vals()
+    shape = vals[0] if len(vals) == 1 else cq.Compound.makeCompound(vals)
+
+    buf = io.BytesIO()
+    shape.exportBrep(buf)
+    cache.write_bytes(key, buf.getvalue(), ".brep")
+    _SHAPE_MEMO = (digest, shape)
+    return shape
+
+
+def _unit(v):
+    n = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(n > 0, n, 1.0)
+
+
+def _weld_groups(pos, tol):
+    """
+    Weld group id per vertex. Vertices sharing a tolerance cell are welded,
+    and occupied neighbouring cells (26-connected) are joined when their first
+    vertices lie within tol, so a pair straddling a cell boundary still welds.
+    """
+    cell = np.floor(pos / tol).astype(np.int64)
+    axes = [np.unique(cell[:, a]) for a in range(3)]
+    n = [len(v) for v in axes]
+    if n[0] * n[1] * n[2] >= 2 ** 62:
+        # Too many distinct cells per axis for a packed int64 key.
+        return np.unique(cell, axis=0, return_inverse=True)[1].ravel()
+
+    def cell_key(c):
+        """Packed key of cells c (K, 3) and whether every coordinate exists."""
+        ok = np.ones(len(c), dtype=bool)
+        key = np.zeros(len(c), dtype=np.int64)
+        for a in range(3):
+            r = np.searchsorted(axes[a], c[:, a]).clip(0, n[a] - 1)
+            ok &= axes[a][r] == c[:, a]
+            key = key * n[a] + r
+        return key, ok
+
+    keys, first, cell_id = np.unique(cell_key(cell)[0], return_index=True, return_inverse=True)
+    cell_id = cell_id.ravel()
+    rep_cell, rep_pos = cell[first], pos[first]
+    edges = []
+    for d in itertools.product((-1, 0, 1), repeat=3):
+        if d <= (0, 0, 0):  # each neighbour pair once
+            continue
+        key, ok = cell_key(rep_cell + d)
+        j = np.searchsorted(keys, key).clip(0, len(keys) - 1)
+        a = np.flatnonzero(ok & (keys[j] == key))
+        b = j[a]
+        close = np.linalg.norm(rep_pos[a] - rep_pos[b], axis=1) <= tol
+        edges.append((a[close], b[close]))
+
+    # Connected cells by min-label propagation with pointer jumping.
+    labels = np.arange(len(keys))
+    a = np.concatenate([e[0] for e in edges])
+    b = np.concatenate([e[1] for e in edges])
+    while len(a):
+        new = labels.copy()
+        m = np.minimum(labels[a], labels[b])
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return labels[cell_id]
+
+
+def _crease_representatives(weld_id, patch_n, cos_crease):
+    """
+    For each vertex, the first member of its weld group (in vertex order)
+    whose patch normal is within the crease angle of its own.
+    """
+    order = np.argsort(weld_id, kind="stable")
+    sorted_w = weld_id[order]
+    starts = np.flatnonzero(np.r_[True, sorted_w[1:] != sorted_w[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rep = np.arange(len(weld_id))
+
+    size_class = np.ceil(np.log2(np.maximum(sizes, 1))).astype(np.int64)
+    for c in np.unique(size_class[(sizes > 1) & (sizes <= _CREASE_PADDED)]):
+        groups = np.flatnonzero((sizes > 1) & (size_class == c))
+        k = int(sizes[groups].max())
+        batch = max(1, _CREASE_BLOCK // (k * k))
+        for g in np.array_split(groups, -(-len(groups) // batch)):
+            valid = np.arange(k) < sizes[g][:, None]
+            members = np.where(valid, order[np.minimum(starts[g][:, None] + np.arange(k), len(order) - 1)], 0)
+            nrm = patch_n[members] * valid[..., None]
+            similar = np.einsum("gad,gbd->gab", nrm, nrm) >= cos_crease
+            similar &= valid[:, None, :]
+            chosen = np.take_along_axis(members, similar.argmax(axis=2), axis=1)
+            rep[members[valid]] = chosen[valid]
+
+    for g in np.flatnonzero(sizes > _CREASE_PADDED):
+        members = order[starts[g]:starts[g] + sizes[g]]
+        nrm = patch_n[members]
+        rows = max(1, _CREASE_BLOCK // len(members))
+        for r in range(0, len(members), rows):
+            similar = nrm[r:r + rows] @ nrm.T >= cos_crease
+            rep[members[r:r + rows]] = members[similar.argmax(axis=1)]
+    return rep
+
+
+def weld_mesh(positions, indices, weld_tolerance, crease_angle=CREASE_ANGLE_DEG):
+    """
+    Weld duplicated vertices and compute crease-aware normals, fully vectorized.
+
+    OCCT emits each B-rep face as its own patch, so every seam vertex appears
+    once per adjacent face. Vertices closer than weld_tolerance are merged only
+    when their patch normals differ by less than crease_angle; across sharper
+    edges they stay split, which keeps hard edges flat-shaded.
+
+    Returns (positions (V,3) float32, normals (V,3) float32, indices (T,3) uint32).
+    """
+    pos = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if not len(pos) or not len(tris):
+        return (
+            pos.astype(np.float32),
+            np.zeros_like(pos, dtype=np.float32),
+            tris.astype(np.uint32),
+        )
+
+    # Per-patch vertex normals (area-weighted face normals, unwelded topology).
+    face_n = np.cross(pos[tris[:, 1]] - pos[tris[:, 0]], pos[tris[:, 2]] - pos[tris[:, 0]])
+    patch_n = np.zeros_like(pos)
+    np.add.at(patch_n, tris.ravel(), np.repeat(face_n, 3, axis=0))
+    patch_n = _unit(patch_n)
+
+    # Spatial weld, then inside each weld group every vertex joins the first
+    # member whose patch normal lies within the crease angle (itself if none).
+    weld_id = _weld_groups(pos, weld_tolerance)
+    rep = _crease_representatives(weld_id, patch_n, np.cos(np.radians(crease_angle)))
+
+    # Final vertices: one per (weld group, crease representative).
+    _, first_of, final_id = np.unique(rep, return_index=True, return_inverse=True)
+    final_id = final_id.ravel()
+    normals = np.zeros((len(first_of), 3))
+    np.add.at(normals, final_id, patch_n)
+    normals = _unit(normals)
+
+    tris = final_id[tris]
+    keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+    return (
+        pos[first_of].astype(np.float32),
+        normals.astype(np.float32),
+        tris[keep].astype(np.uint32),
+    )
+
+
+def _tessellate_shape(shape, tolerance, angular_tolerance):
+    verts, tris = shape.tessellate(tolerance, angular_tolerance)
+    positions = np.array([v.toTuple() for v in verts], dtype=np.float32).reshape(-1, 3)
+    indices = np.array(tris, dtype=np.uint32).reshape(-1, 3)
+    return weld_mesh(positions, indices, weld_tolerance=tolerance * 1e-2)
+
+
+def _shape_to_brep(shape) -> bytes:
+    buf = io.BytesIO()
+    shape.exportBrep(buf)
+    return buf.getvalue()
+
+
+def _tessellate_brep(brep: bytes, tolerance, angular_tolerance):
+    """Process-pool worker: BREP bytes in, (positions, normals, indices, seconds) out."""
+    import cadquery as cq
+
+    t0 = time.perf_counter()
+    shape = cq.Shape.importBrep(io.BytesIO(brep))
+    positions, normals, indices = _tessellate_shape(shape, tolerance, angular_tolerance)
+    return positions, normals, indices, time.perf_counter() - t0
+
+
+def _location_matrix(shape):
+    """4x4 row-major matrix of a shape's TopLoc_Location."""
+    t = shape.wrapped.Location().Transformation()
+    m = np.eye(4)
+    for r in range(3):
+        for c in range(4):
+            m[r, c] = t.Value(r + 1, c + 1)
+    return m
+
+
+def _group_partners(solids):
+    """
+    Group solids sharing one underlying TShape (same geometry, different placement).
+    Returns [(prototype at identity location, [4x4 matrix per occurrence]), ...].
+    """
+    import cadquery as cq
+    from OCP.TopLoc import TopLoc_Location
+
+    groups = []
+    for solid in solids:
+        for rep, members in groups:
+            if solid.wrapped.IsPartner(rep.wrapped):
+                members.append(solid)
+                break
+        else:
+            groups.append((solid, [solid]))
+    return [
+        (
+            cq.Shape.cast(rep.wrapped.Located(TopLoc_Location())),
+            [_location_matrix(s) for s in members],
+        )
+        for rep, members in groups
+    ]
+
+
+def _mesh_items(shape):
+    """
+    What tessellation covers: every solid, plus shells and faces that are not
+    part of a solid (surface bodies next to solids in one file). Falls back
+    to the whole shape when it has no faces at all.
+    """
+    from OCP.TopAbs import TopAbs_FACE
+    from OCP.TopExp import TopExp
+    from OCP.TopTools import TopTools_IndexedMapOfShape
+
+    def face_map(items):
+        faces = TopTools_IndexedMapOfShape()
+        for item in items:
+            TopExp.MapShapes_s(item.wrapped, TopAbs_FACE, faces)
+        return faces
+
+    solids = shape.Solids()
+    covered = face_map(solids)
+    shells = [
+        shell for shell in shape.Shells()
+        if not any(covered.Contains(f.wrapped) for f in shell.Faces())
+    ]
+    covered = face_map(solids + shells)
+    faces = [face for face in shape.Faces() if not covered.Contains(face.wrapped)]
+    return (solids + shells + faces) or [shape]
+
+
+def _step_groups(step_path: str, shape):
+    """
+    _group_partners of a loaded STEP file, memoized by file hash; the indices
+    match the proto_source of tessellate_step.
+    """
+    global _GROUPS_MEMO
+    digest = file_sha256(step_path)
+    if _GROUPS_MEMO[0] != digest:
+        _GROUPS_MEMO = (digest, _group_partners(_mesh_items(shape)))
+    return _GROUPS_MEMO[1]
+
+
+def _merge_identical_geometry(parts, matrices, quantum):
+    """
+    Second pass for repeats that do not share a TShape: prototypes whose meshes
+    are equal up to a translation collapse into one, with the offset folded into
+    each occurrence's matrix. Also returns, per kept prototype, the index of the
+    partner group it was tessellated from.
+    """
+    seen = {}
+    out_parts, out_matrices, sources = [], [], []
+    for source, (part, mats) in enumerate(zip(parts, matrices)):
+        positions, _, indices, _ = part
+        if not len(positions):
+            out_parts.append(part)
+            out_matrices.append(list(mats))
+            sources.append(source)
+            continue
+        origin = positions[0].astype(np.float64)
+        local = np.round((positions - origin) / quantum).astype(np.int64)
+        key = hashlib.sha1(local.tobytes() + indices.tobytes()).hexdigest()
+        hit = seen.get(key)
+        if hit is None:
+            seen[key] = (len(out_parts), origin)
+            out_parts.append(part)
+            out_matrices.append(list(mats))
+            sources.append(source)
+            continue
+        slot, proto_origin = hit
+        delta = origin - proto_origin
+        for m in mats:
+            moved = m.copy()
+            moved[:3, 3] += m[:3, :3] @ delta
+            out_matrices[slot].append(moved)
+    return out_parts, out_matrices, sources
+
+
+def _merge_solid_meshes(parts, matrices, sources):
+    """
+    Concatenate per-prototype (positions, normals, indices, seconds) into one indexed buffer set.
+    proto_ranges[p] = (first index element, index element count) of prototype p;
+    proto_source[p] = partner group it came from (see tessellate_part);
+    instance_proto / instance_matrices list every occurrence (column-major 4x4,
+    the three.js Matrix4 order).
+    """
+    positions = [p for p, _, _, _ in parts]
+    offsets = np.cumsum([0] + [len(p) for p in positions[:-1]])
+    indices = [ix + np.uint32(off) for (_, _, ix, _), off in zip(parts, offsets)]
+    counts = np.array([ix.size for ix in indices], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    instance_proto = np.concatenate(
+        [np.full(len(mats), p, dtype=np.int32) for p, mats in enumerate(matrices)]
+    )
+    instance_matrices = np.array(
+        [m.T.ravel() for mats in matrices for m in mats], dtype=np.float32
+    ).reshape(-1, 16)
+    return {
+        "positions": np.concatenate(positions).astype(np.float32).reshape(-1, 3),
+        "normals": np.concatenate([n for _, n, _, _ in parts]).astype(np.float32).reshape(-1, 3),
+        "indices": np.concatenate(indices).astype(np.uint32).reshape(-1, 3),
+        "proto_ranges": np.stack([starts, counts], axis=1),
+        "proto_source": np.array(sources, dtype=np.int32),
+        "timings": np.array([t for _, _, _, t in parts], dtype=np.float64),
+        "instance_proto": instance_proto,
+        "instance_matrices": instance_matrices,
+    }
+
+
+def tessellate_solids(shape, tolerance, angular_tolerance=0.5, workers=None, groups=None):
+    """
+    Tessellate every distinct solid of shape once, in parallel when there is
+    more than one. Repeated solids become instances of a shared prototype.
+    Shells and faces outside any solid are tessellated too (see _mesh_items).
+    groups, when given, is the shape's _group_partners result.
+    """
+    if groups is None:
+        groups = _group_partners(_mesh_items(shape))
+    protos = [rep for rep, _ in groups]
+    workers = int(workers or os.cpu_count() or 1)
+
+    if len(protos) == 1 or workers == 1:
+        parts = []
+        for proto in protos:
+            t0 = time.perf_counter()
+            positions, normals, indices = _tessellate_shape(proto, tolerance, angular_tolerance)
+            parts.append((positions, normals, indices, time.perf_counter() - t0))
+    else:
+        breps = [_shape_to_brep(proto) for proto in protos]
+        with ProcessPoolExecutor(max_workers=min(workers, len(breps))) as pool:
+            parts = list(pool.map(
+                _tessellate_brep,
+                breps,
+                [tolerance] * len(breps),
+                [angular_tolerance] * len(breps),
+            ))
+
+    parts, matrices, sources = _merge_identical_geometry(
+        parts, [mats for _, mats in groups], quantum=tolerance * 1e-2
+    )
+    return _merge_solid_meshes(parts, matrices, sources)
+
+
+def _default_tolerance(shape, tolerance, relative_tolerance=1e-3):
+    if tolerance is not None:
+        return float(tolerance)
+    bb = shape.BoundingBox()
+    return max(bb.DiagonalLength * relative_tolerance, 1e-6)
+
+
+def tessellate_step(
+    step_path: str,
+    tolerance=None,
+    angular_tolerance=0.5,
+    workers=None,
+    relative_tolerance=1e-3,
+):
+    """
+    Tessellate a STEP file and return
+      {"positions": (N,3) float32, "normals": (N,3) float32, "indices": (M,3) uint32,
+       "proto_ranges": (P,2) int64, "proto_source": (P,) int32,
+       "timings": (P,) float64 seconds,
+       "instance_proto": (S,) int32, "instance_matrices": (S,16) float32}.
+
+    tolerance is the linear deflection in model units (default:
+    relative_tolerance times the bounding-box diagonal). Results are cached by
+    STEP hash + parameters.
+    """
+    cache = _mesh_cache()
+    key = make_key(
+        file_sha256(step_path),
+        kind="mesh",
+        fmt=_MESH_FORMAT,
+        tolerance=tolerance,
+        angular_tolerance=angular_tolerance,
+        relative_tolerance=relative_tolerance,
+    )
+    cached = cache.get(key, ".npz")
+    if cached is not None:
+        with np.load(cached) as z:
+            return {k: z[k] for k in z.files}
+
+    shape = load_step_shape(step_path)
+    mesh = tessellate_solids(
+        shape,
+        _default_tolerance(shape, tolerance, relative_tolerance),
+        angular_tolerance,
+        workers=workers,
+        groups=_step_groups(step_path, shape),
+    )
+
+    buf = io.BytesIO()
+    np.savez(buf, **mesh)
+    cache.write_bytes(key, buf.getvalue(), ".npz")
+    return mesh
+
+
+def tessellate_part(
+    step_path: str,
+    source: int,
+    tolerance=None,
+    angular_tolerance=0.5,
+    relative_tolerance=1e-3,
+):
+    """
+    Tessellate one prototype (by proto_source index) on its own, in its local
+    frame, so a coarse tessellate_step layout can be refined part by part.
+    Returns {"positions": (N,3) float32, "normals": (N,3) float32, "indices": (M,3) uint32}.
+    """
+    cache = _mesh_cache()
+    key = make_key(
+        file_sha256(step_path),
+        kind="part",
+        fmt=_MESH_FORMAT,
+        source=int(source),
+        tolerance=tolerance,
+        angular_tolerance=angular_tolerance,
+        relative_tolerance=relative_tolerance,
+    )
+    cached = cache.get(key, ".npz")
+    if cached is not None:
+        with np.load(cached) as z:
+            return {k: z[k] for k in z.files}
+
+    shape = load_step_shape(step_path)
+    proto, _ = _step_groups(step_path, shape)[int(source)]
+    positions, normals, indices = _tessellate_shape(
+        proto,
+        _default_tolerance(shape, tolerance, relative_tolerance),
+        angular_tolerance,
+    )
+    part = {"positions": positions, "normals": normals, "indices": indices}
+
+    buf = io.BytesIO()
+    np.savez(buf, **part)
+    cache.write_bytes(key, buf.getvalue(), ".npz")
+    return part
+
+
+def _b64(arr) -> str:
+    return base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode("ascii")
+
+
+def _buffers_payload(mesh) -> dict:
+    """
+    Positions as float32, normals as normalized int8 and indices as uint16
+    when every vertex id fits, uint32 otherwise.
+    """
+    index_type = "u2" if len(mesh["positions"]) <= 0xFFFF else "u4"
+    normals = np.round(np.clip(mesh["normals"], -1.0, 1.0) * 127.0).astype("i1")
+    return {
+        "position": _b64(mesh["positions"].astype("<f4")),
+        "normal": _b64(normals),
+        "index": _b64(mesh["indices"].astype("<" + index_type)),
+        "indexType": index_type,
+    }
+
+
+def mesh_payload(mesh) -> dict:
+    """JSON-ready payload for the viewer: base64 little-endian typed-array buffers."""
+    protos = mesh["instance_proto"]
+    parts = []
+    for p, (start, count) in enumerate(mesh["proto_ranges"].tolist()):
+        parts.append({
+            "range": [start, count],
+            "matrices": _b64(mesh["instance_matrices"][protos == p].astype("<f4")),
+            "source": int(mesh["proto_source"][p]),
+        })
+    return {
+        "meshes": [dict(_buffers_payload(mesh), color=None, parts=parts)],
+        "timings": [round(float(t), 4) for t in mesh["timings"]],
+    }
+
+
+def part_payload(part) -> dict:
+    """JSON-ready payload for one refined prototype (see tessellate_part)."""
+    return _buffers_payload(part)
+
+
+# --- Orthographic views ---
+
+# cadquery's getSVG camera; ORTHOGRAPHIC_VIEWS are rotations of the part in front of it.
+_BASE_PROJECTION = (-1.75, 1.1, 5.0)
+
+_SVG_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">
+  <g transform="scale({scale}, -{scale}) translate({tx},{ty})" stroke-width="{stroke}" fill="none">
+{body}
+  </g>
+</svg>
+"""
+
+
+def _error_svg(title, err) -> str:
+    return (
+        "<svg xmlns='http://www.w3.org/2000/svg' width='480' height='120'>"
+        f"<text x='10' y='24' fill='red'>Error generating {title}: {err}</text></svg>"
+    )
+
+
+def _rotation_matrix(axis, angle_deg):
+    k = np.asarray(axis, dtype=np.float64)
+    k = k / np.linalg.norm(k)
+    a = np.radians(angle_deg)
+    kx = np.array([[0, -k[2], k[1]], [k[2], 0, -k[0]], [-k[1], k[0], 0]])
+    return np.eye(3) + np.sin(a) * kx + (1 - np.cos(a)) * (kx @ kx)
+
+
+def _look_frame(direction, up):
+    n = np.asarray(direction, dtype=np.float64)
+    if not np.linalg.norm(n):
+        raise ValueError("View direction must be non-zero")
+    n = n / np.linalg.norm(n)
+    x = np.cross(np.asarray(up, dtype=np.float64), n)
+    if np.linalg.norm(x) < 1e-9:
+        # Looking along the up vector: fall back to Y (or X) as screen up.
+        x = np.cross((0.0, 1.0, 0.0) if abs(n[1]) < 0.9 else (1.0, 0.0, 0.0), n)
+    return n, x / np.linalg.norm(x)
+
+
+def resolve_view(view):
+    """
+    Normalize a view spec to (title, direction, x direction) for HLRAlgo_Projector.
+
+    Accepted specs:
+      - a VIEW_PRESETS name, e.g. "front" or "isometric";
+      - {"direction": (x, y, z), "up": (x, y, z), "title": str} (up and title optional);
+      - (title, direction) or (title, direction, up);
+      - (title, axis, angle_deg), the legacy rotation form of ORTHOGRAPHIC_VIEWS.
+    """
+    if isinstance(view, str):
+        key = view.strip().lower()
+        if key not in VIEW_PRESETS:
+            raise ValueError(f"Unknown view {view!r}; expected one of {sorted(VIEW_PRESETS)}")
+        title, direction, up = VIEW_PRESETS[key]
+    elif isinstance(view, dict):
+        title = view.get("title", "Custom View")
+        direction, up = view["direction"], view.get("up", (0, 0, 1))
+    elif len(view) == 3 and np.isscalar(view[2]):
+        from OCP.gp import gp_Ax2, gp_Pnt, gp_Dir
+
+        title, axis, angle = view
+        base = gp_Ax2(gp_Pnt(), gp_Dir(*_BASE_PROJECTION))
+        d, x = base.Direction(), base.XDirection()
+        inv = _rotation_matrix(axis, angle).T
+        return (
+            title,
+            inv @ np.array([d.X(), d.Y(), d.Z()]),
+            inv @ np.array([x.X(), x.Y(), x.Z()]),
+        )
+    else:
+        title, direction = view[0], view[1]
+        up = view[2] if len(view) > 2 else (0, 0, 1)
+    n, x = _look_frame(direction, up)
+    return title, n, x
+
+
+def _edge_polylines(compound, deflection):
+    """2D polylines for every edge of an HLR result compound."""
+    from OCP.BRepLib import BRepLib
+    from OCP.TopExp import TopExp_Explorer
+    from OCP.TopAbs import TopAbs_EDGE
+    from OCP.TopoDS import TopoDS
+    from OCP.BRepAdaptor import BRepAdaptor_Curve
+    from OCP.GeomAbs import GeomAbs_Line
+    from OCP.GCPnts import GCPnts_QuasiUniformDeflection
+
+    if compound.IsNull():
+        return []
+    BRepLib.BuildCurves3d_s(compound, 1e-6)
+    out = []
+    ex = TopExp_Explorer(compound, TopAbs_EDGE)
+    while ex.More():
+        curve = BRepAdaptor_Curve(TopoDS.Edge_s(ex.Current()))
+        t0, t1 = curve.FirstParameter(), curve.LastParameter()
+        if curve.GetType() == GeomAbs_Line:
+            pts = [curve.Value(t0), curve.Value(t1)]
+        else:
+            sampler = GCPnts_QuasiUniformDeflection(curve, deflection, t0, t1)
+            pts = [sampler.Value(i + 1) for i in range(sampler.NbPoints())] if sampler.IsDone() else []
+        if len(pts) > 1:
+            out.append(np.array([(p.X(), p.Y()) for p in pts]))
+        ex.Next()
+    return out
+
+
+def hlr_projections(shape, frames):
+    """
+    Yield (hidden, visible, error) polyline lists for each (direction, x direction).
+
+    One HLRBRep_Algo holds the shape for all frames; only the projector changes
+    between them, so no rotated copies of the BRep are ever built.
+    """
+    from OCP.gp import gp_Ax2, gp_Pnt, gp_Dir
+    from OCP.HLRBRep import HLRBRep_Algo, HLRBRep_HLRToShape
+    from OCP.HLRAlgo import HLRAlgo_Projector
+
+    algo = HLRBRep_Algo()
+    algo.Add(shape.wrapped)
+    deflection = max(shape.BoundingBox().DiagonalLength * 2e-4, 1e-6)
+
+    for direction, xdir in frames:
+        try:
+            algo.Projector(HLRAlgo_Projector(gp_Ax2(gp_Pnt(), gp_Dir(*direction), gp_Dir(*xdir))))
+            algo.Update()
+            algo.Hide()
+            hlr = HLRBRep_HLRToShape(algo)
+            visible = [
+                line
+                for c in (hlr.VCompound(), hlr.Rg1LineVCompound(), hlr.OutLineVCompound())
+                for line in _edge_polylines(c, deflection)
+            ]
+            hidden = [
+                line
+                for c in (hlr.HCompound(), hlr.OutLineHCompound())
+                for line in _edge_polylines(c, deflection)
+            ]
+            yield hidden, visible, None
+        except Exception as e:
+            yield [], [], str(e)
+
+
+def _project_brep(brep, frames):
+    """Process-pool worker: BREP bytes plus a chunk of frames in, projections out."""
+    import cadquery as cq
+
+    return list(hlr_projections(cq.Shape.importBrep(io.BytesIO(brep)), frames))
+
+
+def _pack_projection(hidden, visible) -> bytes:
+    lines = hidden + visible
+    buf = io.BytesIO()
+    np.savez(
+        buf,
+        points=np.concatenate(lines) if lines else np.zeros((0, 2)),
+        counts=np.array([len(l) for l in lines], dtype=np.int64),
+        hidden=np.arange(len(lines)) < len(hidden),
+    )
+    return buf.getvalue()
+
+
+def _unpack_projection(data: bytes):
+    with np.load(io.BytesIO(data)) as z:
+        lines = np.split(z["points"], np.cumsum(z["counts"])[:-1]) if len(z["counts"]) else []
+        hidden = z["hidden"]
+    return [l for l, h in zip(lines, hidden) if h], [l for l, h in zip(lines, hidden) if not h]
+
+
+def project_views(step_path: str, views, workers=None):
+    """
+    Return [(title, hidden, visible, error)] for views of a STEP file.
+
+    Projections missing from the cache are split into one chunk per worker and
+    computed in parallel, each worker loading the BREP and building its HLR
+    algorithm once. A warm call only reads the cache and never imports the STEP.
+    """
+    cache = _hlr_cache()
+    digest = file_sha256(step_path)
+    resolved = [resolve_view(v) for v in views]
+    keys = [
+        make_key(
+            digest,
+            kind="hlr",
+            fmt=_HLR_FORMAT,
+            direction=np.round(n, 9).tolist(),
+            xdir=np.round(x, 9).tolist(),
+        )
+        for _, n, x in resolved
+    ]
+
+    out = [None] * len(views)
+    todo = []
+    for i, key in enumerate(keys):
+        data = cache.read_bytes(key, ".npz")
+        if data is None:
+            todo.append(i)
+        else:
+            out[i] = _unpack_projection(data) + (None,)
+
+    if todo:
+        shape = load_step_shape(step_path)
+        frames = [(resolved[i][1], resolved[i][2]) for i in todo]
+        workers = max(1, min(int(workers or os.cpu_count() or 1), len(todo)))
+        chunks = [list(range(w, len(todo), workers)) for w in range(workers)]
+        if workers == 1:
+            results = [list(hlr_projections(shape, frames))]
+        else:
+            brep = _shape_to_brep(shape)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(
+                    _project_brep,
+                    [brep] * workers,
+                    [[frames[j] for j in chunk] for chunk in chunks],
+                ))
+        for chunk, chunk_results in zip(chunks, results):
+            for j, (hidden, visible, err) in zip(chunk, chunk_results):
+                i = todo[j]
+                out[i] = (hidden, visible, err)
+                if err is None:
+                    cache.write_bytes(keys[i], _pack_projection(hidden, visible), ".npz")
+
+    return [(title,) + proj for (title, _, _), proj in zip(resolved, out)]
+
+
+def _svg_paths(lines, quantum=None, indent="      ") -> str:
+    if quantum:
+        return polylines_to_paths(lines, quantum, indent)
+    return "\n".join(
+        indent + '<path d="M' + " L".join(f"{x!r},{y!r}" for x, y in line.tolist()) + '" />'
+        for line in lines
+    )
+
+
+def _svg_layers(hidden, visible, stroke, quantum=None) -> str:
+    return (
+        f'    <g stroke="rgb(160,160,160)" stroke-dasharray="{stroke:.6g},{stroke:.6g}">\n'
+        f"{_svg_paths(hidden, quantum)}\n    </g>\n"
+        f'    <g stroke="rgb(0,0,0)">\n{_svg_paths(visible, quantum)}\n    </g>'
+    )
+
+
+def _extent(hidden, visible):
+    lines = hidden + visible
+    pts = np.concatenate(lines) if lines else np.zeros((1, 2))
+    return pts.min(axis=0), pts.max(axis=0)
+
+
+# View page size and margins in CSS pixels, as in getSVG.
+_VIEW_PAGE = (800.0, 240.0, 200.0, 20.0)
+
+
+def _view_layout(hidden, visible):
+    """(width, height, scale, tx, ty) fitting a view the way getSVG does (75%, y up)."""
+    width, height, margin_left, margin_top = _VIEW_PAGE
+    (xmin, ymin), (xmax, ymax) = _extent(hidden, visible)
+    scale = min(width / max(xmax - xmin, 1e-9), height / max(ymax - ymin, 1e-9)) * 0.75
+    return width, height, scale, -xmin + margin_left / scale, -ymax - margin_top / scale
+
+
+def _svg_document(hidden, visible, precision=DEFAULT_PRECISION):
+    """
+    One view as a standalone SVG with dashed hidden lines.
+    precision is the coordinate quantum in pixels; None keeps full precision.
+    """
+    width, height, scale, tx, ty = _view_layout(hidden, visible)
+    return _SVG_TEMPLATE.format(
+        width=width,
+        height=height,
+        scale=scale,
+        tx=tx,
+        ty=ty,
+        stroke=1.0 / scale,
+        body=_svg_layers(hidden, visible, 1.0 / scale, precision and precision / scale),
+    )
+
+
+def _png_document(hidden, visible, dpi):
+    """The same page as _svg_document rasterized to PNG bytes at dpi."""
+    width, height, scale, tx, ty = _view_layout(hidden, visible)
+    image = rasterize_layers([(hidden, 160, True), (visible, 0, False)], width, height, scale, tx, ty, dpi)
+    return encode_png(image)
+
+
+def _png_chunk(projections, dpi):
+    """Process-pool worker: [(hidden, visible)] in, [PNG bytes] out."""
+    return [_png_document(hidden, visible, dpi) for hidden, visible in projections]
+
+
+def orthographic_svgs(step_path: str, views=ORTHOGRAPHIC_VIEWS, workers=None,
+                      precision=DEFAULT_PRECISION):
+    """
+    Return [(title, svg)], one standalone SVG per view (see resolve_view).
+    Paths are compacted to precision pixels (None keeps full precision).
+    """
+    return [
+        (title, _error_svg(title, err) if err else _svg_document(hidden, visible, precision))
+        for title, hidden, visible, err in project_views(step_path, views, workers)
+    ]
+
+
+def orthographic_pngs(step_path: str, views=ORTHOGRAPHIC_VIEWS, dpi=192, workers=None):
+    """
+    Return [(title, png_bytes)] rendered kernel-side at dpi (96 = one SVG pixel
+    per PNG pixel). Uses the cached projections; PNGs are cached alongside them
+    by STEP hash, frame and dpi, and missing ones are rasterized in parallel.
+    Views whose projection failed yield None.
+    """
+    cache = _hlr_cache()
+    digest = file_sha256(step_path)
+    projections = project_views(step_path, views, workers)
+    keys = [
+        make_key(
+            digest,
+            kind="png",
+            fmt=_PNG_FORMAT,
+            hlr_fmt=_HLR_FORMAT,
+            direction=np.round(n, 9).tolist(),
+            xdir=np.round(x, 9).tolist(),
+            dpi=float(dpi),
+        )
+        for _, n, x in (resolve_view(v) for v in views)
+    ]
+
+    pngs = [cache.read_bytes(key, ".png") for key in keys]
+    todo = [i for i, (png, p) in enumerate(zip(pngs, projections)) if png is None and p[3] is None]
+    if todo:
+        workers = max(1, min(int(workers or os.cpu_count() or 1), len(todo)))
+        chunks = [todo[w::workers] for w in range(workers)]
+        jobs = [[projections[i][1:3] for i in chunk] for chunk in chunks]
+        if workers == 1:
+            results = [_png_chunk(jobs[0], dpi)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_png_chunk, jobs, [dpi] * workers))
+        for chunk, chunk_pngs in zip(chunks, results):
+            for i, png in zip(chunk, chunk_pngs):
+                pngs[i] = png
+                cache.write_bytes(keys[i], png, ".png")
+
+    return [(title, png) for (title, _, _, _), png in zip(projections, pngs)]
+
+
+def view_png(step_path: str, view, dpi=192) -> bytes:
+    """PNG bytes of one view (see resolve_view); raises if the projection failed."""
+    (title, png), = orthographic_pngs(step_path, [view], dpi=dpi, workers=1)
+    if png is None:
+        raise RuntimeError(f"Could not project {title} of {step_path}")
+    return png
+
+
+def drawing_sheet_svg(step_path: str, views=PRINCIPAL_VIEWS, workers=None, columns=None,
+                      width=1200.0, title=None, precision=DEFAULT_PRECISION):
+    """
+    Compose views into one drawing sheet: a grid of labelled views drawn at a
+    common scale inside a frame, with a title block naming the part.
+    """
+    from html import escape
+
+    panels = project_views(step_path, views, workers)
+    columns = int(columns or np.ceil(np.sqrt(len(panels))))
+    rows = int(np.ceil(len(panels) / columns))
+
+    extents = [_extent(hidden, visible) for _, hidden, visible, _ in panels]
+    sizes = np.array([hi - lo for lo, hi in extents]).reshape(-1, 2)
+    grid = np.zeros((rows * columns, 2))
+    grid[: len(panels)] = sizes
+    grid = grid.reshape(rows, columns, 2)
+    col_w, row_h = grid[:, :, 0].max(axis=0), grid[:, :, 1].max(axis=1)
+    gap = 0.15 * max(col_w.max(), row_h.max(), 1e-9)
+
+    margin, label, block = 30.0, 24.0, 36.0
+    scale = (width - 2 * margin) / (col_w.sum() + gap * (columns + 1))
+    col_x = margin + scale * (gap * np.arange(1, columns + 1) + np.r_[0, np.cumsum(col_w)[:-1]])
+    row_y = margin + scale * (gap * np.arange(1, rows + 1) + np.r_[0, np.cumsum(row_h)[:-1]]) \
+        + label * np.arange(rows)
+    height = margin * 2 + scale * (row_h.sum() + gap * (rows + 1)) + label * rows + block
+
+    body = []
+    for k, ((name, hidden, visible, err), (lo, hi)) in enumerate(zip(panels, extents)):
+        r, c = divmod(k, columns)
+        cx = col_x[c] + scale * col_w[c] / 2
+        cy = row_y[r] + scale * row_h[r] / 2
+        if err:
+            body.append(f'  <text x="{cx}" y="{cy}" fill="red" text-anchor="middle" '
+                        f'font-size="12">{escape(str(err))}</text>')
+        else:
+            mx, my = (lo + hi) / 2
+            body.append(
+                f'  <g transform="translate({cx},{cy}) scale({scale},-{scale}) '
+                f'translate({-mx},{-my})" stroke-width="{1.0 / scale}" fill="none">\n'
+                f"{_svg_layers(hidden, visible, 1.0 / scale, precision and precision / scale)}\n  </g>"
+            )
+        body.append(
+            f'  <text x="{cx}" y="{row_y[r] + scale * row_h[r] + label * 0.8}" '
+            f'text-anchor="middle" font-family="sans-serif" font-size="14">{escape(name)}</text>'
+        )
+
+    name = escape(title or os.path.splitext(os.path.basename(step_path))[0])
+    m2 = margin / 2
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">\n'
+        f'  <path d="M{m2},{m2} H{width - m2} V{height - m2} H{m2} Z '
+        f'M{width - m2 - 260},{height - m2} V{height - m2 - block} H{width - m2}" '
+        'stroke="#000" stroke-width="1.5" fill="none" />\n'
+        + "\n".join(body) + "\n"
+        f'  <text x="{width - m2 - 250}" y="{height - m2 - block / 2 + 5}" '
+        f'font-family="sans-serif" font-size="14">{name}</text>\n'
+        "</svg>\n"
+    )
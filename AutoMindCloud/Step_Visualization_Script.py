@@ -2,6 +2,38 @@ import base64
 import gdown
 from IPython.display import display, HTML  
 import os
+import json
+import hashlib
+
+# Coarse first pass for progressive=True (fraction of the bounding-box diagonal).
+COARSE_RELATIVE_TOLERANCE = 2e-2
+COARSE_ANGULAR_TOLERANCE = 1.0
+
+_REFINE_CALLBACK_REGISTERED = False
+
+
+def _register_refine_callback():
+    """
+    Registers the Colab callback 'automind_step_refine' used by progressive
+    kernel mode: the page asks for one fine prototype at a time and swaps it in.
+    Returns False outside Colab (no JS -> kernel channel).
+    """
+    global _REFINE_CALLBACK_REGISTERED
+    if _REFINE_CALLBACK_REGISTERED:
+        return True
+    try:
+        from google.colab import output  # type: ignore
+        from IPython.display import JSON
+        from AutoMindCloud.Step_Kernel_Script import tessellate_part, part_payload
+
+        def _refine(step_path, source):
+            return JSON(part_payload(tessellate_part(step_path, int(source))))
+
+        output.register_callback("automind_step_refine", _refine)
+        _REFINE_CALLBACK_REGISTERED = True
+        return True
+    except Exception:
+        return False
 
 def Download_Step(Drive_Link, Output_Name):
     """
@@ -14,7 +46,7 @@ def Download_Step(Drive_Link, Output_Name):
     output_step = os.path.join(root_dir, Output_Name + ".step")
     gdown.download(url, output_step, quiet=True)
 
-def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
+def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5, tessellation="browser", progressive=False):
     """
     STEP viewer with:
       - EXACT same size system as the simple script:
@@ -23,6 +55,10 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       - Viewer Tools panel (50% smaller by default)
       - Hotkey: press 't' (or 'c') to toggle tools panel
       - Restored: Ground & shadows toggle (real shadows)
+      - tessellation: "browser" (occt-import-js in the page) or "kernel"
+        (CadQuery in Python, cached on disk by STEP hash + deflection)
+      - progressive: render a coarse mesh immediately, then swap in the fine
+        mesh part by part (kernel mode refines through a Colab callback)
     """
     STEP_PATH = f"{Step_Name}.step"
     bg_js = "0xffffff"
@@ -31,8 +67,38 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     if not os.path.exists(STEP_PATH):
         raise FileNotFoundError(f"No se encontró {STEP_PATH}. Súbelo a Colab o ajusta la ruta.")
 
-    with open(STEP_PATH, "rb") as f:
-        step_b64 = base64.b64encode(f.read()).decode("ascii")
+    refine = None
+    step_key = ""
+    if tessellation == "kernel":
+        from AutoMindCloud.Step_Kernel_Script import tessellate_step, mesh_payload
+        step_b64 = ""
+        if progressive and _register_refine_callback():
+            mesh = tessellate_step(
+                STEP_PATH,
+                relative_tolerance=COARSE_RELATIVE_TOLERANCE,
+                angular_tolerance=COARSE_ANGULAR_TOLERANCE,
+            )
+            refine = {"mode": "kernel", "step": os.path.abspath(STEP_PATH)}
+        else:
+            mesh = tessellate_step(STEP_PATH)
+        mesh_js = json.dumps(mesh_payload(mesh))
+    elif tessellation == "browser":
+        with open(STEP_PATH, "rb") as f:
+            step_bytes = f.read()
+        step_b64 = base64.b64encode(step_bytes).decode("ascii")
+        step_key = hashlib.sha1(step_bytes).hexdigest()
+        mesh_js = "null"
+        if progressive:
+            refine = {
+                "mode": "browser",
+                "coarse": {
+                    "linearDeflectionType": "bounding_box_ratio",
+                    "linearDeflection": COARSE_RELATIVE_TOLERANCE,
+                    "angularDeflection": COARSE_ANGULAR_TOLERANCE,
+                },
+            }
+    else:
+        raise ValueError(f"tessellation must be 'browser' or 'kernel', got {tessellation!r}")
 
     H = int(height_px)
     panel_scale = float(tools_panel_scale)
@@ -172,6 +238,7 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     </div>
   </div>
 
+  <!-- Main-thread fallback; the viewer normally tessellates inside a Web Worker -->
   <script src="https://cdn.jsdelivr.net/npm/occt-import-js@0.0.23/dist/occt-import-js.js"></script>
 
   <script type="importmap">
@@ -192,6 +259,10 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
   }};
 
   const STEP_B64 = "{step_b64}";
+  const STEP_KEY = "{step_key}";
+  const OCCT_BASE = "https://cdn.jsdelivr.net/npm/occt-import-js@0.0.23/dist/";
+  const MESH_DATA = {mesh_js};
+  const REFINE = {json.dumps(refine)};
   const CLICK_URL = {click_js};
 
   function base64ToUint8Array(b64) {{
@@ -240,7 +311,7 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
   (async function init() {{
     const container = document.getElementById("app");
     if (!container) return;
-    if (typeof occtimportjs !== "function") {{
+    if (!MESH_DATA && typeof occtimportjs !== "function" && typeof Worker !== "function") {{
       console.error("occtimportjs no disponible");
       return;
     }}
@@ -356,37 +427,17 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       axesHelper.position.set(0,0,0);
     }}
 
-    // --- Section clipping (same logic) ---
+    // --- Section clipping ---
+    // One shared Plane is attached to every model material once (getMaterial).
+    // Dragging only mutates its normal/constant; enabling toggles
+    // renderer.localClippingEnabled, so no material is recompiled per frame.
     let secEnabled = false;
     let secAxis = 'X';
     let secPlaneVisible = false;
     let secVisual = null;
-
-    function clearSectionClipping() {{
-      if (!model) return;
-      model.traverse(obj => {{
-        if (!obj.isMesh) return;
-        const mats = Array.isArray(obj.material) ? obj.material : [obj.material];
-        mats.forEach(m => {{
-          if (!m) return;
-          m.clippingPlanes = null;
-          m.needsUpdate = true;
-        }});
-      }});
-    }}
-
-    function applySectionPlaneToModel(plane) {{
-      if (!model) return;
-      model.traverse(obj => {{
-        if (!obj.isMesh) return;
-        const mats = Array.isArray(obj.material) ? obj.material : [obj.material];
-        mats.forEach(m => {{
-          if (!m) return;
-          m.clippingPlanes = [plane];
-          m.needsUpdate = true;
-        }});
-      }});
-    }}
+    const sectionPlane = new THREE.Plane(new THREE.Vector3(1, 0, 0), 0);
+    const SECTION_PLANES = [sectionPlane];
+    let sectionMaxDim = null;  // cached model extent; reset when the model changes
 
     function ensureSectionVisual() {{
       if (!secVisual) {{
@@ -411,33 +462,28 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     function updateSectionPlane(distNorm) {{
       if (!secEnabled || !model) {{
         renderer.localClippingEnabled = false;
-        clearSectionClipping();
         if (secVisual) secVisual.visible = false;
         return;
       }}
 
-      const n = new THREE.Vector3(
-        secAxis === 'X' ? 1 : 0,
-        secAxis === 'Y' ? 1 : 0,
-        secAxis === 'Z' ? 1 : 0
-      );
-
-      const box = new THREE.Box3().setFromObject(model);
-      if (box.isEmpty()) {{
+      if (sectionMaxDim === null) {{
+        const box = new THREE.Box3().setFromObject(model);
+        sectionMaxDim = box.isEmpty() ? 0 : (Math.max(...box.getSize(new THREE.Vector3()).toArray()) || 1);
+      }}
+      if (!sectionMaxDim) {{
         renderer.localClippingEnabled = false;
-        clearSectionClipping();
         if (secVisual) secVisual.visible = false;
         return;
       }}
 
-      const size = box.getSize(new THREE.Vector3());
-      const maxDim = Math.max(size.x, size.y, size.z) || 1;
-      const dist = distNorm * maxDim * 0.5;
-      const plane = new THREE.Plane(n, -dist);
-
+      const maxDim = sectionMaxDim;
+      const n = sectionPlane.normal.set(
+        secAxis === 'X' ? 1 : 0,
+        secAxis === 'Y' ? 1 : 0,
+        secAxis === 'Z' ? 1 : 0
+      );
+      sectionPlane.constant = -distNorm * maxDim * 0.5;
       renderer.localClippingEnabled = true;
-      clearSectionClipping();
-      applySectionPlaneToModel(plane);
 
       ensureSectionVisual();
 
@@ -455,7 +501,7 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
 
       secVisual.scale.set(dim, dim, thickness);
 
-      const p0 = n.clone().multiplyScalar(-plane.constant);
+      const p0 = n.clone().multiplyScalar(-sectionPlane.constant);
       secVisual.position.copy(p0);
 
       secVisual.visible = !!secPlaneVisible;
@@ -630,44 +676,408 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     function viewTop()   {{ const v = viewEndPose('top');   if (v) tweenCameraToPose(v.pos, v.target, 900); }}
 
     // --- Load STEP ---
-    const stepBytes = base64ToUint8Array(STEP_B64);
-    const occt = await occtimportjs();
-    const result = occt.ReadStepFile(stepBytes, null);
-    if (!result || !result.success || !result.meshes || !result.meshes.length) {{
+    // Both paths yield [{{ position: Float32Array, index: Uint32Array, color, parts }}]
+    // parts: [{{ start, count, matrices }}] — an index range of the shared buffers
+    // drawn once per column-major 4x4 in matrices (InstancedMesh when > 1).
+    // Kernel meshes also carry welded, crease-aware normals (normalized int8)
+    // and Uint16 indices when the vertex count allows it.
+    const IDENTITY = new Float32Array([1,0,0,0, 0,1,0,0, 0,0,1,0, 0,0,0,1]);
+
+    function decodeKernelBuffers(m) {{
+      const IndexArray = m.indexType === 'u2' ? Uint16Array : Uint32Array;
+      return {{
+        position: new Float32Array(base64ToUint8Array(m.position).buffer),
+        normal: m.normal ? new Int8Array(base64ToUint8Array(m.normal).buffer) : null,
+        index: new IndexArray(base64ToUint8Array(m.index).buffer)
+      }};
+    }}
+
+    function setGeometryBuffers(geom, m) {{
+      geom.setAttribute("position", new THREE.BufferAttribute(m.position, 3));
+      geom.setIndex(new THREE.BufferAttribute(m.index, 1));
+      if (m.normal) geom.setAttribute("normal", new THREE.BufferAttribute(m.normal, 3, true));
+      else geom.computeVertexNormals();
+      return geom;
+    }}
+
+    function decodeKernelMeshes(data) {{
+      if (data.timings && data.timings.length) {{
+        console.table(data.timings.map((s, i) => ({{ solid: i, seconds: s }})));
+      }}
+      return data.meshes.map(m => ({{
+        ...decodeKernelBuffers(m),
+        color: m.color,
+        parts: m.parts.map(p => ({{
+          start: p.range[0],
+          count: p.range[1],
+          matrices: new Float32Array(base64ToUint8Array(p.matrices).buffer),
+          source: p.source
+        }}))
+      }}));
+    }}
+
+    // occt-import-js bakes every occurrence into world space; collapse meshes
+    // that are exact translated copies into one prototype + translations.
+    function instanceRepeatedMeshes(list) {{
+      let maxAbs = 0;
+      for (const m of list) for (const v of m.position) maxAbs = Math.max(maxAbs, Math.abs(v));
+      const Q = Math.max(maxAbs * 1e-6, 1e-9);
+
+      function sameShape(a, b) {{
+        if (a.index.length !== b.index.length || a.position.length !== b.position.length) return false;
+        for (let i = 0; i < a.index.length; i++) if (a.index[i] !== b.index[i]) return false;
+        for (let i = 0; i < a.position.length; i++) {{
+          const da = a.position[i] - a.position[i % 3];
+          const db = b.position[i] - b.position[i % 3];
+          if (Math.abs(da - db) > 4 * Q) return false;
+        }}
+        return true;
+      }}
+
+      const groups = new Map();
+      const out = [];
+      for (const m of list) {{
+        const pos = m.position;
+        let h = 2166136261;
+        for (let i = 0; i < pos.length; i++) {{
+          h = Math.imul(h ^ Math.round((pos[i] - pos[i % 3]) / Q), 16777619);
+        }}
+        for (let i = 0; i < m.index.length; i++) h = Math.imul(h ^ m.index[i], 16777619);
+        const key = pos.length + ':' + m.index.length + ':' + (m.color || '') + ':' + (h >>> 0);
+
+        const g = groups.get(key);
+        if (g && sameShape(g.mesh, m)) {{
+          g.offsets.push(pos[0] - g.mesh.position[0], pos[1] - g.mesh.position[1], pos[2] - g.mesh.position[2]);
+          continue;
+        }}
+        const entry = {{ mesh: m, offsets: [0, 0, 0] }};
+        if (!g) groups.set(key, entry);
+        out.push(entry);
+      }}
+
+      return out.map(({{ mesh, offsets }}) => {{
+        const k = offsets.length / 3;
+        const matrices = new Float32Array(16 * k);
+        for (let i = 0; i < k; i++) {{
+          matrices.set(IDENTITY, 16 * i);
+          matrices[16 * i + 12] = offsets[3 * i];
+          matrices[16 * i + 13] = offsets[3 * i + 1];
+          matrices[16 * i + 14] = offsets[3 * i + 2];
+        }}
+        return {{ ...mesh, parts: [{{ start: 0, count: mesh.index.length, matrices }}] }};
+      }});
+    }}
+
+    function occtResultToMeshes(result) {{
+      if (!result || !result.success || !result.meshes) return [];
+      return instanceRepeatedMeshes(result.meshes
+        .filter(m => m.attributes && m.attributes.position && m.index)
+        .map(m => ({{
+          position: Float32Array.from(m.attributes.position.array),
+          index: Uint32Array.from(m.index.array),
+          color: m.color
+        }})));
+    }}
+
+    // Decoding + OCCT tessellation run in a dedicated Worker. Buffers come back
+    // as transferables (zero-copy). One worker per page, shared by every
+    // Step_Visualization output; it keeps the last decoded STEP by key.
+    const WORKER_SRC = `
+      importScripts("${{OCCT_BASE}}occt-import-js.js");
+      const IDENTITY = new Float32Array([1,0,0,0, 0,1,0,0, 0,0,1,0, 0,0,0,1]);
+      ${{base64ToUint8Array.toString()}}
+      ${{instanceRepeatedMeshes.toString()}}
+      ${{occtResultToMeshes.toString()}}
+      let occtReady = null;
+      let decoded = {{ key: null, bytes: null }};
+      self.onmessage = async (ev) => {{
+        const {{ id, key, b64, params }} = ev.data;
+        const progress = (stage) => self.postMessage({{ id, type: "progress", stage }});
+        try {{
+          if (decoded.key !== key || !key) {{
+            progress("decode");
+            decoded = {{ key, bytes: base64ToUint8Array(b64) }};
+          }}
+          progress("init");
+          if (!occtReady) occtReady = occtimportjs({{ locateFile: (f) => "${{OCCT_BASE}}" + f }});
+          const occt = await occtReady;
+          progress("tessellate");
+          const result = occt.ReadStepFile(decoded.bytes, params || null);
+          progress("pack");
+          const meshes = occtResultToMeshes(result);
+          const transfer = [];
+          for (const m of meshes) {{
+            transfer.push(m.position.buffer, m.index.buffer);
+            for (const p of m.parts) transfer.push(p.matrices.buffer);
+          }}
+          self.postMessage({{ id, type: "done", meshes }}, transfer);
+        }} catch (e) {{
+          self.postMessage({{ id, type: "error", message: String(e) }});
+        }}
+      }};
+    `;
+
+    function getOcctWorker() {{
+      const KEY = '__automindOcctWorker_v1';
+      if (window[KEY]) return window[KEY];
+      const url = URL.createObjectURL(new Blob([WORKER_SRC], {{ type: 'text/javascript' }}));
+      const w = {{ worker: new Worker(url), pending: new Map(), nextId: 1 }};
+      w.worker.onmessage = (ev) => {{
+        const msg = ev.data;
+        const req = w.pending.get(msg.id);
+        if (!req) return;
+        if (msg.type === 'progress') {{
+          if (req.onProgress) req.onProgress(msg.stage);
+        }} else if (msg.type === 'done') {{
+          w.pending.delete(msg.id);
+          req.resolve(msg.meshes);
+        }} else {{
+          w.pending.delete(msg.id);
+          req.reject(new Error(msg.message));
+        }}
+      }};
+      w.worker.onerror = (e) => {{
+        for (const req of w.pending.values()) req.reject(e);
+        w.pending.clear();
+        if (window[KEY] === w) window[KEY] = null;
+        w.worker.terminate();
+      }};
+      window[KEY] = w;
+      return w;
+    }}
+
+    function readStepInWorker(params, onProgress) {{
+      const w = getOcctWorker();
+      const id = w.nextId++;
+      return new Promise((resolve, reject) => {{
+        w.pending.set(id, {{ resolve, reject, onProgress }});
+        w.worker.postMessage({{ id, key: STEP_KEY, b64: STEP_B64, params: params || null }});
+      }});
+    }}
+
+    let occtModule = null;
+    async function readStepOnMainThread(params) {{
+      if (!occtModule) occtModule = await occtimportjs();
+      return occtResultToMeshes(occtModule.ReadStepFile(base64ToUint8Array(STEP_B64), params || null));
+    }}
+
+    async function readStepInBrowser(params, onProgress) {{
+      if (typeof Worker === 'function') {{
+        try {{
+          return await readStepInWorker(params, onProgress);
+        }} catch (e) {{
+          console.warn('[STEP] worker failed, tessellating on main thread', e);
+        }}
+      }}
+      return readStepOnMainThread(params);
+    }}
+
+    const loadingEl = document.createElement('div');
+    Object.assign(loadingEl.style, {{
+      position: 'absolute', left: '50%', top: '50%', transform: 'translate(-50%,-50%)',
+      zIndex: '5', color: '#0b3b3c', fontWeight: '700', pointerEvents: 'none'
+    }});
+    loadingEl.textContent = 'Loading STEP…';
+    container.appendChild(loadingEl);
+    const showStage = (stage) => {{ loadingEl.textContent = 'Loading STEP… (' + stage + ')'; }};
+
+    const coarseParams = (REFINE && REFINE.mode === 'browser') ? REFINE.coarse : null;
+    const meshes = MESH_DATA ? decodeKernelMeshes(MESH_DATA) : await readStepInBrowser(coarseParams, showStage);
+    loadingEl.remove();
+    if (!meshes.length) {{
       console.error("Fallo al leer STEP");
       return;
     }}
 
     model = new THREE.Group();
-    const defaultMat = new THREE.MeshStandardMaterial({{
-      color: 0xcccccc,
-      metalness: 0.2,
-      roughness: 0.7
-    }});
 
-    for (const m of result.meshes) {{
-      if (!m.attributes || !m.attributes.position || !m.index) continue;
+    // --- Material pool: one material per color/PBR combination ---
+    const materialPool = new Map();
+    function getMaterial(color, metalness = 0.2, roughness = 0.7) {{
+      const rgb = (color && color.length === 3) ? color : [204, 204, 204];
+      const key = rgb.join(',') + '|' + metalness + '|' + roughness;
+      let mat = materialPool.get(key);
+      if (!mat) {{
+        mat = new THREE.MeshStandardMaterial({{
+          color: new THREE.Color(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255),
+          metalness,
+          roughness
+        }});
+        mat.clippingPlanes = SECTION_PLANES;
+        materialPool.set(key, mat);
+      }}
+      return mat;
+    }}
 
-      const geom = new THREE.BufferGeometry();
-      geom.setAttribute("position", new THREE.Float32BufferAttribute(m.attributes.position.array, 3));
-      geom.setIndex(m.index.array);
-      geom.computeVertexNormals();
+    function buildParts(list) {{
+      const objs = [];
+      for (const m of list) {{
+        const geom = setGeometryBuffers(new THREE.BufferGeometry(), m);
+
+        const mat = getMaterial(m.color);
+
+        // One pickable object per part; all share the position/normal attributes.
+        for (const part of m.parts) {{
+          let g = geom;
+          if (m.parts.length > 1) {{
+            g = new THREE.BufferGeometry();
+            g.setAttribute("position", geom.getAttribute("position"));
+            g.setAttribute("normal", geom.getAttribute("normal"));
+            g.setIndex(new THREE.BufferAttribute(m.index.subarray(part.start, part.start + part.count), 1));
+          }}
 
-      let mat = defaultMat;
-      if (m.color && m.color.length === 3) {{
-        mat = new THREE.MeshStandardMaterial({{
-          color: new THREE.Color(m.color[0] / 255, m.color[1] / 255, m.color[2] / 255),
-          metalness: 0.2,
-          roughness: 0.7
+          const k = part.matrices.length / 16;
+          let mesh;
+          if (k === 1) {{
+            mesh = new THREE.Mesh(g, mat);
+            mesh.applyMatrix4(new THREE.Matrix4().fromArray(part.matrices));
+          }} else {{
+            mesh = new THREE.InstancedMesh(g, mat, k);
+            mesh.instanceMatrix.array.set(part.matrices);
+            mesh.instanceMatrix.needsUpdate = true;
+            mesh.computeBoundingBox();
+            mesh.computeBoundingSphere();
+          }}
+          mesh.castShadow = false;    // will be toggled
+          mesh.receiveShadow = false; // will be toggled
+          mesh.userData.solidId = objs.length;
+          mesh.userData.source = part.source;
+          objs.push(mesh);
+        }}
+      }}
+      return objs;
+    }}
+
+    // --- Static batching: merge single-occurrence parts sharing a material ---
+    // Batches carry a per-vertex 'solidId' attribute plus each solid's index
+    // range, so picking and hiding keep working per solid. InstancedMeshes are
+    // already one draw call per prototype and are kept as they are.
+    function batchParts(list) {{
+      const groups = new Map();
+      const out = [];
+      for (const p of list) {{
+        if (p.isInstancedMesh) {{ out.push(p); continue; }}
+        if (!groups.has(p.material)) groups.set(p.material, []);
+        groups.get(p.material).push(p);
+      }}
+
+      const v = new THREE.Vector3();
+      const nm = new THREE.Matrix3();
+      for (const [mat, members] of groups) {{
+        if (members.length === 1) {{ out.push(members[0]); continue; }}
+
+        // Parts may index into a shared buffer: copy only the referenced span.
+        let totalV = 0, totalI = 0;
+        const spans = members.map(p => {{
+          const idx = p.geometry.index.array;
+          let lo = Infinity, hi = -1;
+          for (let i = 0; i < idx.length; i++) {{
+            const k = idx[i];
+            if (k < lo) lo = k;
+            if (k > hi) hi = k;
+          }}
+          if (hi < 0) lo = 0;
+          const span = {{ lo, n: hi + 1 - lo, vOff: totalV, iOff: totalI }};
+          totalV += span.n;
+          totalI += idx.length;
+          return span;
         }});
+
+        const pos = new Float32Array(totalV * 3);
+        const nor = new Float32Array(totalV * 3);
+        const sid = list.length < 65536 ? new Uint16Array(totalV) : new Uint32Array(totalV);
+        const index = new Uint32Array(totalI);
+        const ranges = [];
+
+        members.forEach((p, j) => {{
+          const sp = spans[j];
+          p.updateMatrix();
+          nm.getNormalMatrix(p.matrix);
+          const P = p.geometry.getAttribute('position').array;
+          const N = p.geometry.getAttribute('normal').array;
+          for (let i = 0; i < sp.n; i++) {{
+            const a = 3 * (sp.lo + i), b = 3 * (sp.vOff + i);
+            v.set(P[a], P[a + 1], P[a + 2]).applyMatrix4(p.matrix);
+            pos[b] = v.x; pos[b + 1] = v.y; pos[b + 2] = v.z;
+            v.set(N[a], N[a + 1], N[a + 2]).applyMatrix3(nm).normalize();
+            nor[b] = v.x; nor[b + 1] = v.y; nor[b + 2] = v.z;
+            sid[sp.vOff + i] = p.userData.solidId;
+          }}
+          const idx = p.geometry.index.array;
+          const shift = sp.vOff - sp.lo;
+          for (let i = 0; i < idx.length; i++) index[sp.iOff + i] = idx[i] + shift;
+          ranges.push([p.userData.solidId, sp.iOff, idx.length]);
+        }});
+
+        const geom = new THREE.BufferGeometry();
+        geom.setAttribute('position', new THREE.BufferAttribute(pos, 3));
+        geom.setAttribute('normal', new THREE.BufferAttribute(nor, 3));
+        geom.setAttribute('solidId', new THREE.BufferAttribute(sid, 1));
+        geom.setIndex(new THREE.BufferAttribute(index, 1));
+        geom.computeBoundingBox();
+        geom.computeBoundingSphere();
+
+        const mesh = new THREE.Mesh(geom, mat);
+        mesh.userData.batchRanges = ranges;
+        mesh.userData.fullIndex = geom.index;
+        out.push(mesh);
       }}
+      return out;
+    }}
 
-      const mesh = new THREE.Mesh(geom, mat);
-      mesh.castShadow = false;    // will be toggled
-      mesh.receiveShadow = false; // will be toggled
-      model.add(mesh);
+    // Hidden solids inside a batch are dropped from its index buffer.
+    const hiddenSolids = new Set();
+    function applyHiddenSolids(obj) {{
+      const ranges = obj.userData.batchRanges;
+      if (!ranges) {{
+        obj.visible = !hiddenSolids.has(obj.userData.solidId);
+        return;
+      }}
+      const full = obj.userData.fullIndex;
+      const visible = ranges.filter(r => !hiddenSolids.has(r[0]));
+      if (visible.length === ranges.length) {{
+        obj.geometry.setIndex(full);
+        return;
+      }}
+      const idx = new Uint32Array(visible.reduce((n, r) => n + r[2], 0));
+      let o = 0;
+      for (const [, start, count] of visible) {{
+        idx.set(full.array.subarray(start, start + count), o);
+        o += count;
+      }}
+      obj.geometry.setIndex(new THREE.BufferAttribute(idx, 1));
     }}
 
+    const statsEl = document.createElement('div');
+    statsEl.className = 'lbl';
+    let shadowsOn = false;
+    let parts = buildParts(meshes);
+
+    function rebuildModel() {{
+      for (const c of model.children.slice()) {{
+        model.remove(c);
+        if (c.userData.batchRanges) c.geometry.dispose();
+      }}
+      for (const obj of batchParts(parts)) {{
+        obj.castShadow = obj.receiveShadow = shadowsOn;
+        if (!obj.isInstancedMesh) applyHiddenSolids(obj);
+        model.add(obj);
+      }}
+      sectionMaxDim = null;
+      statsEl.textContent = parts.length + ' → ' + model.children.length +
+        ' (' + materialPool.size + ' materials)';
+      console.info('[STEP] draw calls: ' + parts.length + ' parts -> ' +
+        model.children.length + ' after batching, ' + materialPool.size + ' materials');
+    }}
+
+    let rebuildTimer = null;
+    function scheduleRebuild() {{
+      if (rebuildTimer) return;
+      rebuildTimer = setTimeout(() => {{ rebuildTimer = null; rebuildModel(); }}, 250);
+    }}
+
+    rebuildModel();
+
     if (!model.children.length) {{
       console.error("Modelo vacío");
       return;
@@ -707,6 +1117,13 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     snapBtn.style.borderRadius = '999px';
     snapBtn.textContent = 'Snapshot';
 
+    const showPartsBtn = document.createElement('button');
+    showPartsBtn.className = 'btn';
+    showPartsBtn.style.padding = '6px 12px';
+    showPartsBtn.style.borderRadius = '999px';
+    showPartsBtn.textContent = 'Show all parts';
+
+    hdrRight.appendChild(showPartsBtn);
     hdrRight.appendChild(snapBtn);
     dockHeader.appendChild(hdrLeft);
     dockHeader.appendChild(hdrRight);
@@ -801,6 +1218,7 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     const togGrid   = mkToggle('Grid', false);
     const togGround = mkToggle('Ground & shadows', false);  // ✅ RESTORED
     const togAxes   = mkToggle('XYZ axes', false);
+    const togFps    = mkToggle('FPS overlay', false);
 
     body.appendChild(row('Render mode', renderModeSel));
     body.appendChild(row('Section axis', axisSel));
@@ -812,6 +1230,8 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
     body.appendChild(row('', togGrid.wrap));
     body.appendChild(row('', togGround.wrap)); // ✅ RESTORED
     body.appendChild(row('', togAxes.wrap));
+    body.appendChild(row('', togFps.wrap));
+    body.appendChild(row('Draw calls', statsEl));
 
     dock.appendChild(dockHeader);
     dock.appendChild(body);
@@ -862,6 +1282,53 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       }} catch(e) {{}}
     }});
 
+    // Double-click a part to hide it; "Show all parts" restores them.
+    const hiddenInstances = [];
+    const raycaster = new THREE.Raycaster();
+    const pointer = new THREE.Vector2();
+    renderer.domElement.addEventListener('dblclick', (ev) => {{
+      if (!model) return;
+      const r = renderer.domElement.getBoundingClientRect();
+      pointer.set(
+        ((ev.clientX - r.left) / r.width) * 2 - 1,
+        -((ev.clientY - r.top) / r.height) * 2 + 1
+      );
+      raycaster.setFromCamera(pointer, camera);
+      const hit = raycaster.intersectObjects(model.children, false).find(h => h.object.visible);
+      if (!hit) return;
+      playClick();
+      const obj = hit.object;
+      if (obj.isInstancedMesh && hit.instanceId !== undefined) {{
+        // Hide one occurrence by collapsing its matrix; remember it for restore.
+        const saved = new THREE.Matrix4();
+        obj.getMatrixAt(hit.instanceId, saved);
+        hiddenInstances.push({{ obj, id: hit.instanceId, matrix: saved }});
+        obj.setMatrixAt(hit.instanceId, new THREE.Matrix4().makeScale(0, 0, 0));
+        obj.instanceMatrix.needsUpdate = true;
+        obj.boundingBox = null;
+        obj.boundingSphere = null;
+      }} else {{
+        const sid = obj.userData.batchRanges
+          ? obj.geometry.getAttribute('solidId').getX(hit.face.a)
+          : obj.userData.solidId;
+        hiddenSolids.add(sid);
+        applyHiddenSolids(obj);
+      }}
+    }});
+
+    showPartsBtn.addEventListener('click', () => {{
+      playClick();
+      if (!model) return;
+      hiddenSolids.clear();
+      model.children.forEach(c => {{ if (!c.isInstancedMesh) applyHiddenSolids(c); }});
+      for (const h of hiddenInstances.splice(0)) {{
+        h.obj.setMatrixAt(h.id, h.matrix);
+        h.obj.instanceMatrix.needsUpdate = true;
+        h.obj.boundingBox = null;
+        h.obj.boundingSphere = null;
+      }}
+    }});
+
     renderModeSel.addEventListener('change', () => {{
       playClick();
       setRenderMode(renderModeSel.value);
@@ -978,6 +1445,7 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       ground.visible = on;
       renderer.shadowMap.enabled = on;
       dirLight.castShadow = on;
+      shadowsOn = on;
 
       if (model) {{
         model.traverse(n => {{
@@ -992,6 +1460,11 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       renderer.render(scene, camera);
     }});
 
+    togFps.cb.addEventListener('change', () => {{
+      playClick();
+      fpsEl.style.display = togFps.cb.checked ? 'block' : 'none';
+    }});
+
     togAxes.cb.addEventListener('change', () => {{
       playClick();
       axesHelper.visible = !!togAxes.cb.checked;
@@ -1006,11 +1479,95 @@ def Step_Visualization(Step_Name, height_px=390, tools_panel_scale=0.5):
       renderer.render(scene, camera);
     }});
 
-    (function animate() {{
+    // Frame-time overlay (toggle in tools): fps, worst frame, draw calls, triangles.
+    const fpsEl = document.createElement('div');
+    Object.assign(fpsEl.style, {{
+      position: 'absolute', left: '10px', top: '10px', zIndex: '10', display: 'none',
+      padding: '4px 8px', borderRadius: '8px', background: 'rgba(255,255,255,.85)',
+      color: '#0b3b3c', font: '600 11px ui-monospace,Menlo,Consolas,monospace',
+      pointerEvents: 'none', whiteSpace: 'pre'
+    }});
+    container.appendChild(fpsEl);
+    let fpsFrames = 0, fpsWorst = 0, fpsT0 = performance.now(), fpsLast = fpsT0;
+
+    function updateFps(now) {{
+      const dt = now - fpsLast;
+      fpsLast = now;
+      fpsFrames++;
+      if (dt > fpsWorst) fpsWorst = dt;
+      if (now - fpsT0 < 500) return;
+      if (fpsEl.style.display !== 'none') {{
+        const avg = (now - fpsT0) / fpsFrames;
+        fpsEl.textContent =
+          (1000 / avg).toFixed(0) + ' fps  ' + avg.toFixed(1) + ' ms (max ' + fpsWorst.toFixed(1) + ')\\n' +
+          renderer.info.render.calls + ' calls  ' + renderer.info.render.triangles.toLocaleString() + ' tris';
+      }}
+      fpsFrames = 0;
+      fpsWorst = 0;
+      fpsT0 = now;
+    }}
+
+    (function animate(now) {{
       requestAnimationFrame(animate);
       controls.update();
       renderer.render(scene, camera);
+      updateFps(now || performance.now());
     }})();
+
+    // --- Progressive refinement: swap fine geometry in, one part per frame ---
+    const nextFrame = () => new Promise(r => requestAnimationFrame(r));
+
+    function swapPartGeometry(obj, geom) {{
+      obj.geometry = geom;
+      if (obj.isInstancedMesh) {{
+        obj.boundingBox = null;
+        obj.boundingSphere = null;
+      }}
+      scheduleRebuild();
+    }}
+
+    async function refineKernelParts() {{
+      const kernel = window.google && window.google.colab && window.google.colab.kernel;
+      if (!kernel || typeof kernel.invokeFunction !== 'function') return;
+      for (const obj of parts) {{
+        if (obj.userData.source === undefined) continue;
+        let res;
+        try {{
+          res = await kernel.invokeFunction('automind_step_refine', [REFINE.step, obj.userData.source], {{}});
+        }} catch (e) {{
+          console.warn('[STEP] refine failed', e);
+          return;
+        }}
+        const data = res && res.data && res.data['application/json'];
+        if (!data) continue;
+        swapPartGeometry(obj, setGeometryBuffers(new THREE.BufferGeometry(), decodeKernelBuffers(data)));
+      }}
+    }}
+
+    async function refineBrowserParts() {{
+      await nextFrame();
+      const fine = buildParts(await readStepInBrowser(null));
+      const coarse = parts;
+      const sameLayout = fine.length === coarse.length && fine.every(
+        (o, i) => !!o.isInstancedMesh === !!coarse[i].isInstancedMesh &&
+                  (o.count || 1) === (coarse[i].count || 1)
+      );
+      if (sameLayout) {{
+        for (let i = 0; i < fine.length; i++) {{
+          swapPartGeometry(coarse[i], fine[i].geometry);
+          await nextFrame();
+        }}
+        return;
+      }}
+      // Layouts differ (different instancing): replace the whole model at once.
+      parts = fine;
+      rebuildModel();
+      setRenderMode(renderModeSel.value);
+      updateSectionPlane(parseFloat(secDist.value)||0);
+    }}
+
+    if (REFINE && REFINE.mode === 'kernel') refineKernelParts();
+    if (REFINE && REFINE.mode === 'browser') refineBrowserParts();
   }})();
   </script>
 </body>
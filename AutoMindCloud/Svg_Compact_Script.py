@@ -0,0 +1,201 @@
+"""
+Svg_Compact_Script.py
+
+Compaction for line-drawing SVGs (hidden-line views, drawing sheets).
+- Coordinates are snapped to a quantum (by default at most a quarter of a
+  pixel, rounded down to a power of ten so deltas print exactly).
+- Identical paths, in either direction, are written once.
+- Paths meeting end to end are chained, then collinear points are dropped
+  (Ramer-Douglas-Peucker at half a quantum, so nothing moves visibly).
+- Path data is delta encoded with h/v/l commands and minimal decimals.
+- compact_svg applies the same passes to an existing SVG made of M/L paths;
+  size_report summarizes what was saved.
+"""
+
+import re
+import math
+from collections import defaultdict
+
+import numpy as np
+
+DEFAULT_PRECISION = 0.25  # pixels
+
+
+def _quantize(lines, quantum):
+    """Snap to the grid, drop repeated points and degenerate/duplicate paths."""
+    seen = set()
+    out = []
+    for line in lines:
+        q = np.round(np.asarray(line, dtype=np.float64) / quantum).astype(np.int64)
+        if len(q) > 1:
+            q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+        if len(q) < 2:
+            continue
+        key = min(q.tobytes(), q[::-1].tobytes())
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(q)
+    return out
+
+
+def _chain(lines):
+    """Greedily join paths that share an endpoint (reversing them when needed)."""
+    at = defaultdict(list)
+    for i, q in enumerate(lines):
+        at[tuple(q[0])].append(i)
+        at[tuple(q[-1])].append(i)
+    used = [False] * len(lines)
+
+    def extend(chain):
+        while True:
+            tail = tuple(chain[-1][-1])
+            nxt = next((j for j in at[tail] if not used[j]), None)
+            if nxt is None:
+                return chain
+            used[nxt] = True
+            q = lines[nxt]
+            chain.append((q if tuple(q[0]) == tail else q[::-1])[1:])
+
+    out = []
+    for i, q in enumerate(lines):
+        if used[i]:
+            continue
+        used[i] = True
+        chain = extend([q])
+        chain = extend([np.concatenate(chain)[::-1]])
+        out.append(np.concatenate(chain))
+    return out
+
+
+def _simplify(q, eps):
+    """Ramer-Douglas-Peucker on integer grid points; keeps both endpoints."""
+    if len(q) < 3:
+        return q
+    pts = q.astype(np.float64)
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, ab = pts[i], pts[j] - pts[i]
+        rel = pts[i + 1:j] - a
+        length = math.hypot(ab[0], ab[1])
+        if length:
+            d = np.abs(ab[0] * rel[:, 1] - ab[1] * rel[:, 0]) / length
+        else:
+            d = np.hypot(rel[:, 0], rel[:, 1])
+        k = int(d.argmax())
+        if d[k] > eps:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return q[keep]
+
+
+def compact_polylines(lines, quantum):
+    """Quantized, deduplicated, chained and simplified polylines as integer grid arrays."""
+    return [_simplify(q, 0.5) for q in _chain(_quantize(lines, quantum))]
+
+
+def _fmt(value, decimals):
+    s = f"{value:.{decimals}f}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    if s.startswith("0."):
+        s = s[1:]
+    elif s.startswith("-0."):
+        s = "-" + s[2:]
+    return "0" if s in ("", "-0", "-") else s
+
+
+def decimal_quantum(quantum):
+    """Largest power of ten not above quantum."""
+    return 10.0 ** math.floor(math.log10(quantum) + 1e-9)
+
+
+def path_data(q, quantum):
+    """Delta-encoded SVG path data for one integer grid polyline (quantum a power of ten)."""
+    decimals = max(0, math.ceil(-math.log10(quantum) - 1e-9))
+    f = lambda v: _fmt(v * quantum, decimals)
+    parts = [f"M{f(q[0, 0])},{f(q[0, 1])}"]
+    cmd = None
+    for dx, dy in np.diff(q, axis=0).tolist():
+        if dy == 0:
+            c, arg = "h", f(dx)
+        elif dx == 0:
+            c, arg = "v", f(dy)
+        else:
+            c, arg = "l", f"{f(dx)},{f(dy)}"
+        parts.append((c if c != cmd else " ") + arg)
+        cmd = c
+    return "".join(parts)
+
+
+def polylines_to_paths(lines, quantum, indent=""):
+    quantum = decimal_quantum(quantum)
+    return "\n".join(
+        f'{indent}<path d="{path_data(q, quantum)}" />' for q in compact_polylines(lines, quantum)
+    )
+
+
+_GROUP_RE = re.compile(r"(<g\b[^>]*>)((?:\s*<path\b[^>]*/>)+)(\s*</g>)", re.IGNORECASE)
+_PATH_RE = re.compile(r'<path\b[^>]*\bd\s*=\s*"([^"]*)"[^>]*/>', re.IGNORECASE)
+_NUM = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_ML_RE = re.compile(rf"^\s*(?:[ML]\s*{_NUM}(?:\s*,\s*|\s+){_NUM}\s*)+$")
+_STROKE_RE = re.compile(rf'stroke-width\s*=\s*"({_NUM})"')
+
+
+def compact_svg(svg: str, precision: float = DEFAULT_PRECISION) -> str:
+    """
+    Compact every group of absolute M/L paths in svg (e.g. cadquery getSVG output).
+
+    precision is in pixels when the SVG declares a stroke-width in user units
+    (one pixel wide, as getSVG and the hidden-line views do), otherwise in user
+    units. Paths using other commands are left untouched.
+    """
+    m = _STROKE_RE.search(svg)
+    quantum = precision * (float(m.group(1)) if m else 1.0)
+    if not quantum > 0:
+        return svg
+
+    def group(gm):
+        lines, other = [], []
+        for pm in _PATH_RE.finditer(gm.group(2)):
+            d = pm.group(1)
+            if not _ML_RE.match(d):
+                other.append(pm.group(0))
+                continue
+            for seg in re.split(r"(?=M)", d.strip()):
+                pts = np.array(re.findall(_NUM, seg), dtype=np.float64).reshape(-1, 2)
+                if len(pts) > 1:
+                    lines.append(pts)
+        body = polylines_to_paths(lines, quantum)
+        return gm.group(1) + "\n" + "\n".join(filter(None, [body] + other)) + gm.group(3)
+
+    return _GROUP_RE.sub(group, svg)
+
+
+def size_report(rows) -> str:
+    """
+    Text table for [(name, original_svg, compact_svg)] with sizes, path counts
+    and the overall ratio.
+    """
+    lines = []
+    total_before = total_after = 0
+    for name, before, after in rows:
+        b, a = len(before.encode("utf-8")), len(after.encode("utf-8"))
+        total_before += b
+        total_after += a
+        lines.append(
+            f"{name:<24} {b / 1024:9.1f} KiB -> {a / 1024:8.1f} KiB  "
+            f"({b / max(a, 1):4.1f}x, paths {before.count('<path')} -> {after.count('<path')})"
+        )
+    lines.append(
+        f"{'Total':<24} {total_before / 1024:9.1f} KiB -> {total_after / 1024:8.1f} KiB  "
+        f"({total_before / max(total_after, 1):4.1f}x)"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,17 @@
+"""
+The AutoMindCloud package __init__ downloads assets and displays a banner, so
+the tests load its modules from a bare package module instead, with the
+kernel caches in a temporary folder.
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+os.environ.setdefault("AUTOMIND_CACHE_DIR", tempfile.mkdtemp(prefix="automind-test-cache-"))
+
+if "AutoMindCloud" not in sys.modules:
+    _package = types.ModuleType("AutoMindCloud")
+    _package.__path__ = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "AutoMindCloud")]
+    sys.modules["AutoMindCloud"] = _package
@@ -0,0 +1,30 @@
+import os
+
+from AutoMindCloud.DXF_Batch_Script import batch_thumbnails
+
+
+def _line_dxf(path, x):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tags = [(0, "SECTION"), (2, "ENTITIES"), (0, "LINE"), (8, "0"), (10, 0), (20, 0), (11, x), (21, 10),
+            (0, "ENDSEC"), (0, "EOF")]
+    path.write_text("".join(f"{code}\n{value}\n" for code, value in tags))
+
+
+def test_colliding_output_names_are_disambiguated(tmp_path):
+    sources = ["a b.dxf", "a_b.dxf", os.path.join("a", "b.dxf"), "a__b.dxf", "plain.dxf"]
+    for k, rel in enumerate(sources):
+        _line_dxf(tmp_path / "in" / rel, 10 + k)
+    out_dir = str(tmp_path / "out")
+
+    manifest = batch_thumbnails(str(tmp_path / "in"), out_dir, workers=1, verbose=False)
+    assert len(manifest) == len(sources)
+    assert sorted(entry["source"] for entry in manifest.values()) == sorted(sources)
+    assert "plain" in manifest
+    files = [entry["files"]["png"] for entry in manifest.values()]
+    assert len(set(files)) == len(sources)
+    assert all(entry["status"] == "ok" for entry in manifest.values())
+    assert all(os.path.exists(os.path.join(out_dir, f)) for f in files)
+
+    again = batch_thumbnails(str(tmp_path / "in"), out_dir, workers=1, verbose=False)
+    assert sorted(again) == sorted(manifest)
+    assert all(entry["status"] == "cached" for entry in again.values())
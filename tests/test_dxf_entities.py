@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from AutoMindCloud.DXF_Kernel_Script import dxf_segments
+
+ENTITIES = [(0, "SECTION"), (2, "ENTITIES")]
+END = [(0, "ENDSEC"), (0, "EOF")]
+
+
+def _write_dxf(path, tags):
+    path.write_text("".join(f"{code}\n{value}\n" for code, value in ENTITIES + tags + END))
+    return str(path)
+
+
+def _points(path):
+    drawing = dxf_segments(path)
+    segments = drawing["segments"].astype(np.float64)
+    return np.concatenate([segments[:, :2], segments[:, 2:]]) + drawing["origin"]
+
+
+def test_hatch_rational_spline_edge(tmp_path):
+    # Degree-2 arch from (0, 0) to (30, 0) with middle weight 2 (peak y = 15),
+    # closed by a line edge; each 42 weight follows its 10/20 control point.
+    tags = [
+        (0, "HATCH"), (8, "0"), (10, 0), (20, 0), (30, 0), (2, "SOLID"), (70, 1), (71, 0),
+        (91, 1), (92, 1), (93, 2),
+        (72, 4), (94, 2), (73, 1), (74, 0), (95, 6), (96, 3),
+        (40, 0), (40, 0), (40, 0), (40, 1), (40, 1), (40, 1),
+        (10, 0), (20, 0), (42, 1), (10, 15), (20, 22.5), (42, 2), (10, 30), (20, 0), (42, 1),
+        (97, 0),
+        (72, 1), (10, 30), (20, 0), (11, 0), (21, 0),
+        (97, 0), (75, 0), (76, 1), (98, 0),
+    ]
+    points = _points(_write_dxf(tmp_path / "hatch.dxf", tags))
+    assert points[:, 1].max() == pytest.approx(15.0, abs=1e-3)
+    assert points[:, 0].min() == pytest.approx(0.0, abs=1e-6)
+    assert points[:, 0].max() == pytest.approx(30.0, abs=1e-6)
+
+
+def test_spline_fit_points_are_interpolated(tmp_path):
+    fit = [(0, 0), (10, 8), (20, 0), (30, -8), (40, 0)]
+    tags = [(0, "SPLINE"), (8, "0"), (70, 8), (71, 3), (72, 0), (73, 0), (74, len(fit))]
+    for x, y in fit:
+        tags += [(11, x), (21, y)]
+    points = _points(_write_dxf(tmp_path / "fit.dxf", tags))
+    for x, y in fit:
+        assert np.hypot(points[:, 0] - x, points[:, 1] - y).min() < 1e-4
+    # A smooth curve overshoots the polyline through the fit points.
+    assert points[:, 1].max() > 8.1
+    assert len(points) > 2 * len(fit)
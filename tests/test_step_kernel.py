@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+cq = pytest.importorskip("cadquery")
+
+from AutoMindCloud import Step_Kernel_Script as K
+
+
+def _world_points(mesh):
+    """Vertices of every instance, placed by its matrix."""
+    points = []
+    for proto, matrix in zip(mesh["instance_proto"], mesh["instance_matrices"]):
+        start, count = mesh["proto_ranges"][proto]
+        local = mesh["positions"][mesh["indices"].ravel()[start:start + count]]
+        m = matrix.reshape(4, 4).T
+        points.append(local @ m[:3, :3].T + m[:3, 3])
+    return np.concatenate(points)
+
+
+def test_loose_face_next_to_solid_is_meshed(tmp_path):
+    box = cq.Workplane().box(10, 10, 10).val()
+    face = cq.Face.makePlane(20, 20, basePnt=cq.Vector(50, 0, 0))
+    path = str(tmp_path / "mixed.step")
+    cq.exporters.export(cq.Compound.makeCompound([box, face]), path)
+
+    mesh = K.tessellate_step(path)
+    points = _world_points(mesh)
+    assert points[:, 0].min() == pytest.approx(-5.0, abs=1e-3)
+    assert points[:, 0].max() == pytest.approx(60.0, abs=1e-3)
+    assert len(mesh["proto_source"]) == 2
+    for source in mesh["proto_source"]:
+        assert len(K.tessellate_part(path, int(source))["indices"])
+
+
+def test_mesh_items_keep_solids_shells_and_faces():
+    box = cq.Workplane().box(10, 10, 10).val()
+    shell = cq.Workplane().box(4, 4, 4).translate((0, 40, 0)).val().Shells()[0]
+    face = cq.Face.makePlane(20, 20, basePnt=cq.Vector(50, 0, 0))
+    items = K._mesh_items(cq.Compound.makeCompound([box, shell, face]))
+    assert [type(item).__name__ for item in items] == ["Solid", "Shell", "Face"]